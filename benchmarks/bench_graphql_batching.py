@@ -0,0 +1,62 @@
+"""
+Бенчмарк: посты/сек ProductHuntParser с упаковкой окон в один GraphQL
+запрос (алиасы) и без нее, против локального FakeProductHuntServer
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_graphql_batching
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fake_producthunt import FakeProductHuntServer
+from producthunt_parser import ProductHuntParser
+
+
+def run_parser(server, batch_size, days, max_workers):
+    end_date = datetime(2025, 1, 1)
+    parser = ProductHuntParser(
+        token='bench-token',
+        max_makers=100,
+        max_products=10**9,
+        shard_days=7,
+        max_workers=max_workers,
+        batch_size=batch_size,
+        start_date=end_date - timedelta(days=days),
+        end_date=end_date,
+        api_url=server.url
+    )
+    
+    requests_before = server.requests
+    started_at = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        products = parser.parse()
+    elapsed = time.perf_counter() - started_at
+    
+    return len(products), server.requests - requests_before, elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--days', type=int, default=365)
+    arg_parser.add_argument('--latency', type=float, default=0.05, help='задержка ответа сервера, сек')
+    arg_parser.add_argument('--workers', type=int, default=4)
+    arg_parser.add_argument('--batch-sizes', default='1,2,4,8')
+    args = arg_parser.parse_args()
+    
+    server = FakeProductHuntServer(latency=args.latency).start()
+    try:
+        print(f"Окно: {args.days} дн., задержка: {args.latency * 1000:.0f} мс, потоков: {args.workers}")
+        print(f"{'окон/запрос':>12} {'постов':>8} {'HTTP':>6} {'сек':>7} {'постов/сек':>11}")
+        for batch_size in (int(b) for b in args.batch_sizes.split(',')):
+            posts, http_requests, elapsed = run_parser(server, batch_size, args.days, args.workers)
+            print(f"{batch_size:>12} {posts:>8} {http_requests:>6} {elapsed:>7.2f} {posts / elapsed:>11.0f}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
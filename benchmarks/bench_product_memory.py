@@ -0,0 +1,85 @@
+"""
+Бенчмарк: память на продукт - Product (__slots__) против прежних словарей
+
+Посты генерируются так же, как в FakeProductHuntServer, записи создаются
+ProductHuntParser._process_product и дополняются полями следующих этапов
+(резолв URL, Crunchbase). Учитывается только память самих записей: строки
+постов общие для обоих вариантов
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_product_memory
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks.fake_producthunt import FakeProductHuntServer
+from producthunt_parser import ProductHuntParser
+
+
+def make_nodes(count):
+    server = FakeProductHuntServer(posts_per_day=100)
+    nodes = []
+    day = date(2025, 1, 1)
+    while len(nodes) < count:
+        nodes.extend(server._day_posts(day))
+        day -= timedelta(days=1)
+    return nodes[:count]
+
+
+def as_dict(node):
+    """Запись продукта в прежнем виде - обычный словарь"""
+    return {
+        'name': node.get('name', ''),
+        'description': node.get('description', ''),
+        'votesCount': node.get('votesCount', 0),
+        'website': node.get('website', ''),
+        'producthunt_url': node.get('url', ''),
+        'makers': len(node['makers']),
+        'created_at': node.get('createdAt', '')
+    }
+
+
+def measure(nodes, make_record):
+    """Байт на запись после всех этапов и время создания записей"""
+    gc.collect()
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    
+    records = [make_record(node) for node in nodes]
+    for record in records:
+        record['is_accessible'] = True
+        record['crunchbase_url'] = ''
+        record['funding_amount'] = ''
+    
+    elapsed = time.perf_counter() - started_at
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return size / len(records), elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--count', type=int, default=300000, help='количество продуктов')
+    args = arg_parser.parse_args()
+    
+    nodes = make_nodes(args.count)
+    parser = ProductHuntParser(token='bench-token', max_makers=None)
+    
+    print(f"Продуктов: {len(nodes)}")
+    print(f"{'вариант':>10} {'байт/продукт':>13} {'МБ всего':>9} {'сек':>6}")
+    results = {}
+    for name, make_record in (('dict', as_dict), ('Product', parser._process_product)):
+        per_record, elapsed = measure(nodes, make_record)
+        results[name] = per_record
+        print(f"{name:>10} {per_record:>13.0f} {per_record * len(nodes) / 2**20:>9.1f} {elapsed:>6.2f}")
+    
+    print(f"\nЭкономия: {1 - results['Product'] / results['dict']:.0%}")
+
+
+if __name__ == '__main__':
+    main()
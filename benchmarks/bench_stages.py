@@ -0,0 +1,185 @@
+"""
+Бенчмарк сетевых этапов без настоящих ProductHunt и Crunchbase
+
+Поднимает локальные замены (FakeProductHuntServer, FakeRedirectFarm,
+FakeCrunchbaseServer) и прогоняет против них ProductHuntParser,
+resolve_urls_batch и CrunchbaseParser. Для каждого этапа выводит
+элементов/сек и p50/p95 задержки запросов: на стороне заменяющего сервера
+и на стороне клиента (гистограммы call_seconds из metrics.py)
+
+Этап Crunchbase требует установленный camoufox (браузер ходит в локальный
+сервер), без него этап пропускается
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_stages
+    python -m benchmarks.bench_stages --days 60 --latency 0.1 --dead-rate 0.3 --skip-crunchbase
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import utils
+from benchmarks.fake_crunchbase import FakeCrunchbaseServer
+from benchmarks.fake_producthunt import FakeProductHuntServer
+from benchmarks.fake_redirects import FakeRedirectFarm
+from metrics import metrics
+from product import Product
+from producthunt_parser import ProductHuntParser
+
+
+def percentile(values, q):
+    """q-й перцентиль (0..100) методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def print_row(stage, items, elapsed, timings, call, note=''):
+    rate = items / elapsed if elapsed > 0 else 0
+    p50 = percentile(timings, 50) * 1000
+    p95 = percentile(timings, 95) * 1000
+    histogram = metrics.histogram('call_seconds', call=call)
+    client_p50 = histogram.quantile(0.5) * 1000 if histogram else 0
+    client_p95 = histogram.quantile(0.95) * 1000 if histogram else 0
+    print(f"{stage:<20} {items:>8} {elapsed:>8.2f} {rate:>10.1f} {p50:>8.0f} {p95:>8.0f} "
+          f"{client_p50:>8.0f} {client_p95:>8.0f}  {note}")
+
+
+@contextlib.contextmanager
+def quiet():
+    """Прячет прогресс-бары и отчеты этапов, чтобы осталась только таблица"""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def bench_producthunt(args, farm):
+    server = FakeProductHuntServer(
+        latency=args.latency,
+        budget=args.ph_budget,
+        budget_window=args.ph_budget_window,
+        redirect_base=farm.redirect_base
+    ).start()
+    try:
+        end_date = datetime(2025, 1, 1)
+        parser = ProductHuntParser(
+            token='bench-token',
+            max_makers=100,
+            max_products=10**9,
+            start_date=end_date - timedelta(days=args.days),
+            end_date=end_date,
+            api_url=server.url
+        )
+        
+        started_at = time.perf_counter()
+        with quiet():
+            products = parser.parse()
+        elapsed = time.perf_counter() - started_at
+        
+        print_row('producthunt', len(products), elapsed, server.timings, 'ph_fetch_page',
+                  f"HTTP {server.requests}, 429: {server.rate_limited}")
+        return products
+    finally:
+        server.stop()
+
+
+def bench_resolve(args, farm, products):
+    products = products[:args.urls]
+    # Ферма редиректов играет роль producthunt.com
+    ph_host, utils.PH_HOST = utils.PH_HOST, farm.host
+    try:
+        started_at = time.perf_counter()
+        with quiet():
+            accessible = utils.resolve_urls_batch(products, use_cache=False, http_workers=args.http_workers)
+        elapsed = time.perf_counter() - started_at
+    finally:
+        utils.PH_HOST = ph_host
+    
+    print_row('resolve', len(products), elapsed, farm.timings, 'resolve_http',
+              f"доступных {len(accessible)}, запросов к сайтам {farm.site_requests}")
+
+
+def bench_crunchbase(args):
+    try:
+        from crunchbase_parser import CrunchbaseParser
+    except ImportError as e:
+        print(f"{'crunchbase':<20} пропущен: {e}")
+        return
+    
+    products = [
+        Product(website=f'https://www.company-{i}.example.com/?utm_source=producthunt',
+                producthunt_url=f'https://www.producthunt.com/posts/company-{i}')
+        for i in range(args.companies)
+    ]
+    
+    server = FakeCrunchbaseServer(latency=args.latency, jitter=args.jitter).start()
+    try:
+        with tempfile.TemporaryDirectory() as user_data_dir:
+            parser = CrunchbaseParser(
+                tabs=args.tabs,
+                pace_seconds=0,
+                base_url=server.url,
+                user_data_dir=user_data_dir,
+                use_cache=False
+            )
+            try:
+                with quiet():
+                    parser.setup_authentication()
+                
+                started_at = time.perf_counter()
+                with quiet():
+                    parser.search_organizations_batch(products)
+                elapsed = time.perf_counter() - started_at
+                found = sum(1 for p in products if p['crunchbase_url'])
+                print_row('crunchbase search', len(products), elapsed, server.timings.get('autocomplete', []),
+                          'cb_autocomplete', f"найдено {found}")
+                
+                started_at = time.perf_counter()
+                with quiet():
+                    parser.get_funding_amounts_batch(products)
+                elapsed = time.perf_counter() - started_at
+                funded = sum(1 for p in products if p['funding_amount'])
+                print_row('crunchbase funding', found, elapsed, server.timings.get('organization', []),
+                          'cb_funding_api', f"с funding {funded}, рендер {server.requests.get('page', 0)}")
+            finally:
+                parser.close()
+    finally:
+        server.stop()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--days', type=int, default=30, help='период парсинга ProductHunt, дней')
+    arg_parser.add_argument('--latency', type=float, default=0.05, help='задержка ответа серверов, сек')
+    arg_parser.add_argument('--jitter', type=float, default=0.05, help='случайная добавка к задержке, сек')
+    arg_parser.add_argument('--ph-budget', type=int, default=None, help='бюджет сложности ProductHunt на окно (429 при исчерпании)')
+    arg_parser.add_argument('--ph-budget-window', type=int, default=5, help='длина окна rate limit, сек')
+    arg_parser.add_argument('--urls', type=int, default=500, help='сколько ссылок резолвить')
+    arg_parser.add_argument('--http-workers', type=int, default=32)
+    arg_parser.add_argument('--dead-rate', type=float, default=0.1, help='доля ссылок на мертвые хосты')
+    arg_parser.add_argument('--companies', type=int, default=300, help='сколько компаний искать на Crunchbase')
+    arg_parser.add_argument('--tabs', type=int, default=4)
+    arg_parser.add_argument('--skip-crunchbase', action='store_true')
+    args = arg_parser.parse_args()
+    
+    farm = FakeRedirectFarm(latency=args.latency, jitter=args.jitter, dead_rate=args.dead_rate).start()
+    try:
+        print(f"Задержка: {args.latency * 1000:.0f}+{args.jitter * 1000:.0f} мс")
+        print(f"{'':<49} {'сервер, мс':>17} {'клиент, мс':>17}")
+        print(f"{'этап':<20} {'элементов':>8} {'сек':>8} {'элем/сек':>10} {'p50':>8} {'p95':>8} {'p50':>8} {'p95':>8}")
+        
+        products = bench_producthunt(args, farm)
+        bench_resolve(args, farm, products)
+    finally:
+        farm.stop()
+    
+    if not args.skip_crunchbase:
+        bench_crunchbase(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Локальная замена Crunchbase для бенчмарков
+
+Главная страница ставит куку authcookie (сессия считается авторизованной),
+/v4/data/autocompletes ищет организацию по домену, /v4/data/entities/organizations/{permalink}
+отдает funding_total, /organization/{permalink} - страницу с блоком #overview_funding
+для запасного рендера. Найдена ли компания и есть ли у нее funding -
+детерминированно по домену и seed
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+HOME_PAGE = b'<html><head><title>Crunchbase</title></head><body>fake crunchbase</body></html>'
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Очередь соединений по умолчанию (5) переполняется пулом из десятков потоков
+    request_queue_size = 128
+
+
+class FakeCrunchbaseServer:
+    """
+    latency - задержка ответа (сек), jitter - случайная добавка 0..jitter
+    found_rate - доля доменов, которые находятся поиском
+    funded_rate - доля найденных организаций с funding_total
+    """
+    
+    def __init__(self, latency=0.05, jitter=0.05, found_rate=0.7, funded_rate=0.6, seed=42):
+        self.latency = latency
+        self.jitter = jitter
+        self.found_rate = found_rate
+        self.funded_rate = funded_rate
+        self.seed = seed
+        
+        self.requests = {}
+        self.timings = {}  # маршрут -> время обработки запросов на стороне сервера (сек)
+        self._lock = threading.Lock()
+        self._server = None
+    
+    # --- данные ---
+    
+    def _autocomplete(self, query):
+        rng = random.Random(f'{self.seed}-search-{query}')
+        if rng.random() >= self.found_rate:
+            return {'count': 0, 'entities': []}
+        permalink = query.replace('.', '-')
+        return {'count': 1, 'entities': [{'identifier': {'permalink': permalink, 'value': query}}]}
+    
+    def _organization(self, permalink):
+        rng = random.Random(f'{self.seed}-funding-{permalink}')
+        properties = {'identifier': {'permalink': permalink}}
+        if rng.random() < self.funded_rate:
+            properties['funding_total'] = {'value': int(rng.paretovariate(1.1) * 100000), 'currency': 'USD'}
+        return {'properties': properties}
+    
+    def _funding_text(self, permalink):
+        """Сумма так, как ее показывает страница организации: $1.5M, $250K"""
+        money = self._organization(permalink)['properties'].get('funding_total')
+        if not money:
+            return ''
+        value = money['value']
+        for divider, suffix in ((1e9, 'B'), (1e6, 'M'), (1e3, 'K')):
+            if value >= divider:
+                return '$' + f"{value / divider:.1f}".rstrip('0').rstrip('.') + suffix
+        return f"${value}"
+    
+    # --- HTTP ---
+    
+    def handle(self, path):
+        """Возвращает (route, status, content_type, body) для GET запроса"""
+        parsed = urlparse(path)
+        
+        if parsed.path == '/v4/data/autocompletes':
+            query = parse_qs(parsed.query).get('query', [''])[0]
+            return 'autocomplete', 200, 'application/json', json.dumps(self._autocomplete(query)).encode()
+        
+        if parsed.path.startswith('/v4/data/entities/organizations/'):
+            permalink = unquote(parsed.path.rsplit('/', 1)[-1])
+            return 'organization', 200, 'application/json', json.dumps(self._organization(permalink)).encode()
+        
+        if parsed.path.startswith('/organization/'):
+            funding = self._funding_text(parsed.path.rstrip('/').rsplit('/', 1)[-1])
+            body = f'<html><body><div id="overview_funding"><a>{funding}</a></div></body></html>'
+            return 'page', 200, 'text/html', body.encode()
+        
+        return 'home', 200, 'text/html', HOME_PAGE
+    
+    def start(self, host='127.0.0.1', port=0):
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            
+            def do_GET(self):
+                started_at = time.perf_counter()
+                time.sleep(fake.latency + random.uniform(0, fake.jitter))
+                route, status, content_type, body = fake.handle(self.path)
+                
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                if route == 'home':
+                    self.send_header('Set-Cookie', 'authcookie=bench; Path=/')
+                self.end_headers()
+                self.wfile.write(body)
+                
+                with fake._lock:
+                    fake.requests[route] = fake.requests.get(route, 0) + 1
+                    fake.timings.setdefault(route, []).append(time.perf_counter() - started_at)
+        
+        self._server = _Server((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+    
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+    
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,211 @@
+"""
+Локальная замена GraphQL API ProductHunt для бенчмарков
+
+Понимает запросы вида { alias: posts(after: "...", postedAfter: "...",
+postedBefore: "...", order: VOTES) { ... } } с любым числом алиасов,
+отдает детерминированные посты по убыванию голосов, курсоры-смещения
+и заголовки X-Rate-Limit-* (с 429 при исчерпании бюджета)
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SELECTION_RE = re.compile(r'(\w+)\s*:\s*posts\(([^)]*)\)')
+ARG_RE = re.compile(r'(\w+)\s*:\s*("([^"]*)"|\w+)')
+
+
+def _parse_date(value):
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed.replace(tzinfo=None)
+
+
+class FakeProductHuntServer:
+    """
+    posts_per_day - сколько постов генерируется на каждый день
+    page_size - размер страницы по умолчанию (first: переопределяет)
+    max_page_size - сервер отдает не больше стольких постов, даже если first больше
+    latency - задержка ответа на HTTP запрос (сек)
+    budget - очков сложности на окно rate limit (None - без лимита)
+    budget_window - длина окна rate limit (сек)
+    redirect_base - база для поля website (например, адрес фермы редиректов)
+    """
+    
+    def __init__(self, posts_per_day=20, page_size=20, max_page_size=50, latency=0.05, budget=None, budget_window=900,
+                 redirect_base='https://www.producthunt.com', seed=42):
+        self.posts_per_day = posts_per_day
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.latency = latency
+        self.budget = budget
+        self.budget_window = budget_window
+        self.redirect_base = redirect_base
+        self.seed = seed
+        
+        self.requests = 0
+        self.rate_limited = 0
+        self.timings = []  # время обработки каждого запроса на стороне сервера (сек)
+        self._remaining = budget
+        self._window_started = time.time()
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._server = None
+    
+    # --- данные ---
+    
+    def _day_posts(self, day):
+        rng = random.Random(f'{self.seed}-{day.isoformat()}')
+        posts = []
+        for i in range(self.posts_per_day):
+            post_id = f'{day.strftime("%Y%m%d")}{i:04d}'
+            created_at = datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randint(0, 1439))
+            posts.append({
+                'id': post_id,
+                'name': f'Product {post_id}',
+                'description': f'Description of product {post_id}',
+                'votesCount': int(rng.paretovariate(1.2) * 10),
+                'url': f'https://www.producthunt.com/posts/product-{post_id}',
+                'website': f'{self.redirect_base}/r/{post_id}',
+                'createdAt': created_at.isoformat() + 'Z',
+                'makers': [{'id': f'{post_id}-{m}'} for m in range(rng.randint(1, 6))]
+            })
+        return posts
+    
+    def _window_posts(self, posted_after, posted_before):
+        key = (posted_after, posted_before)
+        with self._lock:
+            cached = self._windows.get(key)
+        if cached is not None:
+            return cached
+        
+        posts = []
+        day = posted_after.date()
+        while day <= posted_before.date():
+            posts.extend(
+                p for p in self._day_posts(day)
+                if posted_after <= _parse_date(p['createdAt']) < posted_before
+            )
+            day += timedelta(days=1)
+        posts.sort(key=lambda p: (-p['votesCount'], p['id']))
+        
+        with self._lock:
+            self._windows[key] = posts
+        return posts
+    
+    def _select(self, args, body):
+        posts = self._window_posts(_parse_date(args['postedAfter']), _parse_date(args['postedBefore']))
+        offset = int(args.get('after') or 0)
+        first = min(int(args.get('first') or self.page_size), self.max_page_size)
+        page = posts[offset:offset + first]
+        
+        with_makers = 'makers' in body
+        fields = set(re.findall(r'\b(\w+)\b', body))
+        edges = []
+        for post in page:
+            node = {k: v for k, v in post.items() if k in fields and k != 'makers'}
+            if with_makers:
+                node['makers'] = post['makers']
+            edges.append({'node': node})
+        
+        cost = 1 + sum(1 + (len(e['node'].get('makers', [])) if with_makers else 0) for e in edges)
+        return {
+            'pageInfo': {
+                'endCursor': str(offset + len(page)),
+                'hasNextPage': offset + len(page) < len(posts)
+            },
+            'edges': edges
+        }, cost
+    
+    # --- rate limit ---
+    
+    def _charge(self, cost):
+        """Списывает бюджет. Возвращает (ok, remaining, reset_in)"""
+        with self._lock:
+            now = time.time()
+            if now - self._window_started >= self.budget_window:
+                self._window_started = now
+                self._remaining = self.budget
+            # Не 0: клиент считает reset_in=0 неизвестным и ждет полное окно ProductHunt
+            reset_in = max(1, math.ceil(self.budget_window - (now - self._window_started)))
+            if self.budget is None:
+                return True, None, reset_in
+            if self._remaining < cost:
+                self.rate_limited += 1
+                return False, 0, reset_in
+            self._remaining -= cost
+            return True, self._remaining, reset_in
+    
+    # --- HTTP ---
+    
+    def handle_query(self, query):
+        """Возвращает (status, headers, payload) для GraphQL запроса"""
+        with self._lock:
+            self.requests += 1
+        
+        data = {}
+        total_cost = 0
+        matches = list(SELECTION_RE.finditer(query))
+        for i, match in enumerate(matches):
+            body_end = matches[i + 1].start() if i + 1 < len(matches) else len(query)
+            args = {m.group(1): m.group(3) if m.group(3) is not None else m.group(2)
+                    for m in ARG_RE.finditer(match.group(2))}
+            data[match.group(1)], cost = self._select(args, query[match.end():body_end])
+            total_cost += cost
+        
+        ok, remaining, reset_in = self._charge(total_cost)
+        headers = {'X-Rate-Limit-Reset': str(reset_in)}
+        if self.budget is not None:
+            headers['X-Rate-Limit-Limit'] = str(self.budget)
+            headers['X-Rate-Limit-Remaining'] = str(remaining)
+        
+        if not ok:
+            return 429, headers, {'errors': [{
+                'error': 'rate_limit_reached',
+                'details': {'reset_in': reset_in}
+            }]}
+        return 200, headers, {'data': data}
+    
+    def start(self, host='127.0.0.1', port=0):
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            
+            def do_POST(self):
+                started_at = time.perf_counter()
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if fake.latency:
+                    time.sleep(fake.latency)
+                status, headers, payload = fake.handle_query(body.get('query', ''))
+                raw = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(raw)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(raw)
+                with fake._lock:
+                    fake.timings.append(time.perf_counter() - started_at)
+        
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+    
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v2/api/graphql'
+    
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,161 @@
+"""
+Локальная ферма редиректов, имитирующая producthunt.com/r/... для бенчмарков резолва
+
+Ферма отвечает 302 на сайт компании (отдельный локальный сервер), часть
+ссылок ведет на мертвые хосты (закрытый порт - соединение отклоняется),
+часть получает антибот-страницу 403 (такие ссылки резолвер отдает браузеру).
+Судьба ссылки детерминирована по id поста и seed
+
+Хост фермы - 127.0.0.1, хост сайтов - localhost, поэтому для utils ферма
+становится "producthunt.com" через utils.PH_HOST = farm.host
+"""
+
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHALLENGE_PAGE = b'<html><head><title>Just a moment...</title></head><body class="cf-chl"></body></html>'
+
+
+def _free_port():
+    """Порт, на котором никто не слушает (для мертвых хостов)"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Очередь соединений по умолчанию (5) переполняется пулом из десятков потоков
+    request_queue_size = 128
+
+
+class FakeRedirectFarm:
+    """
+    latency - задержка ответа фермы (сек), jitter - случайная добавка 0..jitter
+    site_latency - задержка ответа сайта компании (сек)
+    dead_rate - доля ссылок на мертвые хосты
+    block_rate - доля ссылок с антибот-страницей вместо редиректа
+    """
+    
+    def __init__(self, latency=0.02, jitter=0.02, site_latency=0.01, dead_rate=0.1, block_rate=0.0, seed=42):
+        self.latency = latency
+        self.jitter = jitter
+        self.site_latency = site_latency
+        self.dead_rate = dead_rate
+        self.block_rate = block_rate
+        self.seed = seed
+        
+        self.requests = 0
+        self.site_requests = 0
+        self.timings = []  # время обработки запроса к ферме на стороне сервера (сек)
+        self._lock = threading.Lock()
+        self._farm = None
+        self._sites = None
+        self._dead_port = None
+    
+    def _fate(self, post_id):
+        """'live', 'dead' или 'blocked' для ссылки"""
+        value = random.Random(f'{self.seed}-{post_id}').random()
+        if value < self.block_rate:
+            return 'blocked'
+        if value < self.block_rate + self.dead_rate:
+            return 'dead'
+        return 'live'
+    
+    def _serve(self, handler):
+        server = _Server(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    
+    def start(self):
+        farm = self
+        
+        class FarmHandler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            
+            def _respond(self, with_body):
+                started_at = time.perf_counter()
+                time.sleep(farm.latency + random.uniform(0, farm.jitter))
+                with farm._lock:
+                    farm.requests += 1
+                
+                post_id = self.path.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+                fate = farm._fate(post_id) if self.path.startswith('/r/') else 'missing'
+                
+                if fate in ('live', 'dead'):
+                    port = farm.sites_port if fate == 'live' else farm._dead_port
+                    self.send_response(302)
+                    self.send_header('Location', f'http://localhost:{port}/company-{post_id}?ref=producthunt')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                else:
+                    body = CHALLENGE_PAGE if fate == 'blocked' else b'not found'
+                    self.send_response(403 if fate == 'blocked' else 404)
+                    self.send_header('Content-Type', 'text/html')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    if with_body:
+                        self.wfile.write(body)
+                
+                with farm._lock:
+                    farm.timings.append(time.perf_counter() - started_at)
+            
+            def do_GET(self):
+                self._respond(with_body=True)
+            
+            def do_HEAD(self):
+                self._respond(with_body=False)
+        
+        class SiteHandler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            
+            def _respond(self, with_body):
+                if farm.site_latency:
+                    time.sleep(farm.site_latency)
+                with farm._lock:
+                    farm.site_requests += 1
+                body = b'<html><body>company</body></html>'
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if with_body:
+                    self.wfile.write(body)
+            
+            def do_GET(self):
+                self._respond(with_body=True)
+            
+            def do_HEAD(self):
+                self._respond(with_body=False)
+        
+        self._dead_port = _free_port()
+        self._sites = self._serve(SiteHandler)
+        self._farm = self._serve(FarmHandler)
+        return self
+    
+    @property
+    def host(self):
+        return self._farm.server_address[0]
+    
+    @property
+    def redirect_base(self):
+        """База для website постов (FakeProductHuntServer(redirect_base=...))"""
+        host, port = self._farm.server_address[:2]
+        return f'http://{host}:{port}'
+    
+    @property
+    def sites_port(self):
+        return self._sites.server_address[1]
+    
+    def stop(self):
+        for server in (self._farm, self._sites):
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        self._farm = None
+        self._sites = None
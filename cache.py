@@ -0,0 +1,168 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config_manager import get_setting
+
+CACHE_FILE = 'cache.sqlite'
+
+DAY = 24 * 60 * 60
+
+
+class TTLCache:
+    """
+    Постоянный кэш ключ → JSON-значение в SQLite
+    
+    ttl - время жизни положительных результатов (сек)
+    negative_ttl - время жизни отрицательных результатов (сек), обычно короче
+    max_entries - максимальный размер таблицы, при превышении удаляются самые старые записи
+    """
+    
+    def __init__(self, table, path=CACHE_FILE, ttl=30 * DAY, negative_ttl=DAY, max_entries=200000):
+        self.table = table
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                negative INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_created_at ON {table} (created_at)')
+        self._conn.commit()
+    
+    def _is_fresh(self, negative, created_at, now):
+        ttl = self.negative_ttl if negative else self.ttl
+        return now - created_at <= ttl
+    
+    def get(self, key):
+        """Возвращает значение из кэша или None, если записи нет или она устарела"""
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT value, negative, created_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+        
+        if row and self._is_fresh(row[1], row[2], time.time()):
+            self.hits += 1
+            return json.loads(row[0])
+        
+        self.misses += 1
+        return None
+    
+    def get_many(self, keys):
+        """Возвращает словарь key → value только для свежих записей"""
+        result = {}
+        now = time.time()
+        keys = list(dict.fromkeys(keys))
+        
+        with self._lock:
+            # SQLite ограничивает количество параметров в запросе
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, value, negative, created_at FROM {self.table} WHERE key IN ({placeholders})',
+                    chunk
+                ).fetchall()
+                for key, value, negative, created_at in rows:
+                    if self._is_fresh(negative, created_at, now):
+                        result[key] = json.loads(value)
+        
+        self.hits += len(result)
+        self.misses += len(keys) - len(result)
+        return result
+    
+    def set(self, key, value, negative=False):
+        """Сохраняет значение. negative=True - отрицательный результат с коротким TTL"""
+        with self._lock:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, negative, created_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), int(bool(negative)), time.time())
+            )
+            self._conn.commit()
+            
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= 1000:
+                self._evict()
+    
+    def _evict(self):
+        """Удаляет устаревшие записи и самые старые, если размер превышен (вызывается под lock)"""
+        self._puts_since_evict = 0
+        now = time.time()
+        
+        self._conn.execute(
+            f'DELETE FROM {self.table} WHERE (negative = 0 AND created_at < ?) OR (negative = 1 AND created_at < ?)',
+            (now - self.ttl, now - self.negative_ttl)
+        )
+        
+        count = self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN '
+                f'(SELECT key FROM {self.table} ORDER BY created_at ASC LIMIT ?)',
+                (count - self.max_entries,)
+            )
+        self._conn.commit()
+    
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._conn.close()
+
+
+def open_redirect_cache():
+    """
+    Кэш редиректов ProductHunt: PH URL → {final_url, is_accessible}
+    Настройки берутся из секции "redirect_cache" в config.json
+    """
+    settings = get_setting('redirect_cache', {})
+    
+    if not settings.get('enabled', True):
+        return None
+    
+    return TTLCache(
+        'redirects',
+        path=settings.get('path', CACHE_FILE),
+        ttl=settings.get('ttl_days', 30) * DAY,
+        negative_ttl=settings.get('negative_ttl_days', 1) * DAY,
+        max_entries=settings.get('max_entries', 200000)
+    )
+
+
+def open_crunchbase_caches():
+    """
+    Кэши Crunchbase: домен → {permalink} (включая "не найдено") и permalink → {funding_amount}
+    Настройки берутся из секции "crunchbase_cache" в config.json
+    Возвращает (search_cache, funding_cache) или (None, None), если кэш выключен
+    """
+    settings = get_setting('crunchbase_cache', {})
+    
+    if not settings.get('enabled', True):
+        return None, None
+    
+    params = {
+        'path': settings.get('path', CACHE_FILE),
+        'ttl': settings.get('ttl_days', 30) * DAY,
+        'negative_ttl': settings.get('negative_ttl_days', 7) * DAY,
+        'max_entries': settings.get('max_entries', 200000)
+    }
+    return TTLCache('cb_permalinks', **params), TTLCache('cb_funding', **params)
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+JOURNAL_FILE = 'checkpoint.jsonl'
+
+# Как часто сбрасывать журнал на диск (fsync), сек: при сбое питания теряется не больше
+FSYNC_INTERVAL = 1.0
+
+
+def _json_default(value):
+    """Продукты (Product) пишутся обычными словарями, остальное (даты и т.п.) - строкой"""
+    to_dict = getattr(value, 'to_dict', None)
+    return to_dict() if to_dict is not None else str(value)
+
+
+class CheckpointJournal:
+    """
+    Append-only журнал прогресса запуска (JSONL)
+    
+    Каждая завершенная единица работы (страница PH, резолв URL, поиск на
+    Crunchbase, funding) сразу дописывается строкой в файл. После сбоя или
+    Ctrl+C перезапуск читает журнал и пропускает уже сделанное
+    
+    Формат строки: {"stage": ..., "key": ..., "data": ...}
+    Первая строка - {"stage": "run", ...} с параметрами запуска
+    """
+    
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.run = None
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._synced_at = 0.0
+        self._load()
+    
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        
+        # Недописанная последняя строка при аварийном завершении отрезается,
+        # иначе следующая запись склеилась бы с ней и тоже потерялась
+        end = content.rfind(b'\n') + 1
+        if end < len(content):
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+            content = content[:end]
+        
+        for line in content.decode('utf-8').splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self._apply(record)
+    
+    def _apply(self, record):
+        if record.get('stage') == 'run':
+            self.run = record.get('data')
+            self._stages = {}
+            return
+        self._stages.setdefault(record['stage'], {})[record['key']] = record.get('data')
+    
+    def has_unfinished_run(self):
+        return self.run is not None
+    
+    def start_run(self, mode, params):
+        """Начинает новый журнал (старый удаляется)"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.run = None
+        self._stages = {}
+        self.record('run', None, {
+            'mode': mode,
+            'params': params,
+            'started_at': datetime.now().isoformat()
+        })
+    
+    def record(self, stage, key, data=None):
+        """Дописывает одну завершенную единицу работы"""
+        record = {'stage': stage, 'key': key, 'data': data}
+        line = json.dumps(record, ensure_ascii=False, default=_json_default)
+        
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line + '\n')
+            self._file.flush()
+            now = time.monotonic()
+            if now - self._synced_at >= FSYNC_INTERVAL:
+                os.fsync(self._file.fileno())
+                self._synced_at = now
+            self._apply(record)
+    
+    def completed(self, stage):
+        """Словарь key -> data для уже сделанной работы этапа"""
+        with self._lock:
+            return dict(self._stages.get(stage, {}))
+    
+    def get(self, stage, key, default=None):
+        with self._lock:
+            return self._stages.get(stage, {}).get(key, default)
+    
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+    
+    def clear(self):
+        """Запуск завершен успешно - журнал больше не нужен"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.run = None
+        self._stages = {}
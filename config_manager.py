@@ -17,10 +17,21 @@ def save_config(config):
 
 def get_producthunt_token():
     """Получает токен ProductHunt из конфига или запрашивает у пользователя"""
+    return get_producthunt_tokens()[0]
+
+def get_producthunt_tokens():
+    """
+    Получает список токенов ProductHunt из конфига или запрашивает у пользователя
+    Старый ключ producthunt_token переносится в список producthunt_tokens
+    """
     config = load_config()
     
-    if 'producthunt_token' in config and config['producthunt_token']:
-        return config['producthunt_token']
+    tokens = [t for t in config.get('producthunt_tokens', []) if t]
+    if config.get('producthunt_token') and config['producthunt_token'] not in tokens:
+        tokens.insert(0, config['producthunt_token'])
+    
+    if tokens:
+        return tokens
     
     print("\n" + "="*60)
     print("НАСТРОЙКА ТОКЕНА PRODUCTHUNT")
@@ -34,18 +45,31 @@ def get_producthunt_token():
     print("5. Заполните форму и создайте приложение")
     print("6. Скопируйте 'Developer token' (это длинная строка)")
     print("7. Вставьте токен ниже (без префикса 'Bearer ')")
+    print("   Можно указать несколько токенов через запятую - запросы распределятся по их лимитам")
     print("\nФормат токена: abc123-defGHI456_jklMNO789")
     print("="*60)
     
-    token = input("\nВведите токен ProductHunt: ").strip()
+    tokens_input = input("\nВведите токен ProductHunt: ").strip()
+    tokens = [t.strip() for t in tokens_input.split(',') if t.strip()]
     
-    if not token:
+    if not tokens:
         raise ValueError("Токен не может быть пустым")
     
-    config['producthunt_token'] = token
+    config['producthunt_tokens'] = tokens
     save_config(config)
-    print("✓ Токен сохранен в config.json\n")
+    print(f"✓ Токенов сохранено в config.json: {len(tokens)}\n")
     
-    return token
+    return tokens
 
 
+
+def get_setting(name, default=None):
+    """Возвращает настройку из config.json или значение по умолчанию"""
+    config = load_config()
+    return config.get(name, default)
+
+def set_setting(name, value):
+    """Сохраняет настройку в config.json"""
+    config = load_config()
+    config[name] = value
+    save_config(config)
@@ -1,15 +1,166 @@
 # ГАЙД ПО ПАРСИНГУ КРАНЧБАЗЕ. НЕ УДАЛЯТЬ РУКИ ОТОРВУ https://www.scrapingbee.com/blog/how-to-scrape-with-camoufox-to-bypass-antibot-technology/
 
+import asyncio
+import threading
 import time
+from queue import Empty
 from urllib.parse import quote
 from tqdm import tqdm
-from camoufox.sync_api import Camoufox
+from camoufox.async_api import AsyncCamoufox
+
+from cache import open_crunchbase_caches
+from config_manager import get_setting
+from metrics import metrics
+from utils import build_domain_index, canonical_domain
+
+BASE_URL = 'https://www.crunchbase.com'
+
+
+class CrunchbaseAuthError(Exception):
+    """Сохраненная сессия не авторизована, а интерактивный вход запрещен (воркеры очереди)"""
+
+
+class _Pacer:
+    """Общий для всех вкладок лимит: не чаще одного открытия страницы в interval секунд"""
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._next_at = 0.0
+    
+    async def wait(self):
+        async with self._lock:
+            delay = self._next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_at = time.monotonic() + self.interval
+
+
+class CrunchbaseSession:
+    """
+    Одна сессия Camoufox на все этапы Crunchbase
+    
+    Браузер живет в фоновом потоке со своим event loop, синхронный код
+    отправляет туда корутины через run(). Браузер запускается и прогревается
+    (главная страница) один раз; вход запрашивается, только если сохраненная
+    в user-data-dir сессия больше не авторизована
+    """
+    
+    # Кука, которую Crunchbase ставит после входа в аккаунт
+    AUTH_COOKIE = 'authcookie'
+    
+    def __init__(self, parser):
+        self.parser = parser
+        self.browser = None
+        self.page = None
+        self._manager = None
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='camoufox', daemon=True)
+        self._thread.start()
+    
+    def run(self, coro):
+        """Выполняет корутину в потоке браузера и возвращает результат"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+    
+    async def _launch(self, headless):
+        # Используем persistent context с сохраненными куками
+        self._manager = AsyncCamoufox(
+            headless=headless, 
+            persistent_context=True,
+            user_data_dir=self.parser.user_data_dir,
+            os=('windows'),
+            config=self.parser.camoufox_config,
+            i_know_what_im_doing=True
+        )
+        self.browser = await self._manager.__aenter__()
+        
+        # Используем первую существующую страницу вместо создания новой
+        pages = self.browser.pages
+        self.page = pages[0] if pages else await self.browser.new_page()
+        
+        # Открываем главную страницу один раз - с нее идут все запросы к API
+        await self.page.goto(self.parser.base_url, timeout=30000, wait_until='domcontentloaded')
+        await asyncio.sleep(2)
+    
+    async def _shutdown(self):
+        if self._manager is not None:
+            await self._manager.__aexit__(None, None, None)
+        self._manager = None
+        self.browser = None
+        self.page = None
+    
+    async def _is_logged_in(self):
+        cookies = await self.browser.cookies(self.parser.base_url)
+        return any(cookie['name'] == self.AUTH_COOKIE for cookie in cookies)
+    
+    def start(self):
+        """Запускает браузер; если сохраненная сессия не авторизована - просит войти"""
+        print("\n⚙️ Запуск браузера Crunchbase...")
+        self.run(self._launch(headless=True))
+        
+        if self.run(self._is_logged_in()):
+            print("✓ Сохраненная сессия Crunchbase активна")
+            return
+        
+        if not self.parser.interactive:
+            raise CrunchbaseAuthError(
+                f"Сессия Crunchbase в {self.parser.user_data_dir} не авторизована - "
+                f"войдите через main.py, воркер скопирует обновленный профиль"
+            )
+        
+        # Для входа нужно видимое окно: перезапускаем браузер с окном и дальше работаем в нем
+        self.run(self._shutdown())
+        
+        print("\n" + "="*70)
+        print("АВТОРИЗАЦИЯ НА CRUNCHBASE")
+        print("="*70)
+        print("Сейчас откроется браузер. Выполните следующие шаги:")
+        print("1. Пройдите капчу (если появится)")
+        print("2. Авторизуйтесь на Crunchbase (не закрывайте браузер)")
+        print("3. После успешной авторизации нажмите Enter в консоли")
+        print("="*70)
+        
+        self.run(self._launch(headless=False))
+        self.run(self.page.goto(f"{self.parser.base_url}/login"))
+        
+        input("\n[Нажмите Enter после авторизации]")
+        
+        if self.run(self._is_logged_in()):
+            print("✓ Авторизация завершена, куки сохранены")
+        else:
+            print("⚠ Вход не обнаружен - продолжаем без авторизации, часть данных может быть недоступна")
+        
+        self.run(self.page.goto(self.parser.base_url, timeout=30000, wait_until='domcontentloaded'))
+    
+    def close(self):
+        try:
+            self.run(self._shutdown())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
 
 
 class CrunchbaseParser:
-    def __init__(self):
-        self.base_url = "https://www.crunchbase.com"
-        self.user_data_dir = 'user-data-dir'
+    def __init__(self, tabs=None, pace_seconds=None, base_url=BASE_URL, user_data_dir='user-data-dir',
+                 use_cache=True, interactive=True):
+        """
+        tabs: сколько вкладок одновременно рендерят страницы организаций
+        pace_seconds: минимальный интервал между открытиями страниц по всем вкладкам,
+                      чтобы аккаунт не попал под ограничения
+        По умолчанию берутся из секции crunchbase в config.json (4 вкладки, 1 сек)
+        base_url, user_data_dir, use_cache - для бенчмарков против локальной замены Crunchbase
+        interactive=False - без входа через браузер: неавторизованная сессия - CrunchbaseAuthError
+        """
+        settings = get_setting('crunchbase', {})
+        self.base_url = base_url
+        self.user_data_dir = user_data_dir
+        self.use_cache = use_cache
+        self.interactive = interactive
+        self.tabs = tabs or settings.get('tabs', 4)
+        self.pace_seconds = pace_seconds if pace_seconds is not None else settings.get('pace_seconds', 1.0)
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._caches = None
         
         # Конфиг для Camoufox из гайда
         self.camoufox_config = {
@@ -32,194 +183,646 @@ class CrunchbaseParser:
             'navigator.maxTouchPoints': 10,
         }
     
-    def search_organization(self, website, page):
+    # Пул fetch-запросов внутри страницы: одна передача в браузер на целую пачку URL
+    FETCH_JSON_JS = """
+        async ({urls, concurrency}) => {
+            const results = new Array(urls.length);
+            let next = 0;
+            
+            async function worker() {
+                while (next < urls.length) {
+                    const i = next++;
+                    const started = performance.now();
+                    try {
+                        const response = await fetch(urls[i]);
+                        if (!response.ok) {
+                            results[i] = {error: `HTTP ${response.status}`, ms: performance.now() - started};
+                            continue;
+                        }
+                        results[i] = {data: await response.json(), ms: performance.now() - started};
+                    } catch (e) {
+                        results[i] = {error: String(e), ms: performance.now() - started};
+                    }
+                }
+            }
+            
+            const workers = [];
+            for (let w = 0; w < Math.min(concurrency, urls.length); w++) {
+                workers.push(worker());
+            }
+            await Promise.all(workers);
+            return results;
+        }
+    """
+    
+    CURRENCY_SYMBOLS = {'USD': '$', 'EUR': '€', 'GBP': '£'}
+    
+    def session(self):
+        """Общая сессия браузера для всех этапов (запускается при первом обращении)"""
+        with self._session_lock:
+            if self._session is None:
+                session = CrunchbaseSession(self)
+                try:
+                    session.start()
+                except BaseException:
+                    session.close()
+                    raise
+                self._session = session
+            return self._session
+    
+    def close_session(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+    
+    def _get_caches(self):
+        """(search_cache, funding_cache) из cache.sqlite, открываются при первом обращении"""
+        with self._session_lock:
+            if self._caches is None:
+                self._caches = open_crunchbase_caches() if self.use_cache else (None, None)
+            return self._caches
+    
+    def close(self):
+        """Закрывает сессию браузера и кэши"""
+        self.close_session()
+        with self._session_lock:
+            for cache in self._caches or ():
+                if cache is not None:
+                    cache.close()
+            self._caches = None
+    
+    def _search_key(self, website):
+        return canonical_domain(website) or website.strip().lower()
+    
+    def _permalink(self, crunchbase_url):
+        return crunchbase_url.rstrip('/').rsplit('/', 1)[-1]
+    
+    async def _fetch_json_many_async(self, urls, page, concurrency=8, call='cb_api'):
         """
-        Ищет организацию на Crunchbase по website через уже открытую страницу
-        Возвращает (crunchbase_url, success)
+        Выполняет GET запросы к JSON API Crunchbase из открытой страницы
+        (с ее куками), не больше concurrency одновременно
+        Задержка каждого запроса (замер внутри страницы) пишется в метрики как вызов call
+        Возвращает список (data, error) в порядке urls
         """
         try:
-            encoded_website = quote(website)
-            url = f"{self.base_url}/v4/data/autocompletes?query={encoded_website}&collection_ids=organizations&limit=1"
-            
-            # Делаем fetch через JavaScript чтобы получить чистый JSON
-            result = page.evaluate(f"""
-                async () => {{
-                    const response = await fetch('{url}');
-                    return await response.json();
-                }}
-            """)
-            
-            if result.get('count', 0) > 0 and result.get('entities') and len(result['entities']) > 0:
-                entity = result['entities'][0]
-                if entity.get('identifier') and entity['identifier'].get('permalink'):
-                    permalink = entity['identifier']['permalink']
-                    crunchbase_url = f"{self.base_url}/organization/{permalink}"
-                    return crunchbase_url, True
-            
-            return None, False
-                
+            responses = await page.evaluate(self.FETCH_JSON_JS, {'urls': urls, 'concurrency': concurrency})
         except Exception as e:
-            print(f"\n⚠ Ошибка поиска на Crunchbase для {website}: {e}")
-            return None, False
+            metrics.inc('calls_total', len(urls), call=call, outcome='error')
+            return [(None, str(e)) for _ in urls]
+        
+        for response in responses:
+            error = response.get('error')
+            outcome = 'ok' if error is None else 'rate_limited' if error == 'HTTP 429' else 'error'
+            metrics.observe_call(call, response.get('ms', 0) / 1000, outcome)
+        return [(response.get('data'), response.get('error')) for response in responses]
     
-    def setup_authentication(self):
+    def _fetch_json_many(self, urls, concurrency=8, call='cb_api'):
+        """_fetch_json_many_async на главной странице общей сессии"""
+        session = self.session()
+        return session.run(self._fetch_json_many_async(urls, session.page, concurrency, call))
+    
+    def _autocomplete_url(self, website):
+        return f"{self.base_url}/v4/data/autocompletes?query={quote(website)}&collection_ids=organizations&limit=1"
+    
+    def _parse_autocomplete(self, result):
+        """Достает crunchbase_url из ответа autocompletes (None - не найдено)"""
+        if result.get('count', 0) > 0 and result.get('entities') and len(result['entities']) > 0:
+            entity = result['entities'][0]
+            if entity.get('identifier') and entity['identifier'].get('permalink'):
+                permalink = entity['identifier']['permalink']
+                return f"{self.base_url}/organization/{permalink}"
+        return None
+    
+    def search_organizations(self, websites, concurrency=8):
         """
-        Открывает браузер для авторизации пользователя на Crunchbase
-        Куки автоматически сохраняются в user-data-dir
+        Ищет пачку организаций одним page.evaluate: внутри страницы запросы
+        к autocompletes идут параллельно, не больше concurrency одновременно
+        Возвращает список (crunchbase_url, success, error) в порядке websites,
+        error - текст ошибки запроса (None - запрос прошел, даже если ничего не найдено)
+        
+        Сначала проверяется кэш (включая закэшированное "не найдено"),
+        в браузер уходят только остальные сайты
         """
-        print("\n" + "="*70)
-        print("АВТОРИЗАЦИЯ НА CRUNCHBASE")
-        print("="*70)
-        print("Сейчас откроется браузер. Выполните следующие шаги:")
-        print("1. Пройдите капчу (если появится)")
-        print("2. Авторизуйтесь на Crunchbase (не закрывайте браузер)")
-        print("3. После успешной авторизации нажмите Enter в консоли")
-        print("="*70)
+        search_cache, _ = self._get_caches()
+        results = [None] * len(websites)
         
-        with Camoufox(
-            headless=False, 
-            persistent_context=True,
-            user_data_dir=self.user_data_dir,
-            os=('windows'),
-            config=self.camoufox_config,
-            i_know_what_im_doing=True
-        ) as browser:
-            # Используем первую существующую страницу вместо создания новой
-            pages = browser.pages
-            if pages:
-                page = pages[0]
-            else:
-                page = browser.new_page()
-            
-            page.goto("https://www.crunchbase.com/login")
-            
-            input("\n[Нажмите Enter после авторизации]")
+        cached = search_cache.get_many(self._search_key(w) for w in websites) if search_cache is not None else {}
+        misses = []
+        for i, website in enumerate(websites):
+            entry = cached.get(self._search_key(website))
+            if entry is None:
+                misses.append(i)
+                continue
+            crunchbase_url = f"{self.base_url}/organization/{entry['permalink']}" if entry['permalink'] else None
+            results[i] = (crunchbase_url, crunchbase_url is not None, None)
+        
+        if not misses:
+            return results
+        
+        responses = self._fetch_json_many(
+            [self._autocomplete_url(websites[i]) for i in misses], concurrency, call='cb_autocomplete'
+        )
+        
+        for i, (data, error) in zip(misses, responses):
+            if error is not None:
+                results[i] = (None, False, error)
+                continue
+            try:
+                crunchbase_url = self._parse_autocomplete(data)
+            except (AttributeError, TypeError) as e:
+                results[i] = (None, False, str(e))
+                continue
+            results[i] = (crunchbase_url, crunchbase_url is not None, None)
             
-            print("✓ Авторизация завершена, куки сохранены")
+            if search_cache is not None:
+                permalink = self._permalink(crunchbase_url) if crunchbase_url else None
+                search_cache.set(self._search_key(websites[i]), {'permalink': permalink}, negative=permalink is None)
+        return results
+    
+    def search_organization(self, website):
+        """
+        Ищет организацию на Crunchbase по website через общую сессию
+        Возвращает (crunchbase_url, success)
+        """
+        crunchbase_url, success, error = self.search_organizations([website], concurrency=1)[0]
+        if error is not None:
+            print(f"\n⚠ Ошибка поиска на Crunchbase для {website}: {error}")
+        return crunchbase_url, success
+    
+    def setup_authentication(self):
+        """
+        Запускает общую сессию браузера и проверяет авторизацию на Crunchbase
+        Браузер для входа открывается, только если сохраненные в user-data-dir куки устарели
+        """
+        self.session()
     
-    def search_organizations_batch(self, products):
+    def search_organizations_batch(self, products, journal=None, chunk_size=50, concurrency=8):
         """
         Ищет организации на Crunchbase для списка продуктов
         Добавляет ключ crunchbase_url к каждому продукту
+        
+        Продукты группируются по каноническому домену (build_domain_index):
+        каждый домен ищется один раз, результат получают все продукты группы.
+        Домены отправляются в браузер пачками по chunk_size, внутри пачки
+        одновременно идет не больше concurrency запросов
+        
+        journal: CheckpointJournal - результаты пишутся по мере готовности,
+                 уже найденные при прошлом запуске пропускаются
         """
-        print(f"\n🔍 Поиск компаний на Crunchbase ({len(products)} проектов)...")
+        started_at = time.time()
+        index = build_domain_index(products)
+        print(f"\n🔍 Поиск компаний на Crunchbase ({len(products)} проектов, уникальных доменов: {len(index)})...")
         
-        found_count = 0
+        found = {}  # домен -> crunchbase_url ('' - не найдено)
         
-        # Используем persistent context с сохраненными куками
-        with Camoufox(
-            headless=True, 
-            persistent_context=True,
-            user_data_dir=self.user_data_dir,
-            os=('windows'),
-            config=self.camoufox_config,
-            i_know_what_im_doing=True
-        ) as browser:
-            # Используем первую существующую страницу вместо создания новой
-            pages = browser.pages
-            if pages:
-                page = pages[0]
-            else:
-                page = browser.new_page()
-            
-            # Открываем главную страницу один раз
-            page.goto("https://www.crunchbase.com", timeout=30000, wait_until='domcontentloaded')
-            time.sleep(2)
-            
-            # Последовательно обрабатываем все продукты
-            with tqdm(total=len(products), desc="Поиск на CB", unit="comp") as pbar:
-                for product in products:
-                    crunchbase_url, success = self.search_organization(product['website'], page)
-                    if success and crunchbase_url:
-                        product['crunchbase_url'] = crunchbase_url
-                        found_count += 1
-                    else:
-                        product['crunchbase_url'] = ''
+        # Продолжение прерванного запуска
+        pending = list(index)
+        if journal is not None:
+            done = journal.completed('cb_search')
+            pending = []
+            for domain in index:
+                if domain in done:
+                    found[domain] = done[domain]['crunchbase_url']
+                else:
+                    pending.append(domain)
+            if len(pending) < len(index):
+                print(f"↻ Из журнала: {len(index) - len(pending)}")
+        
+        errors_count = 0
+        search_cache, _ = self._get_caches()
+        hits_before = search_cache.hits if search_cache is not None else 0
+        
+        if pending:
+            with tqdm(total=len(pending), desc="Поиск на CB", unit="comp") as pbar:
+                for start in range(0, len(pending), chunk_size):
+                    chunk = pending[start:start + chunk_size]
+                    results = self.search_organizations(chunk, concurrency)
+                    
+                    for domain, (crunchbase_url, success, error) in zip(chunk, results):
+                        found[domain] = crunchbase_url if success and crunchbase_url else ''
+                        
+                        # Ошибку запроса в журнал не пишем - при продолжении запуска домен будет запрошен снова
+                        if error is not None:
+                            errors_count += 1
+                        elif journal is not None:
+                            journal.record('cb_search', domain, {'crunchbase_url': found[domain]})
                     
-                    pbar.update(1)
-                    pbar.set_postfix({'найдено': found_count})
+                    pbar.update(len(chunk))
+                    pbar.set_postfix({'найдено': sum(1 for url in found.values() if url), 'ошибок': errors_count})
+        
+        if errors_count:
+            print(f"\n⚠ Ошибок запросов к Crunchbase: {errors_count}")
+        if search_cache is not None and search_cache.hits > hits_before:
+            print(f"✓ Из кэша: {search_cache.hits - hits_before}")
         
+        # Раздаем результат домена всем его продуктам
+        for product in products:
+            product['crunchbase_url'] = found.get(canonical_domain(product.get('website', '')), '')
+        
+        found_count = sum(1 for p in products if p['crunchbase_url'])
+        metrics.record_stage('cb_search', time.time() - started_at, len(index))
         print(f"✓ Найдено на Crunchbase: {found_count}/{len(products)}")
         return products
     
-    def get_funding_amount(self, crunchbase_url, page):
+    def _organization_api_url(self, crunchbase_url):
+        """URL JSON карточки организации с полем funding_total"""
+        permalink = self._permalink(crunchbase_url)
+        field_ids = quote('["identifier","funding_total"]')
+        return f"{self.base_url}/v4/data/entities/organizations/{quote(permalink)}?field_ids={field_ids}"
+    
+    def _format_money(self, money):
+        """{'value': 1500000, 'currency': 'USD'} -> '$1.5M' (как на странице Crunchbase)"""
+        value = money.get('value')
+        currency = money.get('currency')
+        if value is None:
+            value = money.get('value_usd')
+            currency = 'USD'
+        if value is None:
+            return ''
+        
+        amount = f"{value:.0f}"
+        for divider, suffix in ((1e9, 'B'), (1e6, 'M'), (1e3, 'K')):
+            if value >= divider:
+                amount = f"{value / divider:.1f}".rstrip('0').rstrip('.') + suffix
+                break
+        
+        symbol = self.CURRENCY_SYMBOLS.get(currency)
+        return f"{symbol}{amount}" if symbol else f"{currency} {amount}"
+    
+    def fetch_funding_amounts_api(self, crunchbase_urls, concurrency=8):
         """
-        Получает funding amount со страницы Crunchbase через открытую page
+        Получает funding через JSON API Crunchbase одним page.evaluate
+        Возвращает список (funding, error) в порядке crunchbase_urls,
+        funding '' - у компании нет данных о финансировании
         """
-        try:
-            page.goto(crunchbase_url, timeout=60000, wait_until='networkidle')
-            time.sleep(3)
-            
-            # Ищем элемент с funding
+        responses = self._fetch_json_many(
+            [self._organization_api_url(url) for url in crunchbase_urls], concurrency, call='cb_funding_api'
+        )
+        return self._parse_funding_responses(responses)
+    
+    def _parse_funding_responses(self, responses):
+        """Список (data, error) от JSON API -> список (funding, error)"""
+        results = []
+        for data, error in responses:
+            if error is not None:
+                results.append((None, error))
+                continue
             try:
-                overview_funding = page.query_selector('#overview_funding')
-                if overview_funding:
-                    links = overview_funding.query_selector_all('a')
-                    for link in links:
-                        text = link.inner_text()
-                        if '$' in text:
-                            return text.strip()
-            except Exception:
-                pass
-            
-            return None
-            
+                money = (data.get('properties') or {}).get('funding_total')
+                results.append((self._format_money(money) if money else '', None))
+            except (AttributeError, TypeError) as e:
+                results.append((None, str(e)))
+        return results
+    
+    def _cached_fundings(self, crunchbase_urls):
+        """crunchbase_url → funding для свежих записей кэша"""
+        _, funding_cache = self._get_caches()
+        if funding_cache is None:
+            return {}
+        
+        cached = funding_cache.get_many(self._permalink(url) for url in crunchbase_urls)
+        return {
+            url: cached[self._permalink(url)]['funding_amount']
+            for url in crunchbase_urls if self._permalink(url) in cached
+        }
+    
+    def _store_funding(self, crunchbase_url, funding):
+        """Пустой funding кэшируется как отрицательный результат (короткий TTL)"""
+        _, funding_cache = self._get_caches()
+        if funding_cache is not None:
+            funding_cache.set(self._permalink(crunchbase_url), {'funding_amount': funding or ''}, negative=not funding)
+    
+    def get_funding_amount(self, crunchbase_url):
+        """
+        Получает funding amount через общую сессию: кэш, затем JSON API,
+        при ошибке API - рендер страницы и поиск в #overview_funding
+        """
+        cached = self._cached_fundings([crunchbase_url])
+        if crunchbase_url in cached:
+            return cached[crunchbase_url] or None
+        
+        funding, error = self.fetch_funding_amounts_api([crunchbase_url], concurrency=1)[0]
+        if error is None:
+            self._store_funding(crunchbase_url, funding)
+            return funding or None
+        
+        funding, ok = self.session().run(self._scrape_funding_in_new_tab(crunchbase_url))
+        if ok:
+            self._store_funding(crunchbase_url, funding)
+        return funding
+    
+    async def _scrape_funding_in_new_tab(self, crunchbase_url):
+        """Возвращает (funding, ok), ok=False - страница не загрузилась"""
+        page = await self._session.browser.new_page()
+        try:
+            return await self._scrape_funding_amount_async(crunchbase_url, page), True
         except Exception as e:
             print(f"\n⚠ Ошибка получения funding для {crunchbase_url}: {e}")
-            return None
+            return None, False
+        finally:
+            await page.close()
+    
+    async def _scrape_funding_amount_async(self, crunchbase_url, page):
+        """Получает funding amount со страницы Crunchbase. Ошибки навигации пробрасываются"""
+        with metrics.track('cb_funding_page'):
+            await page.goto(crunchbase_url, timeout=60000, wait_until='networkidle')
+        await asyncio.sleep(3)
+        
+        try:
+            overview_funding = await page.query_selector('#overview_funding')
+            if overview_funding:
+                for link in await overview_funding.query_selector_all('a'):
+                    text = await link.inner_text()
+                    if '$' in text:
+                        return text.strip()
+        except Exception:
+            pass
+        
+        return None
     
-    def get_funding_amounts_batch(self, products):
+    def get_funding_amounts_batch(self, products, journal=None):
         """
         Получает funding amounts для списка продуктов через camoufox
+        Каждая компания загружается один раз, funding получают все ее продукты
+        
+        journal: CheckpointJournal - результаты пишутся по мере готовности,
+                 уже полученные при прошлом запуске пропускаются
         """
-        # Отслеживаем дубликаты crunchbase_url
-        seen_urls = {}
+        started_at = time.time()
         
+        # Один crunchbase_url у разных доменов - скорее ложное совпадение поиска,
+        # ссылку оставляем только первому домену (продуктам одного домена - всем)
+        owners = {}
         for p in products:
             cb_url = p.get('crunchbase_url')
             if cb_url:
-                if cb_url not in seen_urls:
-                    seen_urls[cb_url] = p['website']
-                else:
+                domain = canonical_domain(p['website'])
+                if owners.setdefault(cb_url, domain) != domain:
                     p['crunchbase_url'] = ''
         
-        # Фильтруем только продукты с непустым crunchbase_url
-        products_with_cb = [p for p in products if p.get('crunchbase_url')]
+        # Компания -> ее продукты
+        by_url = {}
+        for p in products:
+            if p.get('crunchbase_url'):
+                by_url.setdefault(p['crunchbase_url'], []).append(p)
         
-        if not products_with_cb:
+        if not by_url:
             print("\n⚠ Нет продуктов с Crunchbase URL для парсинга funding")
+            for product in products:
+                product.setdefault('funding_amount', '')
             return products
         
-        print(f"\n💰 Парсинг funding amounts ({len(products_with_cb)} компаний)...")
+        print(f"\n💰 Парсинг funding amounts ({len(by_url)} компаний)...")
         
-        # Создаем mapping для быстрого обновления
-        products_dict = {p['website']: p for p in products}
-
-        # Используем persistent context с сохраненными куками
-        with Camoufox(
-            headless=True, 
-            persistent_context=True,
-            user_data_dir=self.user_data_dir,
-            os=('windows'),
-            config=self.camoufox_config,
-            i_know_what_im_doing=True
-        ) as browser:
-            page = browser.new_page()
+        fundings = {}  # crunchbase_url -> funding
+        
+        # Продолжение прерванного запуска
+        if journal is not None:
+            done = journal.completed('cb_funding')
+            for crunchbase_url in by_url:
+                if crunchbase_url in done:
+                    fundings[crunchbase_url] = done[crunchbase_url]['funding_amount']
+            if fundings:
+                print(f"↻ Из журнала: {len(fundings)}")
+        
+        # Компании, уже получавшие funding в прошлых запусках
+        pending = [url for url in by_url if url not in fundings]
+        cached = self._cached_fundings(pending)
+        if cached:
+            fundings.update(cached)
+            pending = [url for url in pending if url not in cached]
+            print(f"✓ Из кэша: {len(cached)}, осталось: {len(pending)}")
+        
+        if pending:
+            self._fetch_fundings(pending, fundings, journal)
+        
+        for crunchbase_url, group in by_url.items():
+            for product in group:
+                product['funding_amount'] = fundings.get(crunchbase_url) or ''
+        
+        # Для продуктов без crunchbase_url устанавливаем пустой funding
+        for product in products:
+            if 'funding_amount' not in product:
+                product['funding_amount'] = ''
+        
+        metrics.record_stage('cb_funding', time.time() - started_at, len(by_url))
+        print(f"✓ Парсинг funding завершен")
+        return products
+    
+    def fetch_fundings(self, crunchbase_urls, concurrency=8):
+        """
+        Funding для пачки компаний (воркеры очереди): кэш, JSON API, рендер для ошибок API
+        Возвращает (fundings, failed): crunchbase_url -> funding и множество
+        компаний, страницу которых не удалось загрузить
+        """
+        fundings = self._cached_fundings(crunchbase_urls)
+        pending = [url for url in crunchbase_urls if url not in fundings]
+        failed = set()
+        if pending:
+            self._fetch_fundings(pending, fundings, concurrency=concurrency, failed=failed)
+        return fundings, failed
+    
+    def _fetch_fundings(self, crunchbase_urls, fundings, journal=None, chunk_size=50, concurrency=8, failed=None):
+        """
+        Получает funding для crunchbase_urls в общей сессии браузера и пишет в fundings
+        Пачками через JSON API, рендер страниц - только для ошибок API,
+        параллельно в self.tabs вкладках. failed - множество для компаний с ошибкой загрузки
+        """
+        session = self.session()
+        session.run(self._fetch_fundings_async(
+            session, crunchbase_urls, fundings, journal, chunk_size, concurrency, failed
+        ))
+    
+    async def _fetch_fundings_async(self, session, crunchbase_urls, fundings, journal, chunk_size, concurrency,
+                                    failed=None):
+        counts = {'API': 0, 'рендер': 0, 'ошибок': 0}
+        started_at = time.time()
+        
+        with tqdm(total=len(crunchbase_urls), desc="Парсинг funding", unit="comp") as pbar:
+            def on_done(crunchbase_url, funding, ok=True):
+                fundings[crunchbase_url] = funding or ''
+                
+                # Ошибку загрузки не кэшируем и не пишем в журнал -
+                # в следующий раз (и при продолжении запуска) компания будет запрошена снова
+                if ok:
+                    self._store_funding(crunchbase_url, funding)
+                    if journal is not None:
+                        journal.record('cb_funding', crunchbase_url, {'funding_amount': funding or ''})
+                elif failed is not None:
+                    failed.add(crunchbase_url)
+                
+                pbar.update(1)
+                elapsed = time.time() - started_at
+                pbar.set_postfix({**counts, 'комп/мин': f"{pbar.n / elapsed * 60:.0f}" if elapsed > 0 else '?'})
+            
+            fallback = []
+            for start in range(0, len(crunchbase_urls), chunk_size):
+                chunk = crunchbase_urls[start:start + chunk_size]
+                urls = [self._organization_api_url(url) for url in chunk]
+                responses = await self._fetch_json_many_async(urls, session.page, concurrency, call='cb_funding_api')
+                
+                for crunchbase_url, (funding, error) in zip(chunk, self._parse_funding_responses(responses)):
+                    if error is None:
+                        counts['API'] += 1
+                        on_done(crunchbase_url, funding)
+                    else:
+                        # API не ответило - запасной путь через рендер страницы
+                        fallback.append(crunchbase_url)
             
-            # Парсим все страницы
-            with tqdm(total=len(products_with_cb), desc="Парсинг funding", unit="comp") as pbar:
-                for product in products_with_cb:
-                    crunchbase_url = product.get('crunchbase_url')
-                    if crunchbase_url:
-                        funding = self.get_funding_amount(crunchbase_url, page)
-                        products_dict[product['website']]['funding_amount'] = funding or ''
+            if fallback:
+                await self._scrape_fundings_in_tabs(session.browser, fallback, on_done, counts)
+    
+    async def _scrape_fundings_in_tabs(self, browser, crunchbase_urls, on_done, counts):
+        """
+        Рендерит страницы организаций в self.tabs вкладках одновременно
+        Открытия страниц идут не чаще self.pace_seconds по всем вкладкам,
+        ошибка во вкладке затрагивает только ее компанию - вкладка пересоздается.
+        Если вкладку не удается открыть, она выходит из работы, ее компании
+        достаются остальным вкладкам
+        """
+        queue = asyncio.Queue()
+        for crunchbase_url in crunchbase_urls:
+            queue.put_nowait(crunchbase_url)
+        pacer = _Pacer(self.pace_seconds)
+        
+        async def tab():
+            page = None
+            try:
+                while True:
+                    # Сначала берем компанию: пока открывается вкладка, очередь могут разобрать другие
+                    try:
+                        crunchbase_url = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    
+                    if page is None:
+                        try:
+                            page = await browser.new_page()
+                        except Exception as e:
+                            print(f"\n⚠ Не удалось открыть вкладку: {e}")
+                            # Компания возвращается остальным вкладкам
+                            queue.put_nowait(crunchbase_url)
+                            return
+                    
+                    await pacer.wait()
+                    
+                    ok = True
+                    try:
+                        funding = await self._scrape_funding_amount_async(crunchbase_url, page)
+                    except Exception as e:
+                        ok = False
+                        print(f"\n⚠ Ошибка получения funding для {crunchbase_url}: {e}")
+                        funding = None
+                        counts['ошибок'] += 1
+                        try:
+                            await page.close()
+                        except Exception:
+                            pass
+                        page = None
                     
-                    pbar.update(1)
+                    counts['рендер'] += 1
+                    on_done(crunchbase_url, funding, ok)
+            finally:
+                if page is not None:
+                    try:
+                        await page.close()
+                    except Exception:
+                        pass
+        
+        await asyncio.gather(*(tab() for _ in range(min(self.tabs, len(crunchbase_urls)))))
+        
+        # Ни одна вкладка не открылась - оставшиеся компании считаются ошибкой загрузки
+        while not queue.empty():
+            counts['ошибок'] += 1
+            on_done(queue.get_nowait(), None, ok=False)
+    
+    def enrich_stream(self, in_queue, sink, journal=None, batch_size=50, concurrency=8, max_wait=1.0):
+        """
+        Потоковое обогащение для конвейера: берет продукты из in_queue до None,
+        ищет компанию и funding и передает готовый продукт в sink(product)
+        
+        Продукты набираются в пачки до batch_size (или сколько пришло за max_wait сек):
+        новые домены пачки ищутся одним пакетным autocomplete, их funding - через
+        JSON API и вкладки, как в пакетном режиме (concurrency - одновременных запросов).
+        Каждый канонический домен обрабатывается один раз, повторные продукты
+        получают готовый результат. Работает в общей сессии браузера
+        """
+        by_domain = {}  # домен -> (crunchbase_url, funding)
+        owners = {}     # crunchbase_url -> первый домен с этой ссылкой
+        started_at = time.time()
+        
+        done = False
+        while not done:
+            batch = [in_queue.get()]
+            deadline = time.time() + max_wait
+            while batch[-1] is not None and len(batch) < batch_size:
+                try:
+                    batch.append(in_queue.get(timeout=max(0, deadline - time.time())))
+                except Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                done = True
             
-            # Для продуктов без crunchbase_url устанавливаем пустой funding
-            for product in products_dict.values():
-                if 'funding_amount' not in product:
-                    product['funding_amount'] = ''
+            self._enrich_batch(batch, by_domain, owners, journal, concurrency)
+            for product in batch:
+                product['crunchbase_url'], product['funding_amount'] = by_domain.get(
+                    canonical_domain(product['website']), ('', '')
+                )
+                sink(product)
         
-        print(f"✓ Парсинг funding завершен")
-        return list(products_dict.values())
+        metrics.record_stage('crunchbase', time.time() - started_at, len(by_domain))
+    
+    def _enrich_batch(self, products, by_domain, owners, journal, concurrency):
+        """Ищет компании и funding для новых доменов пачки и дописывает их в by_domain"""
+        domains = list(dict.fromkeys(
+            domain for domain in (canonical_domain(p['website']) for p in products)
+            if domain and domain not in by_domain
+        ))
+        if not domains:
+            return
+        
+        found = {}
+        pending = []
+        for domain in domains:
+            entry = journal.get('cb_search', domain) if journal is not None else None
+            if entry is not None:
+                found[domain] = entry['crunchbase_url']
+            else:
+                pending.append(domain)
+        
+        if pending:
+            for domain, (crunchbase_url, success, error) in zip(pending, self.search_organizations(pending, concurrency)):
+                found[domain] = crunchbase_url if success and crunchbase_url else ''
+                # Ошибку запроса в журнал не пишем - при продолжении запуска домен будет запрошен снова
+                if error is not None:
+                    print(f"\n⚠ Ошибка поиска на Crunchbase для {domain}: {error}")
+                elif journal is not None:
+                    journal.record('cb_search', domain, {'crunchbase_url': found[domain]})
+        
+        # Та же компания у другого домена - как в пакетном режиме, оставляем ссылку первому
+        for domain in domains:
+            cb_url = found[domain]
+            if cb_url and owners.setdefault(cb_url, domain) != domain:
+                found[domain] = ''
+        
+        fundings = {}
+        pending = []
+        for cb_url in dict.fromkeys(url for url in found.values() if url):
+            entry = journal.get('cb_funding', cb_url) if journal is not None else None
+            if entry is not None:
+                fundings[cb_url] = entry['funding_amount']
+            else:
+                pending.append(cb_url)
+        
+        if pending:
+            fetched, failed = self.fetch_fundings(pending, concurrency)
+            for cb_url in pending:
+                fundings[cb_url] = fetched.get(cb_url) or ''
+                # Страница не загрузилась - не окончательный результат
+                if journal is not None and cb_url not in failed:
+                    journal.record('cb_funding', cb_url, {'funding_amount': fundings[cb_url]})
+        
+        for domain in domains:
+            by_domain[domain] = (found[domain], fundings.get(found[domain], '') if found[domain] else '')
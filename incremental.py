@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+
+def parse_created_at(value):
+    """Разбирает created_at из ProductHunt/Excel в наивный локальный datetime"""
+    if isinstance(value, datetime):
+        parsed = value
+    elif value:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    else:
+        return None
+    
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def get_watermark(products):
+    """Самый новый created_at среди уже сохраненных продуктов (None, если дат нет)"""
+    dates = [d for d in (parse_created_at(p.get('created_at')) for p in products) if d]
+    return max(dates) if dates else None
+
+
+def get_sync_window(products, tail_days=7, now=None):
+    """
+    Окно инкрементальной синхронизации: от watermark минус tail_days до now
+    Хвост в tail_days нужен, чтобы обновить голоса у недавних запусков
+    Возвращает (start_date, end_date, watermark) или None, если watermark неизвестен
+    """
+    watermark = get_watermark(products)
+    if watermark is None:
+        return None
+    now = now or datetime.now()
+    return watermark - timedelta(days=tail_days), now, watermark
+
+
+def merge_incremental(existing, fetched):
+    """
+    Сливает свежие посты с сохраненной таблицей по producthunt_url
+    
+    У уже известных продуктов обновляется votesCount (остальное - website,
+    данные Crunchbase - сохраняется), неизвестные возвращаются отдельно:
+    им еще нужен резолв URL
+    
+    Возвращает (refreshed_count, new_products)
+    """
+    by_url = {p.get('producthunt_url'): p for p in existing if p.get('producthunt_url')}
+    
+    refreshed_count = 0
+    new_products = []
+    for product in fetched:
+        known = by_url.get(product['producthunt_url'])
+        if known is None:
+            new_products.append(product)
+        elif known.get('votesCount') != product['votesCount']:
+            known['votesCount'] = product['votesCount']
+            refreshed_count += 1
+    
+    return refreshed_count, new_products
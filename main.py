@@ -6,14 +6,26 @@ ssl._create_default_https_context = ssl._create_unverified_context
 
 import sys
 import os
+import re
+import subprocess
+import zipfile
 from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
-from datetime import datetime
+from openpyxl.utils import get_column_letter
+from datetime import datetime, timedelta
 
-from config_manager import get_producthunt_token
+from config_manager import get_producthunt_tokens, get_setting, set_setting
 from producthunt_parser import ProductHuntParser
 from utils import resolve_urls_batch
 from crunchbase_parser import CrunchbaseParser
+from checkpoint import CheckpointJournal
+from pipeline import run_pipeline
+from storage import open_store
+from metrics import metrics
+from work_queue import STAGES, coordinate, open_work_queue
+from worker import spawn_workers
+from incremental import get_sync_window, merge_incremental
 
 
 def get_user_input():
@@ -31,30 +43,42 @@ def get_user_input():
     blacklist = [word.strip() for word in blacklist_input.split(',') if word.strip()]
     
     # Максимум сотрудников
-    max_makers_input = input("Максимальное количество сотрудников [По умолчанию: 10]: ").strip() or "10"
-    max_makers = int(max_makers_input)
+    max_makers_input = input("Максимальное количество сотрудников (0 - без ограничения) [По умолчанию: 10]: ").strip() or "10"
+    # Без ограничения makers не запрашиваются вовсе - запросы к API дешевле
+    max_makers = int(max_makers_input) or None
     
     # Лимит проектов
     max_products_input = input("Лимит количества проектов [По умолчанию: 5000]: ").strip() or "5000"
     max_products = int(max_products_input)
     
+    # Конвейер: резолв и Crunchbase начинаются, пока ProductHunt еще парсится
+    pipeline_input = input("Конвейерный режим (этапы параллельно)? (y/N): ").strip().lower()
+    pipeline = pipeline_input in ['y', 'yes', 'д', 'да']
+    
     print("="*60 + "\n")
     
     return {
         'years': years,
         'blacklist': blacklist,
         'max_makers': max_makers,
-        'max_products': max_products
+        'max_products': max_products,
+        'pipeline': pipeline
     }
 
 
-def save_to_excel(products, filename='producthunt.xlsx', include_crunchbase=False):
-    """Сохраняет продукты в Excel файл"""
+def save_to_excel(products, filename='producthunt.xlsx', include_crunchbase=False, width_sample=1000):
+    """
+    Сохраняет продукты в Excel файл потоково (write-only режим openpyxl)
+    products может быть любым итератором, например выходом конвейера
+    
+    В write-only режиме ширины колонок пишутся в файл до строк, поэтому они
+    считаются по заголовку и первым width_sample строкам, которые
+    буферизуются; остальные строки сразу уходят в файл
+    """
     print(f"\n💾 Сохранение результатов в {filename}...")
     
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Products"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Products")
     
     # Заголовки
     headers = ['name', 'description', 'votesCount', 'website', 'producthunt_url', 'makers', 'created_at']
@@ -62,21 +86,14 @@ def save_to_excel(products, filename='producthunt.xlsx', include_crunchbase=Fals
     if include_crunchbase:
         headers.extend(['crunchbase_url', 'funding_amount'])
     
-    ws.append(headers)
-    
-    # Стилизация заголовков
-    for cell in ws[1]:
-        cell.font = Font(bold=True)
-    
-    # Данные
-    for product in products:
+    def make_row(product):
         row = [
             product.get('name', ''),
             product.get('description', ''),
             product.get('votesCount', 0),
             product.get('website', ''),
             product.get('producthunt_url', ''),
-            product.get('makers', 0),
+            product.get('makers'),
             product.get('created_at', '')
         ]
         
@@ -86,71 +103,185 @@ def save_to_excel(products, filename='producthunt.xlsx', include_crunchbase=Fals
                 product.get('funding_amount', '')
             ])
         
+        return row
+    
+    # Автоширина колонок по заголовку и первым строкам (str() один раз на ячейку)
+    widths = [len(header) for header in headers]
+    products = iter(products)
+    buffered = []
+    for product in products:
+        row = make_row(product)
+        buffered.append(row)
+        for i, value in enumerate(row):
+            length = len(str(value))
+            if length > widths[i]:
+                widths[i] = length
+        if len(buffered) >= width_sample:
+            break
+    
+    for i, width in enumerate(widths):
+        ws.column_dimensions[get_column_letter(i + 1)].width = min(width + 2, 50)
+    
+    # Стилизация заголовков
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    ws.append(header_cells)
+    
+    # Данные
+    count = 0
+    for row in buffered:
         ws.append(row)
+        count += 1
+    del buffered
     
-    # Автоширина колонок
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
+    for product in products:
+        ws.append(make_row(product))
+        count += 1
     
     wb.save(filename)
     print(f"✓ Файл сохранен: {filename}")
-    print(f"  Записей: {len(products)}")
+    print(f"  Записей: {count}")
+    return count
 
 
-def load_products_from_excel(filename='producthunt.xlsx'):
-    """Загружает продукты из существующего Excel файла"""
+def iter_products_from_excel(filename='producthunt.xlsx', columns=None):
+    """
+    Лениво читает продукты из Excel файла (read-only режим openpyxl)
+    columns: список нужных колонок (None - все), остальные не попадают в словари
+    """
+    wb = load_workbook(filename, read_only=True)
     try:
-        wb = load_workbook(filename)
-        ws = wb.active
+        rows = wb.active.iter_rows(values_only=True)
+        headers = next(rows, None) or ()
         
-        products = []
-        headers = [cell.value for cell in ws[1]]
+        wanted = [
+            (i, header) for i, header in enumerate(headers)
+            if header is not None and (columns is None or header in columns)
+        ]
         
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            product = {}
-            for i, value in enumerate(row):
-                if i < len(headers):
-                    product[headers[i]] = value
-            products.append(product)
+        for row in rows:
+            yield {header: row[i] if i < len(row) else None for i, header in wanted}
+    finally:
+        wb.close()
+
+
+def count_excel_rows(filename='producthunt.xlsx'):
+    """
+    Количество проектов в таблице по размерам листа (<dimension>), без чтения строк
+    Если размеры в файле не записаны (так пишет write-only режим) или неверны,
+    считаются теги <row> в сыром XML листа - без разбора ячеек
+    """
+    with zipfile.ZipFile(filename) as archive:
+        sheet_path = _first_sheet_path(archive)
+        
+        with archive.open(sheet_path) as sheet:
+            head = sheet.read(1 << 16)
+        match = re.search(rb'<(?:\w+:)?dimension\s+ref="[A-Z]+\d+(?::[A-Z]+(\d+))?"', head)
+        if match and match.group(1) and int(match.group(1)) > 1:
+            return int(match.group(1)) - 1  # минус заголовок
         
-        return products
+        return max(_count_xml_rows(archive, sheet_path) - 1, 0)
+
+
+def _first_sheet_path(archive):
+    """Путь к XML первого листа книги по xl/workbook.xml и его связям"""
+    workbook = archive.read('xl/workbook.xml')
+    rels = archive.read('xl/_rels/workbook.xml.rels')
+    
+    sheet_id = re.search(rb'<(?:\w+:)?sheet\b[^>]*?\s(?:\w+:)?id="([^"]+)"', workbook).group(1)
+    for relationship in re.findall(rb'<(?:\w+:)?Relationship\b[^>]*>', rels):
+        if re.search(rb'\sId="' + re.escape(sheet_id) + rb'"', relationship):
+            target = re.search(rb'\sTarget="([^"]+)"', relationship).group(1).decode()
+            return target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+    raise ValueError("Лист не найден в xl/workbook.xml")
+
+
+def _count_xml_rows(archive, sheet_path, chunk_size=1 << 20):
+    """Считает строки листа по тегам <row> в сыром XML, не разбирая ячейки"""
+    pattern = re.compile(rb'<(?:\w+:)?row[\s>/]')
+    count = 0
+    tail = b''
+    with archive.open(sheet_path) as sheet:
+        while True:
+            chunk = sheet.read(chunk_size)
+            if not chunk:
+                break
+            data = tail + chunk
+            # Последние байты оставляем на следующий шаг: тег мог разрезаться границей чанка
+            cut = max(len(data) - 16, 0)
+            count += sum(1 for match in pattern.finditer(data) if match.start() < cut)
+            tail = data[cut:]
+    return count + len(pattern.findall(tail))
+
+
+def load_products_from_excel(filename='producthunt.xlsx', columns=None):
+    """Загружает продукты из существующего Excel файла"""
+    try:
+        return list(iter_products_from_excel(filename, columns))
     except Exception as e:
         print(f"❌ Ошибка загрузки файла: {e}")
         return None
 
 
-def check_existing_table():
-    """Проверяет наличие существующей таблицы и предлагает варианты"""
+def import_excel(store, filename='producthunt.xlsx'):
+    """Если хранилище пустое, а таблица есть (данные прошлых версий) - импортирует ее в хранилище"""
+    if store.count() == 0 and os.path.exists(filename):
+        print(f"\n📂 Импорт {filename} в хранилище {store.path}...")
+        products = load_products_from_excel(filename)
+        if products:
+            # Пустая ячейка Excel - пустое значение, а не "этап не выполнялся"
+            store.replace_all(
+                {key: '' if value is None else value for key, value in p.items()}
+                for p in products if p.get('producthunt_url')
+            )
+
+
+def load_dataset(store):
+    """Продукты из хранилища по убыванию голосов (с импортом producthunt.xlsx при первом запуске)"""
+    import_excel(store)
+    return list(store.iter_products())
+
+
+def export_excel(store, include_crunchbase=None):
+    """Выгружает хранилище в producthunt.xlsx (Excel - только формат экспорта)"""
+    if include_crunchbase is None:
+        include_crunchbase = store.has_values('crunchbase_url')
+    return save_to_excel(store.iter_products(), include_crunchbase=include_crunchbase)
+
+
+def check_existing_table(store):
+    """Проверяет наличие сохраненных данных и предлагает варианты"""
     filename = 'producthunt.xlsx'
+    stored_count = store.count()
     
-    if os.path.exists(filename):
+    if stored_count or os.path.exists(filename):
         print("\n" + "="*60)
-        print("📋 НАЙДЕНА СУЩЕСТВУЮЩАЯ ТАБЛИЦА")
+        print("📋 НАЙДЕНЫ СОХРАНЕННЫЕ ДАННЫЕ")
         print("="*60)
-        print(f"Файл: {filename}")
         
-        # Получаем информацию о файле
-        try:
-            wb = load_workbook(filename)
-            ws = wb.active
-            row_count = ws.max_row - 1  # минус заголовок
-            print(f"Проектов в таблице: {row_count}")
-        except:
-            print("Не удалось прочитать информацию о файле")
+        if stored_count:
+            print(f"Хранилище: {store.path}")
+            print(f"Проектов: {stored_count}")
+        else:
+            print(f"Файл: {filename}")
+            
+            # Получаем информацию о файле
+            try:
+                row_count = count_excel_rows(filename)
+                print(f"Проектов в таблице: {row_count}")
+            except:
+                print("Не удалось прочитать информацию о файле")
         
         print("\nВыберите действие:")
-        print("1. Начать парсинг ProductHunt с нуля (старая таблица будет перезаписана)")
-        print("2. Продолжить с Crunchbase парсингом (использовать существующую таблицу)")
-        print("3. Выход")
+        print("1. Начать парсинг ProductHunt с нуля (сохраненные данные будут перезаписаны)")
+        print("2. Продолжить с Crunchbase парсингом (использовать сохраненные данные)")
+        print("3. Инкрементальное обновление (только новые проекты + голоса недавних)")
+        print("4. Экспорт в Excel (producthunt.xlsx из хранилища)")
+        print("5. Продолжить обработку через очередь (воркеры worker.py)")
+        print("6. Выход")
         print("="*60)
         
         choice = input("\nВаш выбор [По умолчанию: 1]: ").strip()
@@ -158,11 +289,17 @@ def check_existing_table():
         if choice == '2':
             return 'crunchbase'
         elif choice == '3':
+            return 'incremental'
+        elif choice == '4':
+            return 'export'
+        elif choice == '5':
+            return 'queue'
+        elif choice == '6':
             print("\n👋 До свидания!")
             return 'exit'
         else:
             # По умолчанию или если выбрано 1
-            confirm = input("\n⚠ Старая таблица будет удалена. Продолжить? (y/n) [По умолчанию: y]: ").strip().lower()
+            confirm = input("\n⚠ Сохраненные данные будут удалены. Продолжить? (y/n) [По умолчанию: y]: ").strip().lower()
             if confirm in ['n', 'no', 'н', 'нет']:
                 print("\n👋 До свидания!")
                 return 'exit'
@@ -171,144 +308,429 @@ def check_existing_table():
     return 'new'
 
 
+def ask_resume(journal):
+    """Предлагает продолжить прерванный запуск. Возвращает запись run или None"""
+    if not journal.has_unfinished_run():
+        return None
+    
+    run = journal.run
+    print("\n" + "="*60)
+    print("↻ НАЙДЕН НЕЗАВЕРШЕННЫЙ ЗАПУСК")
+    print("="*60)
+    print(f"Начат: {run.get('started_at', '?')}")
+    mode_names = {
+        'new': 'полный парсинг',
+        'crunchbase': 'Crunchbase по существующей таблице',
+        'incremental': 'инкрементальное обновление'
+    }
+    print(f"Режим: {mode_names.get(run['mode'], run['mode'])}")
+    print(f"Страниц PH: {len(journal.completed('ph_page'))}, "
+          f"URL: {len(journal.completed('resolve'))}, "
+          f"поиск CB: {len(journal.completed('cb_search'))}, "
+          f"funding: {len(journal.completed('cb_funding'))}")
+    print("="*60)
+    
+    choice = input("\nПродолжить с места остановки? (Y/n): ").strip().lower()
+    if choice in ['', 'y', 'yes', 'д', 'да']:
+        return run
+    
+    journal.clear()
+    return None
+
+
+def ask_continue_crunchbase(journal):
+    """Вопрос о продолжении с Crunchbase (при продолжении запуска ответ берется из журнала)"""
+    continue_crunchbase = journal.get('decision', 'crunchbase')
+    if continue_crunchbase is None:
+        print("\n" + "="*60)
+        continue_input = input("Продолжить с парсингом Crunchbase? (Y/n): ").strip().lower()
+        continue_crunchbase = continue_input in ['', 'y', 'yes', 'д', 'да']
+        journal.record('decision', 'crunchbase', continue_crunchbase)
+    return continue_crunchbase
+
+
+def run_pipeline_mode(parser, journal, store):
+    """Конвейерный режим: все этапы параллельно, одно сохранение в конце"""
+    # В конвейере Crunchbase стартует сразу, поэтому спрашиваем заранее
+    crunchbase = None
+    if ask_continue_crunchbase(journal):
+        crunchbase = CrunchbaseParser()
+        crunchbase.setup_authentication()
+    
+    try:
+        products = run_pipeline(parser, journal=journal, crunchbase=crunchbase)
+    finally:
+        if crunchbase is not None:
+            crunchbase.close()
+    
+    if not products:
+        print("\n❌ Не найдено ни одного доступного продукта по заданным критериям")
+        return
+    
+    store.replace_all(products)
+    export_excel(store, include_crunchbase=crunchbase is not None)
+    
+    print("\n" + "="*60)
+    print("✅ ПАРСИНГ ЗАВЕРШЕН (КОНВЕЙЕР)")
+    print("="*60)
+    print(f"Итоговое количество проектов: {len(products)}")
+    if crunchbase is not None:
+        print(f"Найдено на Crunchbase: {sum(1 for p in products if p.get('crunchbase_url'))}")
+        print(f"С данными о финансировании: {sum(1 for p in products if p.get('funding_amount'))}")
+    print(f"Файл: producthunt.xlsx")
+    print("="*60 + "\n")
+
+
+def run_crunchbase(products, journal, title, store):
+    """Поиск на Crunchbase, funding, сохранение и итоговая статистика"""
+    # Создаем парсер Crunchbase
+    crunchbase = CrunchbaseParser()
+    
+    # Одна сессия браузера на авторизацию, поиск и funding
+    try:
+        # Авторизация на Crunchbase (вход запрашивается, только если сессия устарела)
+        crunchbase.setup_authentication()
+        
+        # Парсинг Crunchbase - поиск компаний
+        products = crunchbase.search_organizations_batch(products, journal=journal)
+        
+        # Парсинг Crunchbase - получение funding
+        products = crunchbase.get_funding_amounts_batch(products, journal=journal)
+    finally:
+        crunchbase.close()
+    
+    # Шаг 9: Сохранение финального результата (в хранилище - только колонки Crunchbase)
+    store.upsert_many(
+        {key: p.get(key, '') for key in ('producthunt_url', 'crunchbase_url', 'funding_amount')}
+        for p in products
+    )
+    export_excel(store, include_crunchbase=True)
+    
+    print("\n" + "="*60)
+    print(f"✅ {title}")
+    print("="*60)
+    print(f"Итоговое количество проектов: {len(products)}")
+    
+    # Статистика по Crunchbase
+    cb_found = sum(1 for p in products if p.get('crunchbase_url'))
+    funding_found = sum(1 for p in products if p.get('funding_amount'))
+    
+    print(f"Найдено на Crunchbase: {cb_found}")
+    print(f"С данными о финансировании: {funding_found}")
+    print(f"Файл: producthunt.xlsx")
+    print("="*60 + "\n")
+
+
+def use_work_queue():
+    """Резолв и Crunchbase через очередь и процессы worker.py (секция work_queue в config.json)"""
+    return get_setting('work_queue', {}).get('enabled', False)
+
+
+def run_queue_mode(store, crunchbase, fresh=True):
+    """
+    Режим очереди: задачи резолва и Crunchbase ставятся в queue.sqlite,
+    их выполняют процессы worker.py (local_workers штук запускаются здесь,
+    остальные можно запустить вручную), main.py сливает результаты в хранилище
+    fresh=False - продолжение: очередь не очищается, выбор Crunchbase берется из нее
+    """
+    settings = get_setting('work_queue', {})
+    queue = open_work_queue()
+    workers = []
+    try:
+        if fresh:
+            queue.clear()
+            queue.set_meta('crunchbase', crunchbase)
+        else:
+            crunchbase = queue.get_meta('crunchbase', crunchbase)
+        
+        if crunchbase:
+            # Вход на Crunchbase - один раз здесь, воркеры копируют профиль с куками
+            parser = CrunchbaseParser()
+            try:
+                parser.setup_authentication()
+            finally:
+                parser.close()
+        
+        stages = STAGES if crunchbase else ('resolve',)
+        workers = spawn_workers(settings.get('local_workers', 2), stages)
+        if workers:
+            print(f"\n👷 Запущено локальных воркеров: {len(workers)} (логи в workers/)")
+        
+        products = coordinate(store, queue, crunchbase, poll_seconds=settings.get('poll_seconds', 2), workers=workers)
+    finally:
+        # После coordinate воркеры завершаются сами, при ошибке - останавливаем
+        for worker in workers:
+            try:
+                worker.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                worker.terminate()
+        queue.close()
+    
+    total = export_excel(store, include_crunchbase=crunchbase)
+    
+    print("\n" + "="*60)
+    print("✅ ОБРАБОТКА ЧЕРЕЗ ОЧЕРЕДЬ ЗАВЕРШЕНА")
+    print("="*60)
+    print(f"Итоговое количество проектов: {total}")
+    if crunchbase:
+        print(f"Найдено на Crunchbase: {sum(1 for p in products if p.get('crunchbase_url'))}")
+        print(f"С данными о финансировании: {sum(1 for p in products if p.get('funding_amount'))}")
+    print(f"Файл: producthunt.xlsx")
+    print("="*60 + "\n")
+
+
+def run_incremental(journal, store, resumed=None):
+    """
+    Инкрементальное обновление producthunt.xlsx:
+    запрашиваются только посты новее сохраненного watermark (с хвостом
+    incremental_tail_days для обновления голосов), новые проекты проходят
+    резолв URL (и Crunchbase, если он есть в таблице), затем все сливается
+    """
+    print("\n📂 Загрузка сохраненных данных...")
+    existing = load_dataset(store)
+    
+    if not existing:
+        print("❌ Не удалось загрузить сохраненные данные")
+        return
+    
+    has_crunchbase = store.has_values('crunchbase_url')
+    
+    if resumed:
+        params = resumed['params']
+    else:
+        tail_days = get_setting('incremental_tail_days', 7)
+        window = get_sync_window(existing, tail_days=tail_days)
+        if window is None:
+            print("❌ В таблице нет дат created_at - инкрементальное обновление невозможно")
+            return
+        start_date, end_date, watermark = window
+        
+        # Фильтры - как у последнего полного парсинга
+        params = dict(get_setting('last_parse_params', {}))
+        params.setdefault('blacklist', [])
+        params.setdefault('max_makers', 10)
+        params.update({
+            'years': 0,
+            'max_products': get_setting('incremental_max_products', 100000),
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        })
+        
+        print(f"✓ Загружено проектов: {len(existing)}")
+        print(f"Последний сохраненный проект: {watermark.strftime('%Y-%m-%d %H:%M')}")
+        print(f"Обновление голосов за последние {tail_days} дн. до него")
+        journal.start_run('incremental', params)
+    
+    tokens = get_producthunt_tokens()
+    parser = ProductHuntParser(
+        tokens=tokens,
+        years=params['years'],
+        blacklist=params['blacklist'],
+        max_makers=params['max_makers'],
+        max_products=params['max_products'],
+        start_date=datetime.fromisoformat(params['start_date']),
+        end_date=datetime.fromisoformat(params['end_date'])
+    )
+    fetched = parser.parse(journal=journal)
+    
+    refreshed_count, new_products = merge_incremental(existing, fetched)
+    print(f"\n✓ Обновлены голоса: {refreshed_count}, новых проектов: {len(new_products)}")
+    
+    # Голоса известных проектов обновляются на месте
+    known_urls = {p['producthunt_url'] for p in existing}
+    store.upsert_many(
+        {'producthunt_url': p['producthunt_url'], 'votesCount': p['votesCount']}
+        for p in fetched if p['producthunt_url'] in known_urls
+    )
+    
+    if new_products:
+        new_products = resolve_urls_batch(new_products, max_workers=20, journal=journal)
+    
+    if new_products and has_crunchbase:
+        crunchbase = CrunchbaseParser()
+        try:
+            crunchbase.setup_authentication()
+            new_products = crunchbase.search_organizations_batch(new_products, journal=journal)
+            new_products = crunchbase.get_funding_amounts_batch(new_products, journal=journal)
+        finally:
+            crunchbase.close()
+    
+    store.upsert_many(new_products)
+    total = export_excel(store, include_crunchbase=has_crunchbase)
+    
+    print("\n" + "="*60)
+    print("✅ ИНКРЕМЕНТАЛЬНОЕ ОБНОВЛЕНИЕ ЗАВЕРШЕНО")
+    print("="*60)
+    print(f"Добавлено проектов: {len(new_products)}")
+    print(f"Итоговое количество проектов: {total}")
+    print(f"Файл: producthunt.xlsx")
+    print("="*60 + "\n")
+    
+    journal.clear()
+
+
 def main():
+    store = None
     try:
         print("\n" + "="*60)
         print("🚀 ПОИСК ИДЕИ ДЛЯ СТАРТАПА")
         print("="*60)
         
-        # Проверяем наличие существующей таблицы
-        mode = check_existing_table()
+        # Метрики этапов: metrics.json и metrics.prom (периодически и в конце запуска)
+        metrics.start_reporting()
+        
+        # Журнал прогресса: после сбоя можно продолжить с места остановки
+        journal = CheckpointJournal()
+        resumed = ask_resume(journal)
+        
+        # Хранилище продуктов (SQLite или Parquet/CSV) - Excel только экспорт
+        store = open_store()
+        
+        # Проверяем наличие сохраненных данных
+        mode = resumed['mode'] if resumed else check_existing_table(store)
         
         if mode == 'exit':
             return
         
+        if mode == 'export':
+            import_excel(store)
+            total = export_excel(store)
+            print(f"\n✅ Экспортировано проектов: {total}")
+            print(f"Файл: producthunt.xlsx\n")
+            return
+        
+        if mode == 'incremental':
+            run_incremental(journal, store, resumed)
+            return
+        
+        if mode == 'queue':
+            import_excel(store)
+            run_queue_mode(store, crunchbase=store.has_values('crunchbase_url'), fresh=False)
+            return
+        
         if mode == 'crunchbase':
-            # Загружаем данные из существующего файла
-            print("\n📂 Загрузка данных из producthunt.xlsx...")
-            products = load_products_from_excel()
+            if not resumed:
+                journal.start_run('crunchbase', {})
+            
+            # Загружаем сохраненные данные
+            print("\n📂 Загрузка сохраненных данных...")
+            products = load_dataset(store)
             
             if not products:
-                print("❌ Не удалось загрузить данные из файла")
+                print("❌ Не удалось загрузить сохраненные данные")
                 return
             
             print(f"✓ Загружено проектов: {len(products)}")
             
-            # Сразу переходим к Crunchbase
-            print("\n" + "="*60)
-            
-            # Создаем парсер Crunchbase
-            crunchbase = CrunchbaseParser()
-            
-            # Авторизация на Crunchbase
-            crunchbase.setup_authentication()
-            
-            # Парсинг Crunchbase - поиск компаний
-            products = crunchbase.search_organizations_batch(products)
-            
-            # Парсинг Crunchbase - получение funding
-            products = crunchbase.get_funding_amounts_batch(products)
-            
-            # Шаг 9: Сохранение финального результата
-            save_to_excel(products, include_crunchbase=True)
+            if use_work_queue():
+                journal.clear()
+                run_queue_mode(store, crunchbase=True)
+                return
             
+            # Сразу переходим к Crunchbase
             print("\n" + "="*60)
-            print("✅ ПАРСИНГ CRUNCHBASE ЗАВЕРШЕН")
-            print("="*60)
-            print(f"Итоговое количество проектов: {len(products)}")
-            
-            # Статистика по Crunchbase
-            cb_found = sum(1 for p in products if p.get('crunchbase_url'))
-            funding_found = sum(1 for p in products if p.get('funding_amount'))
-            
-            print(f"Найдено на Crunchbase: {cb_found}")
-            print(f"С данными о финансировании: {funding_found}")
-            print(f"Файл: producthunt.xlsx")
-            print("="*60 + "\n")
             
+            run_crunchbase(products, journal, "ПАРСИНГ CRUNCHBASE ЗАВЕРШЕН", store)
+            journal.clear()
             return
         
         # Режим 'new' - начинаем с нуля
-        # Шаг 1: Получить токен ProductHunt
-        token = get_producthunt_token()
+        # Шаг 1: Получить токены ProductHunt
+        tokens = get_producthunt_tokens()
         
         # Шаг 2: Получить параметры парсинга
-        params = get_user_input()
+        if resumed:
+            params = resumed['params']
+        else:
+            params = get_user_input()
+            # Фиксируем период, чтобы при продолжении окна и курсоры совпали
+            end_date = datetime.now()
+            params['end_date'] = end_date.isoformat()
+            params['start_date'] = (end_date - timedelta(days=params['years']*365)).isoformat()
+            journal.start_run('new', params)
+            # Фильтры запоминаются для инкрементальных обновлений
+            set_setting('last_parse_params', {
+                'blacklist': params['blacklist'],
+                'max_makers': params['max_makers']
+            })
         
         # Шаг 3: Парсинг ProductHunt
         parser = ProductHuntParser(
-            token=token,
+            tokens=tokens,
             years=params['years'],
             blacklist=params['blacklist'],
             max_makers=params['max_makers'],
-            max_products=params['max_products']
+            max_products=params['max_products'],
+            start_date=datetime.fromisoformat(params['start_date']),
+            end_date=datetime.fromisoformat(params['end_date'])
         )
         
-        products = parser.parse()
+        if params.get('pipeline'):
+            run_pipeline_mode(parser, journal, store)
+            journal.clear()
+            return
+        
+        products = parser.parse(journal=journal)
         
         if not products:
             print("\n❌ Не найдено ни одного продукта по заданным критериям")
+            journal.clear()
+            return
+        
+        # Резолв и Crunchbase - воркерами очереди; ProductHunt уже в хранилище, журнал не нужен
+        if use_work_queue():
+            continue_crunchbase = ask_continue_crunchbase(journal)
+            store.replace_all(products)
+            journal.clear()
+            run_queue_mode(store, crunchbase=continue_crunchbase)
             return
         
         # Шаг 4: Резолв URL и проверка доступности
-        products = resolve_urls_batch(products, max_workers=20)
+        resolved = resolve_urls_batch(products, max_workers=20, journal=journal)
         
-        if not products:
-            print("\n❌ Все сайты недоступны")
+        if not resolved:
+            if all('is_accessible' in p for p in products):
+                print("\n❌ Все сайты недоступны")
+                journal.clear()
+            else:
+                # Часть ссылок ждет браузера - журнал (с парсингом ProductHunt) сохраняем для продолжения
+                print("\n❌ Нет доступных сайтов среди резолвленных, остальным нужен браузер")
             return
+        products = resolved
         
-        # Вопрос о продолжении
-        print("\n" + "="*60)
-        continue_input = input("Продолжить с парсингом Crunchbase? (Y/n): ").strip().lower()
+        # Вопрос о продолжении (при продолжении запуска ответ берется из журнала)
+        continue_crunchbase = ask_continue_crunchbase(journal)
 
-        save_to_excel(products, include_crunchbase=False)
+        store.replace_all(products)
+        export_excel(store, include_crunchbase=False)
         
-        if continue_input not in ['', 'y', 'yes', 'д', 'да']:
+        if not continue_crunchbase:
             print("\n" + "="*60)
             print("✅ ПАРСИНГ PRODUCTHUNT ЗАВЕРШЕН")
             print("="*60)
             print(f"Итоговое количество проектов: {len(products)}")
             print(f"Файл: producthunt.xlsx")
             print("="*60 + "\n")
+            journal.clear()
             return
         
-        # Создаем парсер Crunchbase
-        crunchbase = CrunchbaseParser()
-        
-        # Авторизация на Crunchbase
-        crunchbase.setup_authentication()
-        
-        # Парсинг Crunchbase - поиск компаний
-        products = crunchbase.search_organizations_batch(products)
-        
-        # Парсинг Crunchbase - получение funding
-        products = crunchbase.get_funding_amounts_batch(products)
-        
-        # Шаг 9: Сохранение финального результата
-        save_to_excel(products, include_crunchbase=True)
-        
-        print("\n" + "="*60)
-        print("✅ ПАРСИНГ ПОЛНОСТЬЮ ЗАВЕРШЕН")
-        print("="*60)
-        print(f"Итоговое количество проектов: {len(products)}")
-        
-        # Статистика по Crunchbase
-        cb_found = sum(1 for p in products if p.get('crunchbase_url'))
-        funding_found = sum(1 for p in products if p.get('funding_amount'))
-        
-        print(f"Найдено на Crunchbase: {cb_found}")
-        print(f"С данными о финансировании: {funding_found}")
-        print(f"Файл: producthunt.xlsx")
-        print("="*60 + "\n")
+        run_crunchbase(products, journal, "ПАРСИНГ ПОЛНОСТЬЮ ЗАВЕРШЕН", store)
+        journal.clear()
         
     except KeyboardInterrupt:
         print("\n\n⚠ Прервано пользователем")
+        print("Прогресс сохранен в checkpoint.jsonl - при следующем запуске можно продолжить")
         sys.exit(0)
     except Exception as e:
         print(f"\n❌ Ошибка: {e}")
+        print("Прогресс сохранен в checkpoint.jsonl - при следующем запуске можно продолжить")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        if store is not None:
+            store.close()
+        metrics.stop_reporting()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,300 @@
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from config_manager import get_setting
+
+METRICS_JSON = 'metrics.json'
+METRICS_PROM = 'metrics.prom'
+PREFIX = 'startup_finder'
+
+# Границы корзин гистограмм задержек (сек)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def is_timeout(error):
+    """Таймаут requests, asyncio или Playwright/Camoufox (по имени класса, без импорта библиотек)"""
+    return isinstance(error, TimeoutError) or 'Timeout' in type(error).__name__
+
+
+def http_outcome(status):
+    """Исход HTTP запроса для счетчика calls_total"""
+    if status == 429:
+        return 'rate_limited'
+    return 'ok' if 200 <= status < 400 else 'error'
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами, как в Prometheus (le - верхняя граница)"""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # последняя корзина - +Inf
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+    
+    def quantile(self, q):
+        """Оценка квантиля линейной интерполяцией внутри корзины (как histogram_quantile)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets + (math.inf,), self.counts):
+            if count and seen + count >= rank:
+                if upper == math.inf:
+                    return self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.buckets[-1]
+    
+    def cumulative(self):
+        """Пары (le, накопленное количество) для экспорта"""
+        total = 0
+        for upper, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            yield upper, total
+
+
+class _Call:
+    """Исход замеряемого вызова, можно поменять внутри metrics.track()"""
+    
+    def __init__(self):
+        self.outcome = 'ok'
+
+
+class Metrics:
+    """
+    Метрики запуска: счетчики, гистограммы задержек внешних вызовов и время этапов
+    
+    Метрики с одинаковым именем различаются метками (call, outcome, stage, ...).
+    Снимок пишется в JSON и в текстовый формат Prometheus - периодически из
+    фонового потока и в конце запуска (секция "metrics" в config.json)
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.json_path = METRICS_JSON
+        self.prom_path = METRICS_PROM
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self._counters = {}    # (name, labels) -> value
+            self._histograms = {}  # (name, labels) -> Histogram
+            self._stages = {}      # stage -> {'seconds', 'items', 'runs'}
+    
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+    
+    def inc(self, name, value=1, **labels):
+        """Увеличивает счетчик name (имя по соглашению Prometheus заканчивается на _total)"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+    
+    def histogram(self, name, **labels):
+        """Гистограмма name с метками labels (None, если наблюдений не было)"""
+        with self._lock:
+            return self._histograms.get(self._key(name, labels))
+    
+    def observe_call(self, call, seconds, outcome='ok'):
+        """Один внешний вызов: задержка в гистограмму call_seconds, исход в calls_total"""
+        self.observe('call_seconds', seconds, call=call)
+        self.inc('calls_total', call=call, outcome=outcome)
+        if outcome == 'timeout':
+            self.inc('timeouts_total', call=call)
+    
+    @contextmanager
+    def track(self, call):
+        """
+        Замеряет внешний вызов внутри блока with
+        Исключение - исход error (или timeout), иначе ok либо то, что задано в call.outcome
+        Работает и в async функциях (вход и выход блока синхронные)
+        """
+        tracked = _Call()
+        started_at = time.perf_counter()
+        try:
+            yield tracked
+        except BaseException as e:
+            tracked.outcome = 'timeout' if is_timeout(e) else 'error'
+            raise
+        finally:
+            self.observe_call(call, time.perf_counter() - started_at, tracked.outcome)
+    
+    def record_stage(self, stage, seconds, items):
+        """Время и количество обработанных элементов этапа (повторные запуски суммируются)"""
+        with self._lock:
+            entry = self._stages.setdefault(stage, {'seconds': 0.0, 'items': 0, 'runs': 0})
+            entry['seconds'] += seconds
+            entry['items'] += items
+            entry['runs'] += 1
+    
+    # --- экспорт ---
+    
+    def snapshot(self):
+        """Снимок всех метрик в виде словаря (формат metrics.json)"""
+        with self._lock:
+            now = time.time()
+            return {
+                'started_at': self.started_at,
+                'updated_at': now,
+                'uptime_seconds': round(now - self.started_at, 3),
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                'histograms': [
+                    {
+                        'name': name,
+                        'labels': dict(labels),
+                        'count': h.count,
+                        'sum': round(h.sum, 6),
+                        'p50': round(h.quantile(0.5), 6),
+                        'p95': round(h.quantile(0.95), 6),
+                        'buckets': {_format_le(le): total for le, total in h.cumulative()}
+                    }
+                    for (name, labels), h in sorted(self._histograms.items())
+                ],
+                'stages': {
+                    stage: {
+                        'seconds': round(entry['seconds'], 3),
+                        'items': entry['items'],
+                        'runs': entry['runs'],
+                        'items_per_second': round(entry['items'] / entry['seconds'], 3) if entry['seconds'] > 0 else 0
+                    }
+                    for stage, entry in sorted(self._stages.items())
+                }
+            }
+    
+    def prometheus(self):
+        """Снимок в текстовом формате Prometheus (для node_exporter textfile collector и т.п.)"""
+        snapshot = self.snapshot()
+        lines = []
+        
+        def metric(name, kind, samples):
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{PREFIX}_{name}{suffix}{_format_labels(labels)} {value}")
+        
+        counters = {}
+        for counter in snapshot['counters']:
+            counters.setdefault(counter['name'], []).append(('', counter['labels'], counter['value']))
+        for name, samples in counters.items():
+            metric(name, 'counter', samples)
+        
+        histograms = {}
+        for h in snapshot['histograms']:
+            samples = histograms.setdefault(h['name'], [])
+            for le, total in h['buckets'].items():
+                samples.append(('_bucket', {**h['labels'], 'le': le}, total))
+            samples.append(('_sum', h['labels'], h['sum']))
+            samples.append(('_count', h['labels'], h['count']))
+        for name, samples in histograms.items():
+            metric(name, 'histogram', samples)
+        
+        stages = snapshot['stages']
+        if stages:
+            for field, name in (('seconds', 'stage_seconds'), ('items', 'stage_items'),
+                                ('items_per_second', 'stage_items_per_second')):
+                metric(name, 'gauge', [('', {'stage': stage}, entry[field]) for stage, entry in stages.items()])
+        
+        metric('uptime_seconds', 'gauge', [('', {}, snapshot['uptime_seconds'])])
+        return '\n'.join(lines) + '\n'
+    
+    def write(self):
+        """Записывает metrics.json и metrics.prom (атомарно, через временный файл)"""
+        for path, content in ((self.json_path, json.dumps(self.snapshot(), ensure_ascii=False, indent=2)),
+                              (self.prom_path, self.prometheus())):
+            if not path:
+                continue
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+    
+    def start_reporting(self, name=None):
+        """
+        Включает запись файлов по секции "metrics" в config.json:
+        enabled (true), json_path, prom_path, interval_seconds (30, 0 - только в конце запуска)
+        name - суффикс имен файлов, чтобы процессы воркеров не писали в один файл
+        """
+        settings = get_setting('metrics', {})
+        if not settings.get('enabled', True):
+            self.json_path = self.prom_path = None
+            return
+        
+        self.json_path = _with_suffix(settings.get('json_path', METRICS_JSON), name)
+        self.prom_path = _with_suffix(settings.get('prom_path', METRICS_PROM), name)
+        interval = settings.get('interval_seconds', 30)
+        
+        if interval and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._report_loop, args=(interval,), name='metrics', daemon=True)
+            self._thread.start()
+    
+    def _report_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"\n⚠ Не удалось записать метрики: {e}")
+    
+    def stop_reporting(self):
+        """Останавливает периодическую запись и пишет итоговый снимок"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        try:
+            self.write()
+        except OSError as e:
+            print(f"\n⚠ Не удалось записать метрики: {e}")
+
+
+def _with_suffix(path, name):
+    """metrics.json + worker-1 -> metrics-worker-1.json"""
+    if not path or not name:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{name}{ext}"
+
+
+def _format_le(value):
+    return '+Inf' if value == math.inf else repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+# Общий реестр метрик процесса
+metrics = Metrics()
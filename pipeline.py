@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+
+from metrics import metrics
+from utils import resolve_urls_stream
+
+
+class _Stage(threading.Thread):
+    """Поток этапа конвейера. Ошибка этапа сохраняется и пробрасывается в run_pipeline"""
+    
+    def __init__(self, name, target):
+        super().__init__(name=name, daemon=True)
+        self._target_fn = target
+        self.error = None
+    
+    def run(self):
+        try:
+            self._target_fn()
+        except BaseException as e:
+            self.error = e
+
+
+class PipelineError(Exception):
+    """Один из этапов конвейера остановился с ошибкой"""
+
+
+def _put(target, item, consumer):
+    """Кладет item в очередь, пока жив поток-потребитель (иначе конвейер встал бы навсегда)"""
+    while True:
+        try:
+            target.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            if not consumer.is_alive():
+                raise PipelineError(f"Этап {consumer.name} остановился с ошибкой")
+
+
+def run_pipeline(parser, journal=None, crunchbase=None, queue_size=200,
+                 resolve_workers=20, http_workers=32, crunchbase_batch=50, crunchbase_concurrency=8):
+    """
+    Конвейерный режим: ProductHunt -> резолв URL -> Crunchbase
+    
+    Этапы работают одновременно и связаны ограниченными очередями (queue_size),
+    поэтому первые продукты доходят до резолва и Crunchbase, пока парсер еще
+    листает ProductHunt. Заполненная очередь притормаживает предыдущий этап
+    
+    Парсер работает в основном потоке (Ctrl+C останавливает его как обычно),
+    резолв и Crunchbase - в своих потоках
+    
+    crunchbase: CrunchbaseParser или None (без обогащения)
+    crunchbase_batch - сколько продуктов Crunchbase обрабатывает одной пачкой,
+    crunchbase_concurrency - одновременных запросов к Crunchbase внутри пачки
+    Возвращает доступные продукты из итогового топа парсера, отсортированные по голосам
+    """
+    resolve_queue = queue.Queue(maxsize=queue_size)
+    enrich_queue = queue.Queue(maxsize=queue_size) if crunchbase is not None else None
+    finished = []
+    counts = {'parsed': 0}
+    
+    def on_resolved(product):
+        if enrich_queue is not None:
+            _put(enrich_queue, product, stages[1])
+        else:
+            finished.append(product)
+    
+    def resolve():
+        try:
+            counts['resolve'] = resolve_urls_stream(
+                resolve_queue, on_resolved,
+                max_workers=resolve_workers,
+                http_workers=http_workers,
+                journal=journal
+            )
+        finally:
+            if enrich_queue is not None:
+                try:
+                    _put(enrich_queue, None, stages[1])
+                except PipelineError:
+                    pass
+    
+    stages = [_Stage('resolve', resolve)]
+    if crunchbase is not None:
+        stages.append(_Stage('crunchbase', lambda: crunchbase.enrich_stream(
+            enrich_queue, finished.append, journal,
+            batch_size=crunchbase_batch, concurrency=crunchbase_concurrency
+        )))
+    
+    def on_product(product):
+        counts['parsed'] += 1
+        _put(resolve_queue, product, stages[0])
+    
+    print(f"\n🚀 Конвейерный режим: ProductHunt -> резолв URL{' -> Crunchbase' if crunchbase else ''}")
+    
+    started_at = time.time()
+    for stage in stages:
+        stage.start()
+    
+    top = None
+    try:
+        top = parser.parse(journal=journal, on_product=on_product)
+    except PipelineError:
+        # Упал один из следующих этапов - его ошибка будет проброшена ниже
+        pass
+    finally:
+        try:
+            _put(resolve_queue, None, stages[0])
+        except PipelineError:
+            pass
+    
+    print(f"\n⏳ Ждем завершения резолва{' и Crunchbase' if crunchbase else ''}...")
+    for stage in stages:
+        stage.join()
+    
+    # Сначала исходная ошибка, а не ее следствие в соседнем этапе
+    errors = sorted((s.error for s in stages if s.error is not None), key=lambda e: isinstance(e, PipelineError))
+    if errors:
+        raise errors[0]
+    
+    # Продукты, вытесненные из топа уже после отправки в конвейер, в результат не попадают
+    top_urls = {p['producthunt_url'] for p in top}
+    result = [p for p in finished if p['producthunt_url'] in top_urls]
+    result.sort(key=lambda p: p['votesCount'], reverse=True)
+    
+    elapsed = time.time() - started_at
+    metrics.record_stage('pipeline', elapsed, len(result))
+    resolve_stats = counts.get('resolve', {})
+    print(f"\n✓ Конвейер завершен за {elapsed:.1f} сек")
+    print(f"  - Передано в резолв: {counts['parsed']}, в итоговом топе: {len(top)}")
+    print(f"  - Резолв: кэш {resolve_stats.get('cache', 0)}, HTTP {resolve_stats.get('http', 0)}, "
+          f"браузер {resolve_stats.get('browser', 0)}, доступных {resolve_stats.get('accessible', 0)}")
+    print(f"  - Итоговых проектов: {len(result)}")
+    
+    return result
@@ -0,0 +1,80 @@
+from collections.abc import MutableMapping
+
+FIELDS = (
+    'name', 'description', 'votesCount', 'website', 'producthunt_url', 'makers', 'created_at',
+    'is_accessible', 'crunchbase_url', 'funding_amount'
+)
+_FIELD_SET = frozenset(FIELDS)
+
+
+class Product(MutableMapping):
+    """
+    Компактная запись продукта: __slots__ вместо словаря
+    
+    Снаружи ведет себя как dict (p['website'], p.get(...), 'crunchbase_url' in p,
+    dict(p)), поэтому этапы работают с ней так же, как раньше со словарями.
+    Незаполненное поле - это отсутствующий ключ: до этапа Crunchbase
+    'crunchbase_url' in p == False. Ключи вне FIELDS не допускаются
+    """
+    
+    __slots__ = FIELDS
+    
+    def __init__(self, **fields):
+        # Неизвестное поле - AttributeError от __slots__
+        for key, value in fields.items():
+            setattr(self, key, value)
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Product из словаря (журнал, Excel, хранилище); лишние ключи отбрасываются"""
+        product = cls()
+        for key in FIELDS:
+            if key in data:
+                setattr(product, key, data[key])
+        return product
+    
+    def to_dict(self):
+        """Обычный словарь - для JSON (журнал) и внешних потребителей"""
+        return dict(self.items())
+    
+    def copy(self):
+        return Product.from_dict(self)
+    
+    def __getitem__(self, key):
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+    
+    def __setitem__(self, key, value):
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        setattr(self, key, value)
+    
+    def __delitem__(self, key):
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        try:
+            delattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+    
+    def __contains__(self, key):
+        return key in _FIELD_SET and hasattr(self, key)
+    
+    def __iter__(self):
+        return (key for key in FIELDS if hasattr(self, key))
+    
+    def __len__(self):
+        return sum(1 for _ in self)
+    
+    def get(self, key, default=None):
+        # Быстрее, чем реализация MutableMapping через исключение
+        if key not in _FIELD_SET:
+            return default
+        return getattr(self, key, default)
+    
+    def __repr__(self):
+        return f"Product({self.to_dict()!r})"
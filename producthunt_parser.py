@@ -1,26 +1,58 @@
+import heapq
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
 import time
 from tqdm import tqdm
 
+from rate_limiter import TokenPool, mask_token
+from query_planner import QueryPlanner
+from product import Product
+from metrics import metrics, http_outcome
+
+API_URL = 'https://api.producthunt.com/v2/api/graphql'
+
 class ProductHuntParser:
-    def __init__(self, token, years=3, blacklist=None, max_makers=10, max_products=5000):
-        self.token = token
-        self.headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'Host': 'api.producthunt.com'
-        }
+    def __init__(self, token=None, years=3, blacklist=None, max_makers=10, max_products=5000,
+                 shard_days=30, max_workers=4, tokens=None, start_date=None, end_date=None,
+                 batch_size=4, api_url=API_URL):
+        # Несколько developer токенов - запросы распределяются по их бюджетам
+        self.tokens = list(tokens or [token])
+        self.token = self.tokens[0]
         self.years = years
         self.blacklist = [word.lower() for word in (blacklist or [])]
         self.max_makers = max_makers
         self.max_products = max_products
         
-        self.end_date = datetime.now()
-        self.start_date = self.end_date - timedelta(days=years*365)
-        self.end_cursor = None
+        # Явные границы периода нужны при продолжении прерванного запуска
+        self.end_date = end_date or datetime.now()
+        self.start_date = start_date or self.end_date - timedelta(days=years*365)
+        
+        # Период режется на независимые окна (шарды) по shard_days дней,
+        # каждое окно листается своим курсором параллельно в max_workers потоков
+        self.shard_days = shard_days
+        self.max_workers = max_workers
+        # Сколько окон упаковывать в один GraphQL запрос (алиасы w0, w1, ...)
+        self.batch_size = max(1, batch_size)
+        self.api_url = api_url
+        
+        # Размер страницы и набор полей под бюджет сложности.
+        # makers { id } запрашивается только если включен фильтр по сотрудникам
+        self.planner = QueryPlanner(include_makers=max_makers is not None)
         
+        # Темп запросов по заголовкам X-Rate-Limit-* для каждого токена, чтобы не упираться в 429
+        self.token_pool = TokenPool(self.tokens)
+        
+    @staticmethod
+    def _headers(token):
+        return {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Host': 'api.producthunt.com'
+        }
+    
     def _is_blacklisted(self, name):
         """Проверяет, содержит ли название слово из черного списка"""
         if not self.blacklist:
@@ -32,15 +64,21 @@ class ProductHuntParser:
                 return True
         return False
     
-    def _fetch_page(self):
-        """Получает одну страницу результатов от ProductHunt API"""
+    def _posts_selection(self, alias, cursor, posted_after, posted_before, first=20, include_makers=True):
+        """Одна выборка posts(...) под алиасом alias для окна posted_after - posted_before"""
         end_cursor_query = ''
-        if self.end_cursor:
-            end_cursor_query = f'after: "{self.end_cursor}",'
+        if cursor:
+            end_cursor_query = f'after: "{cursor}",'
         
-        query = """
-        {
-          posts(%s postedAfter: "%s", postedBefore: "%s", order: VOTES) {
+        makers_query = ''
+        if include_makers:
+            makers_query = """
+                makers {
+                    id
+                }"""
+        
+        return """
+          %s: posts(%s first: %d, postedAfter: "%s", postedBefore: "%s", order: VOTES) {
             pageInfo {
               endCursor
               hasNextPage
@@ -52,56 +90,131 @@ class ProductHuntParser:
                 votesCount
                 url
                 website
-                createdAt
-                makers {
-                    id
-                }
+                createdAt%s
               }
             }
           }
+        """ % (alias, end_cursor_query, first, posted_after.isoformat(), posted_before.isoformat(), makers_query)
+    
+    @staticmethod
+    def _error_result(status, cursor, reset_in=None, message=None):
+        return {
+            'data': None,
+            'status': status,
+            'error': True,
+            'reset_in': reset_in,
+            'message': message,
+            'has_next_page': False,
+            'end_cursor': cursor
         }
-        """ % (end_cursor_query, self.start_date.isoformat(), self.end_date.isoformat())
+    
+    def _fetch_page(self, cursor=None, posted_after=None, posted_before=None):
+        """
+        Получает одну страницу результатов от ProductHunt API
+        cursor - endCursor предыдущей страницы этого окна, posted_after/posted_before - границы окна
+        """
+        return self._fetch_windows([(cursor, posted_after, posted_before)])[0]
+    
+    def _fetch_windows(self, windows):
+        """
+        Получает по странице для нескольких окон одним HTTP запросом
+        
+        windows - список (cursor, posted_after, posted_before). Каждое окно
+        запрашивается отдельной выборкой posts под своим алиасом (w0, w1, ...),
+        ответ разбирается обратно в список результатов в том же порядке
+        Результат для окна: data (в формате {'data': {'posts': ...}}), status,
+        error, reset_in, has_next_page, end_cursor
+        """
+        windows = [
+            (cursor, posted_after or self.start_date, posted_before or self.end_date)
+            for cursor, posted_after, posted_before in windows
+        ]
+        cursors = [cursor for cursor, _, _ in windows]
+        
+        acquire_started_at = time.perf_counter()
+        token = self.token_pool.acquire()
+        metrics.inc('ph_scheduler_wait_seconds_total', time.perf_counter() - acquire_started_at)
+        if token is None:
+            # Все токены отклонены сервером
+            return [self._error_result(401, cursor) for cursor in cursors]
+        
+        first = self.planner.page_size(len(windows), self.token_pool.remaining(token))
+        include_makers = self.planner.include_makers
+        query = "{\n%s\n}" % ''.join(
+            self._posts_selection(f'w{i}', *window, first=first, include_makers=include_makers)
+            for i, window in enumerate(windows)
+        )
         
+        started_at = time.perf_counter()
         try:
             response = requests.post(
-                'https://api.producthunt.com/v2/api/graphql',
+                self.api_url,
                 json={'query': query},
-                headers=self.headers,
+                headers=self._headers(token),
                 timeout=30
             )
         except requests.RequestException as e:
+            metrics.observe_call('ph_fetch_page', time.perf_counter() - started_at,
+                                 'timeout' if isinstance(e, requests.Timeout) else 'error')
             print(f"\n❌ Ошибка соединения: {e}")
-            return {
-                'data': None,
-                'status': 0,
-                'error': True,
-                'reset_in': None,
-                'has_next_page': False
-            }
+            return [self._error_result(0, cursor) for cursor in cursors]
+        
+        metrics.observe_call('ph_fetch_page', time.perf_counter() - started_at, http_outcome(response.status_code))
+        cost = self.token_pool.update(token, response.headers)
         
         if response.status_code == 200:
             resp = response.json()
+            data = resp.get('data') or {}
             
-            try:
-                self.end_cursor = resp['data']['posts']['pageInfo']['endCursor']
-            except (KeyError, TypeError):
-                pass
+            errors = resp.get('errors') or []
+            if not data and any('complexity' in str(error.get('message', '')).lower() for error in errors):
+                # Запрос слишком сложный - уменьшаем страницу и повторяем
+                self.planner.on_complexity_error(first)
+                if first > 1:
+                    return self._fetch_windows(windows)
             
-            try:
-                has_next_page = resp['data']['posts']['pageInfo']['hasNextPage']
-            except (KeyError, TypeError):
-                has_next_page = False
+            results = []
+            posts_returned = 0
+            truncated_size = None  # Наибольшая страница, обрезанная сервером при hasNextPage
+            for i, cursor in enumerate(cursors):
+                posts = data.get(f'w{i}')
+                if posts is None:
+                    # Частичная ошибка GraphQL для этого окна (сообщение выводит вызывающий)
+                    messages = [
+                        str(error.get('message', error)) for error in errors
+                        if f'w{i}' in (error.get('path') or [])
+                    ] or [str(error.get('message', error)) for error in errors]
+                    results.append(self._error_result(response.status_code, cursor, message='; '.join(messages) or None))
+                    continue
+                
+                page_info = posts.get('pageInfo') or {}
+                edges_count = len(posts.get('edges') or [])
+                posts_returned += edges_count
+                if page_info.get('hasNextPage', False) and 0 < edges_count < first:
+                    truncated_size = max(truncated_size or 0, edges_count)
+                results.append({
+                    'data': {'data': {'posts': posts}},
+                    'status': response.status_code,
+                    'error': False,
+                    'reset_in': None,
+                    'has_next_page': page_info.get('hasNextPage', False),
+                    'end_cursor': page_info.get('endCursor') or cursor
+                })
             
-            return {
-                'data': resp,
-                'status': response.status_code,
-                'error': False,
-                'reset_in': None,
-                'has_next_page': has_next_page
-            }
+            self.planner.observe(first, len(windows), posts_returned, truncated_size, cost)
+            metrics.inc('ph_posts_total', posts_returned)
+            return results
         else:
+            if response.status_code == 401:
+                # Токен отклонен - исключаем его, окна повторятся с остальными токенами
+                if self.token_pool.revoke(token):
+                    print(f"\n⚠ Токен {mask_token(token)} не прошел авторизацию (401) - исключен, "
+                          f"осталось токенов: {self.token_pool.valid_count()}")
+                return [self._error_result(response.status_code, cursor) for cursor in cursors]
+            
             # Детальная диагностика ошибки
             print(f"\n❌ HTTP {response.status_code}")
+            reset_in = None
             try:
                 resp = response.json()
                 print(f"Ответ API: {resp}")
@@ -110,149 +223,323 @@ class ProductHuntParser:
                     for error in resp['errors']:
                         if error.get('error') == 'rate_limit_reached':
                             reset_in = error.get('details', {}).get('reset_in', 60)
-                            return {
-                                'data': None,
-                                'status': response.status_code,
-                                'error': True,
-                                'reset_in': reset_in,
-                                'has_next_page': False
-                            }
+                            pause = reset_in if reset_in and reset_in > 0 else 700
+                            self.token_pool.on_rate_limited(token, pause)
+                            metrics.inc('rate_limit_pause_seconds_total', pause, service='producthunt')
+                            break
                         print(f"Ошибка API: {error.get('message', error)}")
             except Exception as e:
                 print(f"Текст ответа: {response.text[:500]}")
             
-            return {
-                'data': None,
-                'status': response.status_code,
-                'error': True,
-                'reset_in': None,
-                'has_next_page': False
-            }
+            return [self._error_result(response.status_code, cursor, reset_in) for cursor in cursors]
     
     def _process_product(self, node):
         """Обрабатывает один продукт и применяет фильтры"""
         name = node.get('name', '')
-        makers_count = len(node.get('makers', []))
+        # makers не запрашиваются без фильтра по сотрудникам - тогда поля у продукта нет
+        makers_count = len(node['makers']) if isinstance(node.get('makers'), list) else None
         
         # Фильтр: черный список
         if self._is_blacklisted(name):
             return None
         
-        # Фильтр: максимальное количество сотрудников
-        if makers_count > self.max_makers:
+        # Фильтр: максимальное количество сотрудников (None - без ограничения)
+        if self.max_makers is not None and makers_count is not None and makers_count > self.max_makers:
             return None
         
+        product = Product(
+            name=name,
+            description=node.get('description', ''),
+            votesCount=node.get('votesCount', 0),
+            website=node.get('website', ''),
+            producthunt_url=node.get('url', ''),
+            created_at=node.get('createdAt', '')
+        )
+        if makers_count is not None:
+            product['makers'] = makers_count
+        return product
+    
+    def _make_shards(self):
+        """Режет период start_date - end_date на окна по shard_days дней"""
+        if not self.shard_days:
+            return [self._new_shard(self.start_date, self.end_date)]
+        
+        shards = []
+        window_start = self.start_date
+        while window_start < self.end_date:
+            window_end = min(window_start + timedelta(days=self.shard_days), self.end_date)
+            shards.append(self._new_shard(window_start, window_end))
+            window_start = window_end
+        return shards
+    
+    @staticmethod
+    def _new_shard(posted_after, posted_before):
         return {
-            'name': name,
-            'description': node.get('description', ''),
-            'votesCount': node.get('votesCount', 0),
-            'website': node.get('website', ''),
-            'producthunt_url': node.get('url', ''),
-            'makers': makers_count,
-            'created_at': node.get('createdAt', '')
+            'key': posted_after.isoformat(),
+            'posted_after': posted_after,
+            'posted_before': posted_before,
+            'cursor': None,
+            'pages': 0,
+            'empty_pages': 0,
+            'last_votes': None,
+            'retries': 0,
+            'finished': False
         }
     
-    def parse(self):
+    @staticmethod
+    def _restore_from_journal(shards, journal):
+        """
+        Восстанавливает курсоры окон и уже собранные продукты из журнала
+        Возвращает список продуктов со всех сохраненных страниц
+        """
+        by_key = {shard['key']: shard for shard in shards}
+        restored = []
+        
+        for page in journal.completed('ph_page').values():
+            shard = by_key.get(page['shard'])
+            if shard is None:
+                continue
+            restored.extend(Product.from_dict(p) for p in page['products'])
+            if page['page'] > shard['pages']:
+                shard.update({
+                    'cursor': page['cursor'],
+                    'pages': page['page'],
+                    'empty_pages': page['empty_pages'],
+                    'last_votes': page['last_votes'],
+                    'finished': page['finished']
+                })
+        
+        return restored
+    
+    def _print_auth_error(self):
+        print(f"\n" + "="*60)
+        print("❌ ОШИБКА АВТОРИЗАЦИИ (401)")
+        print("="*60)
+        print("\nВаш токен не работает. Возможные причины:")
+        print("1. Используется Client ID вместо Developer Token")
+        print("2. Токен скопирован не полностью")
+        print("3. Добавлен префикс 'Bearer ' (не нужен)")
+        print("4. Токен истек или был отозван")
+        print("\n📖 ИНСТРУКЦИЯ ПО ПОЛУЧЕНИЮ ПРАВИЛЬНОГО ТОКЕНА:")
+        print("1. Откройте: https://api.producthunt.com/v2/oauth/applications")
+        print("2. Создайте новое приложение (Create an application)")
+        print("3. Скопируйте 'Developer token' - длинную строку")
+        print("4. НЕ копируйте Client ID или Client Secret!")
+        print("\n💡 Подробная инструкция в файле: TOKEN_GUIDE.md")
+        print("="*60)
+    
+    def parse(self, journal=None, on_product=None):
         """
         Парсит ProductHunt и возвращает список отфильтрованных продуктов
+        
+        Окна периода листаются параллельно, каждое своим курсором. Внутри окна
+        посты идут по убыванию голосов, поэтому окно останавливается, как только
+        его голоса опускаются ниже порога текущего топ-max_products
+        Результат дедуплицируется по producthunt_url и сортируется по голосам
+        
+        journal: CheckpointJournal - каждая страница сохраняется вместе с курсором,
+                 при перезапуске парсинг продолжается с сохраненных курсоров
+        on_product: вызывается для каждого нового продукта сразу после получения страницы
+                    (конвейерный режим). Продукты ниже текущего порога топа не передаются
         """
+        started_at = time.perf_counter()
+        shards = self._make_shards()
+        restored = self._restore_from_journal(shards, journal) if journal is not None else []
+        
         print(f"\n{'='*60}")
         print(f"ПАРСИНГ PRODUCTHUNT")
         print(f"{'='*60}")
         print(f"Период: {self.start_date.strftime('%Y-%m-%d')} - {self.end_date.strftime('%Y-%m-%d')}")
+        print(f"Окон: {len(shards)}, потоков: {self.max_workers}, окон в запросе: {self.batch_size}")
         print(f"Черный список: {', '.join(self.blacklist) if self.blacklist else 'нет'}")
-        print(f"Макс. сотрудников: {self.max_makers}")
+        print(f"Макс. сотрудников: {self.max_makers if self.max_makers is not None else 'без ограничения'}")
         print(f"Лимит проектов: {self.max_products}")
         print(f"{'='*60}\n")
         
-        products = []
-        page = 0
-        empty_pages_count = 0  # Счетчик страниц подряд без продуктов
-        max_empty_pages = 10   # Лимит пустых страниц подряд
+        products = {}          # producthunt_url -> product
+        top_votes = []         # min-heap голосов топ-max_products продуктов
+        max_empty_pages = 10   # Лимит пустых страниц подряд в одном окне
+        max_retries = 3        # Повторы страницы окна после частичной ошибки GraphQL
+        exhausted_shards = 0   # Окна, остановленные по лимиту пустых страниц
+        paused_until = 0       # Чтобы сообщать о паузе один раз на окно rate limit
+        stopped = False
         
-        with tqdm(desc="Парсинг страниц", unit="page") as pbar:
-            while True:
-                page += 1
-                pbar.set_description(f"Парсинг страницы {page}")
-                
-                result = self._fetch_page()
-                
-                # Обработка ошибок
-                if result['error']:
-                    if result['status'] == 429 and result['reset_in'] >= 0:
-                        reset_in = result['reset_in'] if result['reset_in'] > 0 else 700
-
-                        print(f"\n⏸ Rate limit достигнут. Собрано проектов: {len(products)}")
-                        print(f"Поставили на паузу. Парсинг автоматически продолжится через {reset_in} сек...")
-                        print("Если хотите остановить парсинг ProductHunt и перейти к следующему шагу, нажмите Ctrl+C")
+        def votes_threshold():
+            """Минимум голосов, нужный чтобы попасть в топ (None - лимит еще не набран)"""
+            return top_votes[0] if len(top_votes) >= self.max_products else None
+        
+        def is_pruned(shard):
+            threshold = votes_threshold()
+            return threshold is not None and shard['last_votes'] is not None and shard['last_votes'] < threshold
+        
+        def add_product(product):
+            """Добавляет продукт, если его еще нет. Возвращает True для нового"""
+            if product['producthunt_url'] in products:
+                return False
+            products[product['producthunt_url']] = product
+            heapq.heappush(top_votes, product['votesCount'])
+            if len(top_votes) > self.max_products:
+                heapq.heappop(top_votes)
+            return True
+        
+        def emit(new_products):
+            if on_product is None:
+                return
+            threshold = votes_threshold()
+            for product in new_products:
+                if threshold is None or product['votesCount'] >= threshold:
+                    on_product(product)
+        
+        for product in restored:
+            add_product(product)
+        emit(list(products.values()))
+        if restored:
+            print(f"↻ Восстановлено из журнала: {len(products)} продуктов")
+        
+        ready = deque(shard for shard in shards if not shard['finished'])
+        if journal is not None and journal.get('ph', 'done'):
+            # Парсинг PH уже был завершен (или остановлен пользователем) в прерванном запуске
+            ready.clear()
+        pending = {}
+        
+        self.token_pool.resume()
+        
+        executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers))
+        try:
+            with tqdm(desc="Парсинг страниц", unit="page") as pbar:
+                while (ready or pending) and not stopped:
+                    while ready and len(pending) < self.max_workers:
+                        batch = []
+                        while ready and len(batch) < self.batch_size:
+                            shard = ready.popleft()
+                            if not is_pruned(shard):
+                                batch.append(shard)
+                        if not batch:
+                            continue
+                        future = executor.submit(self._fetch_windows, [
+                            (shard['cursor'], shard['posted_after'], shard['posted_before'])
+                            for shard in batch
+                        ])
+                        pending[future] = batch
+                    
+                    if not pending:
+                        continue
+                    
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    
+                    for future in done:
+                        batch = pending.pop(future)
+                        for shard, result in zip(batch, future.result()):
+                            # Обработка ошибок
+                            if result['error']:
+                                if result['status'] == 429 and result['reset_in'] is not None and result['reset_in'] >= 0:
+                                    # Паузу выдерживает планировщик в потоках, окно просто повторяется.
+                                    # Сообщаем только если исчерпаны все токены
+                                    reset_in = self.token_pool.reset_in()
+                                    if reset_in > 0 and time.time() >= paused_until:
+                                        paused_until = time.time() + reset_in
+                                        print(f"\n⏸ Rate limit достигнут. Собрано проектов: {len(products)}")
+                                        print(f"Поставили на паузу. Парсинг автоматически продолжится через {reset_in} сек...")
+                                        print("Если хотите остановить парсинг ProductHunt и перейти к следующему шагу, нажмите Ctrl+C")
+                                    ready.appendleft(shard)
+                                elif result['status'] == 401:
+                                    if self.token_pool.valid_count():
+                                        ready.appendleft(shard)
+                                    elif not stopped:
+                                        self._print_auth_error()
+                                        stopped = True
+                                elif result['status'] == 200 and shard['retries'] < max_retries:
+                                    # Частичная ошибка GraphQL - окно повторяется с того же курсора
+                                    shard['retries'] += 1
+                                    print(f"\n⚠ Ошибка API: {result['message']} (окно с {shard['posted_after'].strftime('%Y-%m-%d')}, "
+                                          f"повтор {shard['retries']}/{max_retries})")
+                                    ready.append(shard)
+                                else:
+                                    print(f"\n❌ Ошибка API: {result['message'] or result['status']} "
+                                          f"(окно с {shard['posted_after'].strftime('%Y-%m-%d')})")
+                                continue
                         
-                        try:
-                            time.sleep(reset_in)
-                        except KeyboardInterrupt:
-                            print("\n⏹ Парсинг остановлен пользователем")
-                            break
+                            # Обработка продуктов
+                            page_products = []
                         
-                        continue
-                    elif result['status'] == 401:
-                        print(f"\n" + "="*60)
-                        print("❌ ОШИБКА АВТОРИЗАЦИИ (401)")
-                        print("="*60)
-                        print("\nВаш токен не работает. Возможные причины:")
-                        print("1. Используется Client ID вместо Developer Token")
-                        print("2. Токен скопирован не полностью")
-                        print("3. Добавлен префикс 'Bearer ' (не нужен)")
-                        print("4. Токен истек или был отозван")
-                        print("\n📖 ИНСТРУКЦИЯ ПО ПОЛУЧЕНИЮ ПРАВИЛЬНОГО ТОКЕНА:")
-                        print("1. Откройте: https://api.producthunt.com/v2/oauth/applications")
-                        print("2. Создайте новое приложение (Create an application)")
-                        print("3. Скопируйте 'Developer token' - длинную строку")
-                        print("4. НЕ копируйте Client ID или Client Secret!")
-                        print("\n💡 Подробная инструкция в файле: TOKEN_GUIDE.md")
-                        print("="*60)
-                        break
-                    else:
-                        print(f"\n❌ Ошибка API: {result['status']}")
-                        break
-                
-                # Обработка продуктов
-                products_before = len(products)
-                
-                try:
-                    edges = result['data']['data']['posts']['edges']
-                    for edge in edges:
-                        node = edge['node']
-                        product = self._process_product(node)
-                        if product:
-                            products.append(product)
-                except (KeyError, TypeError) as e:
-                    print(f"\n⚠ Ошибка обработки данных: {e}")
-                    break
-                
-                # Проверка на пустые страницы подряд
-                if len(products) == products_before:
-                    empty_pages_count += 1
-                else:
-                    empty_pages_count = 0
-                
-                pbar.update(1)
-                pbar.set_postfix({'собрано': len(products)})
-                
-                # Если слишком много страниц подряд без результатов
-                if empty_pages_count >= max_empty_pages:
-                    print(f"\n⚠ Остановка: {max_empty_pages} страниц подряд без подходящих продуктов")
-                    print(f"💡 Попробуйте увеличить 'Макс. сотрудников' в настройках")
-                    break
-                
-                # Проверка лимита проектов
-                if len(products) >= self.max_products:
-                    print(f"\n✓ Достигнут лимит проектов: {self.max_products}")
-                    break
-                
-                # Проверка на последнюю страницу
-                if not result['has_next_page']:
-                    print("\n✓ Дошли до конца")
-                    break
+                            try:
+                                edges = result['data']['data']['posts']['edges']
+                                for edge in edges:
+                                    node = edge['node']
+                                    shard['last_votes'] = node.get('votesCount', 0)
+                                    product = self._process_product(node)
+                                    if product and add_product(product):
+                                        page_products.append(product)
+                            except (KeyError, TypeError) as e:
+                                print(f"\n⚠ Ошибка обработки данных: {e}")
+                                continue
+                        
+                            # Проверка на пустые страницы подряд
+                            if not page_products:
+                                shard['empty_pages'] += 1
+                            else:
+                                shard['empty_pages'] = 0
+                        
+                            shard['cursor'] = result['end_cursor']
+                            shard['pages'] += 1
+                            shard['retries'] = 0
+                            shard['finished'] = not result['has_next_page'] or shard['empty_pages'] >= max_empty_pages
+                        
+                            if journal is not None:
+                                journal.record('ph_page', f"{shard['key']}#{shard['pages']}", {
+                                    'shard': shard['key'],
+                                    'page': shard['pages'],
+                                    'cursor': shard['cursor'],
+                                    'empty_pages': shard['empty_pages'],
+                                    'last_votes': shard['last_votes'],
+                                    'finished': shard['finished'],
+                                    'products': page_products
+                                })
+                            emit(page_products)
+                        
+                            budget = self.token_pool.snapshot()
+                            pbar.update(1)
+                            pbar.set_postfix({
+                                'собрано': len(products),
+                                'окон': len(ready) + sum(len(b) for b in pending.values()) + 1,
+                                'бюджет': budget['remaining'] if budget['remaining'] is not None else '?',
+                                'пауза': f"{budget['interval']}с"
+                            })
+                        
+                            if shard['empty_pages'] >= max_empty_pages:
+                                exhausted_shards += 1
+                            elif result['has_next_page'] and not is_pruned(shard):
+                                ready.append(shard)
+        except KeyboardInterrupt:
+            print("\n⏹ Парсинг остановлен пользователем")
+        finally:
+            self.token_pool.close()
+            executor.shutdown(wait=False, cancel_futures=True)
         
-        print(f"\n✓ Парсинг завершен. Собрано продуктов: {len(products)}")
-        return products
-
+        if exhausted_shards:
+            print(f"\n⚠ Окон остановлено после {max_empty_pages} страниц подряд без подходящих продуктов: {exhausted_shards}")
+            print(f"💡 Попробуйте увеличить 'Макс. сотрудников' в настройках")
+        
+        if len(products) >= self.max_products:
+            print(f"\n✓ Достигнут лимит проектов: {self.max_products}")
+        elif not stopped:
+            print("\n✓ Дошли до конца")
+        
+        budget = self.token_pool.snapshot()
+        print(f"📊 Запросов к API: {budget['requests']}, ожидание планировщика: {budget['total_wait']} сек, 429: {budget['rate_limited']}")
+        for name, usage in self.token_pool.usage().items():
+            print(f"  - Токен {name}: запросов {usage['requests']}, потрачено очков {usage['spent']}, "
+                  f"осталось {usage['remaining'] if usage['remaining'] is not None else '?'}, 429: {usage['rate_limited']}")
+        plan = self.planner.report()
+        print(f"📊 Постов на очко сложности: {plan['posts_per_point']}"
+              f"{'' if plan['measured'] else ' (оценка)'}, страница: {plan['page_size']}, "
+              f"makers: {'да' if plan['include_makers'] else 'нет'}")
+        
+        result = sorted(products.values(), key=lambda p: p['votesCount'], reverse=True)[:self.max_products]
+        
+        if journal is not None and not stopped:
+            journal.record('ph', 'done', True)
+        
+        metrics.record_stage('producthunt', time.perf_counter() - started_at, len(result))
+        print(f"\n✓ Парсинг завершен. Собрано продуктов: {len(result)}")
+        return result
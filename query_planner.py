@@ -0,0 +1,95 @@
+import threading
+
+
+class QueryPlanner:
+    """
+    Планировщик размера страницы и набора полей для запросов posts
+    
+    Оценка сложности запроса: overhead на каждую выборку posts плюс
+    node_cost на каждый пост (makers { id } добавляет стоимость вложенного
+    списка). Коэффициенты уточняются по фактическому расходу бюджета из
+    заголовков X-Rate-Limit-Remaining. Размер страницы first выбирается
+    максимальным, который:
+      - не превышает лимит сервера (определяется по неполным страницам),
+      - не превышает лимит сложности одного запроса (при ошибке complexity
+        размер уменьшается вдвое),
+      - не съедает больше четверти оставшегося бюджета токена
+    """
+    
+    PAGE_SIZES = (10, 20, 30, 40, 50)
+    
+    def __init__(self, include_makers=True, max_page_size=50, smoothing=0.2):
+        self.include_makers = include_makers
+        self.max_page_size = max_page_size
+        self.smoothing = smoothing
+        
+        self.overhead = 1.0
+        self.node_cost = 4.0 if include_makers else 1.0
+        
+        self.posts = 0
+        self.measured_posts = 0
+        self.points = 0
+        self.estimated_points = 0.0
+        self.requests = 0
+        self._lock = threading.Lock()
+    
+    def estimate(self, first, windows=1):
+        """Оценка сложности запроса из windows выборок по first постов"""
+        return windows * (self.overhead + first * self.node_cost)
+    
+    def page_size(self, windows=1, remaining=None):
+        """Размер страницы для следующего запроса из windows выборок"""
+        with self._lock:
+            sizes = [size for size in self.PAGE_SIZES if size <= self.max_page_size] or [self.max_page_size]
+            if remaining is not None:
+                affordable = [size for size in sizes if self.estimate(size, windows) <= remaining / 4]
+                sizes = affordable or sizes[:1]
+            return sizes[-1]
+    
+    def observe(self, first, windows, posts_returned, truncated_size=None, cost=None):
+        """
+        Учитывает ответ: posts_returned постов по windows выборкам,
+        truncated_size - наибольший размер непустой неполной страницы при hasNextPage
+        (None - сервер страницы не резал). Короткие последние страницы окон
+        и окна с ошибкой в нем не учитываются
+        cost - фактический расход бюджета (None, если заголовков нет)
+        """
+        with self._lock:
+            self.requests += 1
+            self.posts += posts_returned
+            self.estimated_points += self.estimate(first, windows)
+            
+            # Сервер режет страницу - запоминаем его лимит
+            if truncated_size:
+                self.max_page_size = max(1, min(self.max_page_size, truncated_size))
+            
+            if cost is not None and cost > 0:
+                self.points += cost
+                self.measured_posts += posts_returned
+                if posts_returned:
+                    observed = (cost - self.overhead * windows) / posts_returned
+                    if observed > 0:
+                        self.node_cost += self.smoothing * (observed - self.node_cost)
+    
+    def on_complexity_error(self, first):
+        """Запрос превысил лимит сложности - уменьшаем страницу"""
+        with self._lock:
+            self.max_page_size = max(1, min(self.max_page_size, first // 2))
+    
+    def posts_per_point(self):
+        """Постов на очко сложности (по факту, иначе по оценке)"""
+        if self.points:
+            return self.measured_posts / self.points
+        return self.posts / self.estimated_points if self.estimated_points else 0.0
+    
+    def report(self):
+        return {
+            'requests': self.requests,
+            'posts': self.posts,
+            'points': self.points or round(self.estimated_points),
+            'measured': bool(self.points),
+            'posts_per_point': round(self.posts_per_point(), 3),
+            'page_size': self.page_size(),
+            'node_cost': round(self.node_cost, 2),
+            'include_makers': self.include_makers
+        }
@@ -0,0 +1,249 @@
+import threading
+import time
+
+
+class RateLimitScheduler:
+    """
+    Планировщик запросов к API по заголовкам X-Rate-Limit-*
+    
+    Запоминает оставшийся бюджет (очки сложности) и время до сброса окна,
+    оценивает среднюю стоимость запроса и раздает потокам слоты так,
+    чтобы бюджет равномерно растягивался до конца окна и 429 не возникал
+    """
+    
+    def __init__(self, reserve=0.05, cost_smoothing=0.2):
+        self.reserve = reserve                # доля бюджета, которую не тратим (запас на неточность оценки)
+        self.cost_smoothing = cost_smoothing  # коэффициент EWMA для стоимости запроса
+        
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.avg_cost = None
+        
+        self.requests = 0
+        self.spent = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+        self.last_wait = 0.0
+        
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+    
+    def _interval(self, now):
+        """Интервал между запросами, при котором бюджет доживет до сброса окна"""
+        if self.remaining is None or self.reset_at is None or self.reset_at <= now:
+            return 0.0
+        
+        usable = self.remaining - (self.limit or 0) * self.reserve
+        requests_left = usable / (self.avg_cost or 1)
+        if requests_left < 1:
+            return self.reset_at - now
+        return (self.reset_at - now) / requests_left
+    
+    def reserve_slot(self):
+        """Занимает ближайший слот и возвращает, сколько секунд до него ждать"""
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval(slot)
+            self.requests += 1
+            return slot - now
+    
+    def wait(self, wait):
+        """Ждет занятый слот (прерывается через close())"""
+        if wait > 0:
+            self._closed.wait(wait)
+        
+        with self._lock:
+            self.total_wait += wait
+            self.last_wait = wait
+    
+    def acquire(self):
+        """Блокирует поток до своего слота. Возвращает время ожидания в секундах"""
+        wait = self.reserve_slot()
+        self.wait(wait)
+        return wait
+    
+    def update(self, headers):
+        """
+        Обновляет бюджет по заголовкам ответа
+        Возвращает оценку стоимости этого запроса в очках (None, если неизвестна)
+        """
+        cost = None
+        try:
+            remaining = int(headers['X-Rate-Limit-Remaining'])
+            reset_in = int(headers['X-Rate-Limit-Reset'])
+        except (KeyError, TypeError, ValueError):
+            return cost
+        
+        with self._lock:
+            now = time.time()
+            limit = headers.get('X-Rate-Limit-Limit')
+            if limit and str(limit).isdigit():
+                self.limit = int(limit)
+            
+            # Стоимость запроса - насколько уменьшился бюджет в том же окне
+            same_window = self.reset_at is not None and now < self.reset_at
+            if same_window and self.remaining is not None and remaining < self.remaining:
+                cost = self.remaining - remaining
+                self.spent += cost
+                if self.avg_cost is None:
+                    self.avg_cost = float(cost)
+                else:
+                    self.avg_cost += self.cost_smoothing * (cost - self.avg_cost)
+            
+            # При параллельных запросах ответы приходят не по порядку - берем минимум
+            if same_window and self.remaining is not None:
+                self.remaining = min(self.remaining, remaining)
+            else:
+                self.remaining = remaining
+            self.reset_at = now + reset_in
+        
+        return cost
+    
+    def on_rate_limited(self, reset_in):
+        """429: бюджет исчерпан, все следующие слоты - после сброса окна"""
+        with self._lock:
+            self.rate_limited += 1
+            self.remaining = 0
+            self.reset_at = time.time() + reset_in
+            self._next_slot = max(self._next_slot, self.reset_at)
+    
+    def next_available(self):
+        """Момент времени, когда этот планировщик сможет выдать следующий слот"""
+        with self._lock:
+            return max(time.time(), self._next_slot)
+    
+    def reset_in(self):
+        """Секунд до сброса окна (0, если неизвестно)"""
+        if self.reset_at is None:
+            return 0
+        return max(0, int(self.reset_at - time.time()))
+    
+    def snapshot(self):
+        """Текущее состояние планировщика для прогресс-бара и итоговой статистики"""
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'remaining': self.remaining,
+                'reset_in': self.reset_in(),
+                'avg_cost': round(self.avg_cost, 1) if self.avg_cost else None,
+                'interval': round(self._interval(time.time()), 2),
+                'requests': self.requests,
+                'spent': self.spent,
+                'rate_limited': self.rate_limited,
+                'last_wait': round(self.last_wait, 2),
+                'total_wait': round(self.total_wait, 1)
+            }
+    
+    def close(self):
+        """Будит все ждущие потоки (остановка парсинга)"""
+        self._closed.set()
+    
+    def resume(self):
+        """Снова разрешает ожидание слотов после close()"""
+        self._closed.clear()
+
+
+def mask_token(token):
+    """Короткое безопасное имя токена для логов"""
+    return f"{token[:4]}…{token[-4:]}" if len(token) > 10 else '…'
+
+
+class TokenPool:
+    """
+    Пул токенов API, у каждого свой RateLimitScheduler
+    
+    Запрос получает токен, который раньше всех сможет отправить запрос
+    (при равенстве - с наибольшим оставшимся бюджетом). Когда один токен
+    упирается в лимит, работа переходит на остальные. Отклоненный сервером
+    токен (401) исключается из выбора, статистика по нему остается
+    """
+    
+    def __init__(self, tokens, **scheduler_kwargs):
+        tokens = list(dict.fromkeys(t for t in tokens if t))
+        if not tokens:
+            raise ValueError("Нужен хотя бы один токен")
+        self.schedulers = {token: RateLimitScheduler(**scheduler_kwargs) for token in tokens}
+        self.revoked = set()
+        self._lock = threading.Lock()
+    
+    def _pick(self):
+        def key(item):
+            scheduler = item[1]
+            remaining = scheduler.remaining if scheduler.remaining is not None else float('inf')
+            return (scheduler.next_available(), -remaining)
+        valid = [item for item in self.schedulers.items() if item[0] not in self.revoked]
+        return min(valid, key=key)[0] if valid else None
+    
+    def acquire(self):
+        """Выбирает токен и ждет его слот. Возвращает токен (None - рабочих токенов не осталось)"""
+        # Выбор и резерв слота под lock пула, чтобы потоки не заняли один слот одновременно
+        with self._lock:
+            token = self._pick()
+            if token is None:
+                return None
+            wait = self.schedulers[token].reserve_slot()
+        
+        self.schedulers[token].wait(wait)
+        return token
+    
+    def update(self, token, headers):
+        return self.schedulers[token].update(headers)
+    
+    def remaining(self, token):
+        """Оставшийся бюджет токена (None, если еще неизвестен)"""
+        return self.schedulers[token].remaining
+    
+    def on_rate_limited(self, token, reset_in):
+        self.schedulers[token].on_rate_limited(reset_in)
+    
+    def revoke(self, token):
+        """Исключает отклоненный токен. Возвращает True, если он еще не был исключен"""
+        with self._lock:
+            if token in self.revoked:
+                return False
+            self.revoked.add(token)
+            return True
+    
+    def valid_count(self):
+        """Сколько токенов еще участвуют в выборе"""
+        return len(self.schedulers) - len(self.revoked)
+    
+    def reset_in(self):
+        """Секунд до момента, когда освободится хотя бы один токен"""
+        available = [s.next_available() for token, s in self.schedulers.items() if token not in self.revoked]
+        return max(0, int(min(available) - time.time())) if available else 0
+    
+    def snapshot(self):
+        """Сводное состояние пула"""
+        snapshots = [s.snapshot() for s in self.schedulers.values()]
+        known = [s['remaining'] for s in snapshots if s['remaining'] is not None]
+        return {
+            'tokens': len(snapshots),
+            'remaining': sum(known) if known else None,
+            'interval': min(s['interval'] for s in snapshots),
+            'requests': sum(s['requests'] for s in snapshots),
+            'spent': sum(s['spent'] for s in snapshots),
+            'rate_limited': sum(s['rate_limited'] for s in snapshots),
+            'total_wait': round(sum(s['total_wait'] for s in snapshots), 1)
+        }
+    
+    def usage(self):
+        """
+        Статистика по каждому токену для итогового отчета
+        Ключ - номер токена в пуле и маска: маски коротких токенов совпадают
+        """
+        return {
+            f"#{i + 1} {mask_token(token)}{' (401)' if token in self.revoked else ''}": s.snapshot()
+            for i, (token, s) in enumerate(self.schedulers.items())
+        }
+    
+    def close(self):
+        for scheduler in self.schedulers.values():
+            scheduler.close()
+    
+    def resume(self):
+        for scheduler in self.schedulers.values():
+            scheduler.resume()
@@ -0,0 +1,312 @@
+import csv
+import gzip
+import os
+import sqlite3
+import threading
+
+from config_manager import get_setting
+from product import Product
+
+# Колонки продукта в хранилище, ключ - producthunt_url
+PRODUCT_COLUMNS = [
+    'producthunt_url', 'name', 'description', 'votesCount', 'website',
+    'makers', 'created_at', 'crunchbase_url', 'funding_amount'
+]
+
+SQLITE_FILE = 'products.sqlite'
+PARQUET_FILE = 'products.parquet'
+CSV_FILE = 'products.csv.gz'
+
+# Пропуск в CSV: пустая строка - это значение (например, "не найдено на Crunchbase")
+CSV_NULL = '\\N'
+
+
+def _product_row(product):
+    """Только колонки хранилища, без служебных ключей (is_accessible и т.п.)"""
+    return {column: product[column] for column in PRODUCT_COLUMNS if column in product}
+
+
+class SQLiteStore:
+    """
+    Хранилище продуктов в SQLite
+    
+    Ключ - producthunt_url, индексы по website, created_at и votesCount.
+    Этапы обновляют строки на месте через upsert_many: переданные колонки
+    перезаписываются, остальные остаются как были. Пустая колонка (NULL)
+    означает, что этап еще не выполнялся - в выдаче iter_products ее нет
+    """
+    
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                producthunt_url TEXT PRIMARY KEY,
+                name TEXT,
+                description TEXT,
+                votesCount INTEGER,
+                website TEXT,
+                makers,
+                created_at TEXT,
+                crunchbase_url TEXT,
+                funding_amount TEXT
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS products_website ON products (website)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS products_created_at ON products (created_at)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS products_votes ON products (votesCount)')
+        self._conn.commit()
+    
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+    
+    def has_values(self, column):
+        """Есть ли хоть одна строка с заполненной колонкой (например, crunchbase_url)"""
+        if column not in PRODUCT_COLUMNS:
+            raise ValueError(f"Неизвестная колонка: {column}")
+        with self._lock:
+            row = self._conn.execute(f'SELECT 1 FROM products WHERE {column} IS NOT NULL LIMIT 1').fetchone()
+        return row is not None
+    
+    def _upsert(self, products):
+        """upsert без lock и commit - вызывается внутри транзакции"""
+        # executemany требует одинаковый набор колонок - группируем
+        groups = {}
+        for product in products:
+            row = _product_row(product)
+            if row.get('producthunt_url'):
+                groups.setdefault(tuple(row), []).append(tuple(row.values()))
+        
+        for columns, rows in groups.items():
+            updates = ', '.join(f'{c} = excluded.{c}' for c in columns if c != 'producthunt_url')
+            conflict = f'DO UPDATE SET {updates}' if updates else 'DO NOTHING'
+            self._conn.executemany(
+                f'INSERT INTO products ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))}) '
+                f'ON CONFLICT (producthunt_url) {conflict}',
+                rows
+            )
+    
+    def upsert_many(self, products):
+        """Вставляет или обновляет продукты (только переданные колонки)"""
+        with self._lock:
+            try:
+                self._upsert(products)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+    
+    def replace_all(self, products):
+        """
+        Заменяет все содержимое хранилища (новый полный парсинг)
+        Удаление и вставка - одна транзакция: при сбое остаются старые данные
+        """
+        with self._lock:
+            try:
+                self._conn.execute('DELETE FROM products')
+                self._upsert(products)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+    
+    def delete_many(self, producthunt_urls):
+        with self._lock:
+            self._conn.executemany('DELETE FROM products WHERE producthunt_url = ?', ((url,) for url in producthunt_urls))
+            self._conn.commit()
+    
+    def find_by_website(self, website):
+        """Продукты с данным website (по индексу)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f'SELECT {", ".join(PRODUCT_COLUMNS)} FROM products WHERE website = ?', (website,)
+            )
+            rows = cursor.fetchall()
+        return [self._to_product(PRODUCT_COLUMNS, row) for row in rows]
+    
+    def iter_products(self, columns=None):
+        """Лениво отдает продукты по убыванию голосов. columns - только нужные колонки"""
+        columns = [c for c in PRODUCT_COLUMNS if columns is None or c in columns]
+        # Отдельное соединение: чтение не держит lock и не мешает параллельным upsert
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            cursor = conn.execute(f'SELECT {", ".join(columns)} FROM products ORDER BY votesCount DESC')
+            for row in cursor:
+                yield self._to_product(columns, row)
+        finally:
+            conn.close()
+    
+    def _to_product(self, columns, row):
+        product = Product()
+        for column, value in zip(columns, row):
+            if value is not None:
+                product[column] = value
+        return product
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ColumnarStore:
+    """
+    Колоночное хранилище: Parquet (если установлен pyarrow), иначе CSV со сжатием gzip
+    
+    Файл читается целиком при открытии и перезаписывается при close(),
+    внутри - тот же интерфейс, что у SQLiteStore (ключ producthunt_url,
+    индекс по website в памяти)
+    """
+    
+    def __init__(self, path=None):
+        try:
+            import pyarrow  # noqa: F401
+            self.format = 'parquet'
+        except ImportError:
+            self.format = 'csv'
+        
+        self.path = path or (PARQUET_FILE if self.format == 'parquet' else CSV_FILE)
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._by_website = {}
+        self._dirty = False
+        
+        if os.path.exists(self.path):
+            for row in self._read():
+                self._put(row)
+            self._dirty = False
+    
+    def _read(self):
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            for row in pq.read_table(self.path).to_pylist():
+                yield self._restore(row)
+        else:
+            with gzip.open(self.path, 'rt', encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    yield self._restore(row)
+    
+    def _restore(self, row):
+        """Пропуски отбрасываются (как NULL в SQLite), числа - обратно в int"""
+        product = Product()
+        for column, value in row.items():
+            # makers = '' писали старые версии, когда makers не запрашивались
+            if column == 'makers' and value == '':
+                continue
+            if value is not None and value != CSV_NULL:
+                if column in ('votesCount', 'makers') and isinstance(value, str) and value.isdigit():
+                    value = int(value)
+                product[column] = value
+        return product
+    
+    def _put(self, row):
+        url = row['producthunt_url']
+        product = self._rows.get(url)
+        if product is None:
+            product = self._rows[url] = Product()
+        elif product.get('website') in self._by_website:
+            self._by_website[product['website']].discard(url)
+        
+        product.update(row)
+        if product.get('website'):
+            self._by_website.setdefault(product['website'], set()).add(url)
+        self._dirty = True
+    
+    def count(self):
+        return len(self._rows)
+    
+    def has_values(self, column):
+        return any(column in product for product in self._rows.values())
+    
+    def _upsert(self, products):
+        for product in products:
+            row = _product_row(product)
+            if row.get('producthunt_url'):
+                self._put({k: v for k, v in row.items() if v is not None})
+    
+    def upsert_many(self, products):
+        with self._lock:
+            self._upsert(products)
+    
+    def replace_all(self, products):
+        """Новое содержимое собирается целиком и подменяет старое только после успеха"""
+        with self._lock:
+            old_rows, old_by_website = self._rows, self._by_website
+            self._rows = {}
+            self._by_website = {}
+            try:
+                self._upsert(products)
+            except BaseException:
+                self._rows, self._by_website = old_rows, old_by_website
+                raise
+            self._dirty = True
+    
+    def delete_many(self, producthunt_urls):
+        with self._lock:
+            for url in producthunt_urls:
+                product = self._rows.pop(url, None)
+                if product is not None:
+                    self._by_website.get(product.get('website'), set()).discard(url)
+                    self._dirty = True
+    
+    def find_by_website(self, website):
+        with self._lock:
+            return [self._rows[url].copy() for url in self._by_website.get(website, ())]
+    
+    def iter_products(self, columns=None):
+        with self._lock:
+            products = sorted(self._rows.values(), key=lambda p: p.get('votesCount') or 0, reverse=True)
+        for product in products:
+            yield Product.from_dict(product if columns is None else {k: v for k, v in product.items() if k in columns})
+    
+    def flush(self):
+        """Записывает файл, если были изменения"""
+        with self._lock:
+            if not self._dirty:
+                return
+            rows = [[product.get(column) for column in PRODUCT_COLUMNS] for product in self._rows.values()]
+            tmp_path = f"{self.path}.tmp"
+            
+            if self.format == 'parquet':
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                # Голоса и makers - числа, остальные колонки храним строками
+                columns = {}
+                for i, column in enumerate(PRODUCT_COLUMNS):
+                    values = [row[i] for row in rows]
+                    if column == 'votesCount':
+                        columns[column] = pa.array(values, type=pa.int64())
+                    elif column == 'makers':
+                        # '' из журналов старых версий - пропуск
+                        columns[column] = pa.array([v if isinstance(v, int) else None for v in values], type=pa.int64())
+                    else:
+                        columns[column] = pa.array([None if v is None else str(v) for v in values], type=pa.string())
+                pq.write_table(pa.table(columns), tmp_path, compression='zstd')
+            else:
+                with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(PRODUCT_COLUMNS)
+                    writer.writerows([[CSV_NULL if v is None else v for v in row] for row in rows])
+            
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+    
+    def close(self):
+        self.flush()
+
+
+def open_store():
+    """
+    Хранилище продуктов по секции "storage" в config.json:
+    backend - "sqlite" (по умолчанию) или "columnar" (Parquet/CSV.gz), path - путь к файлу
+    """
+    settings = get_setting('storage', {})
+    
+    if settings.get('backend', 'sqlite') == 'columnar':
+        return ColumnarStore(settings.get('path'))
+    
+    return SQLiteStore(settings.get('path', SQLITE_FILE))
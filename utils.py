@@ -1,9 +1,31 @@
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import time
 import subprocess
 import sys
+from urllib.parse import parse_qs, urljoin, urlparse
+
+from cache import open_redirect_cache
+from metrics import metrics
+
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+PH_HOST = 'producthunt.com'
+
+# Признаки антибот-страниц (Cloudflare и аналоги)
+BLOCK_MARKERS = (
+    'cf-chl',
+    'challenge-platform',
+    'cf-browser-verification',
+    '<title>just a moment',
+    '<title>attention required',
+    'captcha-delivery',
+    'px-captcha',
+)
+BLOCK_STATUSES = (403, 429, 503)
 
 def resolve_redirect_url_with_browser(ph_url, browser_context, timeout=10000):
     """
@@ -38,35 +60,242 @@ def resolve_redirect_url_with_browser(ph_url, browser_context, timeout=10000):
         return ph_url, False
 
 
-def resolve_redirect_url(ph_url, timeout=10):
+def create_http_session(pool_size=32):
     """
-    Fallback функция без браузера (для non-PH ссылок)
+    Создает requests.Session с пулом соединений на pool_size хостов/потоков
     """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = BROWSER_USER_AGENT
+    return session
+
+
+def is_ph_host(url):
+    """Проверяет, что URL указывает на producthunt.com (включая поддомены)"""
+    host = (urlparse(url).hostname or '').lower()
+    return host == PH_HOST or host.endswith('.' + PH_HOST)
+
+
+def _strip_ref(url):
+    """Убирает метку ref=producthunt, которую PH добавляет к ссылкам"""
+    return url.replace('?ref=producthunt&', '?').replace('?ref=producthunt', '').replace('&ref=producthunt', '')
+
+
+# Хосты, на которых живут страницы разных компаний: ключ компании включает
+# столько первых сегментов пути (None - весь путь и параметр id)
+SHARED_HOSTS = {
+    'github.com': 1,
+    'gitlab.com': 1,
+    'bitbucket.org': 1,
+    'linktr.ee': 1,
+    'medium.com': 1,
+    'substack.com': 1,
+    'notion.so': 1,
+    'twitter.com': 1,
+    'x.com': 1,
+    'facebook.com': 1,
+    'instagram.com': 1,
+    'youtube.com': 1,
+    'linkedin.com': 2,
+    'apps.apple.com': None,
+    'play.google.com': None,
+    'chrome.google.com': None,
+    'chromewebstore.google.com': None,
+    'addons.mozilla.org': None,
+    'marketplace.visualstudio.com': None,
+    'figma.com': None,
+}
+
+
+def canonical_domain(url):
+    """
+    Канонический домен сайта: нижний регистр, без www., порта, пути и параметров
+    https://WWW.Example.com/launch?utm_source=ph -> example.com
+    
+    На общих хостах (SHARED_HOSTS) домен не отличает компании, поэтому ключ
+    включает начало пути: https://github.com/Acme/app -> github.com/acme,
+    https://play.google.com/store/apps/details?id=com.acme -> play.google.com/store/apps/details?id=com.acme
+    """
+    if not url:
+        return ''
+    if '://' not in url:
+        url = f"http://{url}"
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower().rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    
+    if host not in SHARED_HOSTS:
+        return host
+    
+    segments = [segment for segment in parsed.path.lower().split('/') if segment]
+    depth = SHARED_HOSTS[host]
+    key = '/'.join([host] + (segments if depth is None else segments[:depth]))
+    if depth is None:
+        app_id = parse_qs(parsed.query).get('id')
+        if app_id:
+            key += f"?id={app_id[0].lower()}"
+    return key
+
+
+def build_domain_index(products):
+    """
+    Индекс канонический домен -> список продуктов с этим доменом
+    Перезапуски, www/без www, пути и UTM-метки одной компании попадают в одну группу,
+    страницы разных компаний на общих хостах (GitHub, App Store, ...) - в разные
+    Продукты без домена в индекс не входят
+    """
+    index = {}
+    for product in products:
+        domain = canonical_domain(product.get('website', ''))
+        if domain:
+            index.setdefault(domain, []).append(product)
+    return index
+
+
+def _has_block_markers(response):
+    """Ищет признаки антибот-страницы в начале тела ответа"""
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(ph_url, headers=headers, timeout=timeout, allow_redirects=True)
-        final_url = response.url if response.url else ph_url
-        is_accessible = response.status_code in [200, 403]
-        return final_url, is_accessible
+        head = next(response.iter_content(chunk_size=65536, decode_unicode=False), b'')
     except requests.RequestException:
-        return ph_url, False
+        return False
+    text = head.decode('utf-8', errors='ignore').lower()
+    return any(marker in text for marker in BLOCK_MARKERS)
 
-def check_website_accessibility(url, timeout=10):
+
+def capture_redirect_target_http(ph_url, session=None, timeout=10, max_hops=10):
+    """
+    Идет по редиректам вручную и останавливается на первом URL вне producthunt.com
+    Сайт компании не запрашивается
+    
+    Возвращает (target_url, blocked): target_url=None, если редирект не найден
+    """
+    if not is_ph_host(ph_url):
+        return _strip_ref(ph_url), False
+    
+    session = session or requests
+    url = ph_url
+    
+    for _ in range(max_hops):
+        try:
+            response = session.get(url, timeout=timeout, allow_redirects=False, stream=True)
+        except requests.RequestException as e:
+            if isinstance(e, requests.Timeout):
+                metrics.inc('timeouts_total', call='resolve_http')
+            return None, True
+        
+        try:
+            location = response.headers.get('Location')
+            if not response.is_redirect or not location:
+                # PH ответил страницей (антибот или JS-редирект) - нужен браузер
+                return None, True
+        finally:
+            response.close()
+        
+        url = urljoin(url, location)
+        if not is_ph_host(url):
+            return _strip_ref(url), False
+    
+    return None, True
+
+
+def resolve_redirect_url_http(ph_url, session=None, timeout=10, early_exit=False, check_liveness=True):
+    """
+    Резолв одной ссылки обычным HTTP (см. _resolve_redirect_url_http)
+    Задержка и исход (ok, dead, blocked) пишутся в метрики как вызов resolve_http
+    
+    Возвращает (final_url, is_accessible, blocked)
+    """
+    started_at = time.perf_counter()
+    result = _resolve_redirect_url_http(ph_url, session, timeout, early_exit, check_liveness)
+    _, is_accessible, blocked = result
+    metrics.observe_call('resolve_http', time.perf_counter() - started_at,
+                         'blocked' if blocked else 'ok' if is_accessible else 'dead')
+    return result
+
+
+def _resolve_redirect_url_http(ph_url, session=None, timeout=10, early_exit=False, check_liveness=True):
+    """
+    Резолвит редирект обычным HTTP запросом и определяет антибот-блокировку
+    
+    Заблокированным считается ответ, который так и не ушел с producthunt.com
+    (403/429/503, challenge-страница или JS-редирект), а также challenge-страница
+    с кодом 403/429/503 на сайте компании - такие URL нужно отдать браузеру
+    
+    early_exit: не загружать сайт компании, только поймать редирект с PH
+                (и при check_liveness проверить доступность check_website_accessibility)
+    
+    Возвращает (final_url, is_accessible, blocked)
+    """
+    session = session or requests
+    
+    if early_exit:
+        target_url, blocked = capture_redirect_target_http(ph_url, session=session, timeout=timeout)
+        if blocked:
+            return ph_url, False, True
+        if not check_liveness:
+            return target_url, True, False
+        return target_url, check_website_accessibility(target_url, timeout=timeout, session=session), False
+    
+    try:
+        response = session.get(ph_url, timeout=timeout, allow_redirects=True, stream=True)
+    except requests.RequestException as e:
+        if isinstance(e, requests.Timeout):
+            metrics.inc('timeouts_total', call='resolve_http')
+        # Если упал запрос уже к сайту компании - сайт недоступен, браузер не поможет
+        failed_url = e.request.url if getattr(e, 'request', None) is not None else ph_url
+        if failed_url and not is_ph_host(failed_url):
+            return _strip_ref(failed_url), False, False
+        return ph_url, False, True
+    
+    try:
+        final_url = _strip_ref(response.url or ph_url)
+        status = response.status_code
+        
+        if is_ph_host(final_url):
+            return ph_url, False, True
+        
+        if status in BLOCK_STATUSES and _has_block_markers(response):
+            return final_url, False, True
+        
+        return final_url, status in [200, 403], False
+    finally:
+        response.close()
+
+
+def resolve_redirect_url(ph_url, timeout=10, session=None):
+    """
+    Fallback функция без браузера (для non-PH ссылок)
+    """
+    final_url, is_accessible, _ = resolve_redirect_url_http(ph_url, session=session, timeout=timeout)
+    return final_url, is_accessible
+
+def check_website_accessibility(url, timeout=10, session=None):
     """
     Проверяет доступность сайта
     Возвращает True, если сайт доступен (200 или 403)
+    
+    Сначала легкий HEAD; если он не дал 200/403 (многие SPA и CDN отвечают
+    на HEAD 404/405/501) или упал - решает GET, как при полной загрузке
     """
+    session = session or requests
     try:
-        response = requests.head(url, timeout=timeout, allow_redirects=True)
-        return response.status_code in [200, 403]
+        response = session.head(url, timeout=timeout, allow_redirects=True)
+        if response.status_code in [200, 403]:
+            return True
     except requests.RequestException:
+        pass
+    
+    try:
+        response = session.get(url, timeout=timeout, allow_redirects=True, stream=True)
         try:
-            response = requests.get(url, timeout=timeout, allow_redirects=True)
             return response.status_code in [200, 403]
-        except requests.RequestException:
-            return False
+        finally:
+            response.close()
+    except requests.RequestException:
+        return False
 
 def install_playwright_browsers():
     """
@@ -96,67 +325,337 @@ def install_playwright_browsers():
         return False
 
 
-def resolve_urls_batch(products, max_workers=20):
+async def capture_redirect_target_with_page(ph_url, page, timeout=10000):
     """
-    Резолвит URL из ProductHunt в реальные URL компаний через Playwright
-    
-    ProductHunt блокирует requests, поэтому используем настоящий браузер.
-    Playwright легче чем Camoufox и работает быстрее.
+    Ловит первую навигацию главного фрейма, которая уходит с producthunt.com
+    (серверный 302 или JS-редирект после антибот-проверки), и сразу прерывает ее
+    Сайт компании при этом не загружается
     
-    max_workers: количество параллельных браузерных контекстов (5-10 оптимально)
+    Возвращает URL сайта компании или None, если PH так и не отдал редирект
     """
-    print(f"\n🔗 Резолв ProductHunt URL ({len(products)} проектов)...")
-    print("⚙️ Запуск браузера...")
+    captured = asyncio.get_running_loop().create_future()
     
-    results = []
+    def on_request(request):
+        if captured.done() or not request.is_navigation_request():
+            return
+        if request.frame == page.main_frame and not is_ph_host(request.url):
+            captured.set_result(request.url)
     
-    # Импортируем Playwright здесь, чтобы поймать ошибку отсутствия браузера
+    page.on('request', on_request)
+    navigation = asyncio.ensure_future(page.goto(ph_url, timeout=timeout, wait_until='load'))
     try:
-        from playwright.sync_api import sync_playwright
-    except ImportError:
-        print("\n❌ Playwright не установлен!")
-        print("Установите: pip install playwright")
-        return []
+        await asyncio.wait_for(asyncio.shield(captured), timeout=timeout / 1000)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        page.remove_listener('request', on_request)
+        # Прерываем загрузку сайта компании (или зависшей страницы PH)
+        try:
+            await page.goto('about:blank', timeout=timeout)
+        except Exception:
+            pass
+        try:
+            await navigation
+        except Exception:
+            # Прерванная навигация - ожидаемое исключение
+            pass
+    
+    return _strip_ref(captured.result()) if captured.done() else None
+
+
+async def resolve_redirect_url_with_page(ph_url, page, timeout=10000, early_exit=False, liveness_session=None):
+    """
+    Async-версия resolve_redirect_url_with_browser для пула страниц
+    Страница не закрывается и переиспользуется воркером
+    
+    early_exit: не загружать сайт компании - только поймать редирект с PH
+    liveness_session: при early_exit проверить доступность сайта (check_website_accessibility)
+                      (None - сайт считается доступным, если редирект найден)
+    
+    Возвращает (final_url, is_accessible)
+    """
+    if early_exit:
+        final_url = await capture_redirect_target_with_page(ph_url, page, timeout=timeout)
+        if final_url is None:
+            return ph_url, False
+        if liveness_session is None:
+            return final_url, True
+        is_accessible = await asyncio.to_thread(
+            check_website_accessibility, final_url, timeout / 1000, liveness_session
+        )
+        return final_url, is_accessible
     
-    # Пытаемся запустить Playwright
     try:
-        with sync_playwright() as playwright:
-            # Используем Chromium (быстрее всего)
-            browser = playwright.chromium.launch(headless=True)
-            
-            # Создаем контекст браузера с настройками
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        response = await page.goto(ph_url, timeout=timeout, wait_until='domcontentloaded')
+        final_url = _strip_ref(page.url)
+        is_accessible = bool(response and response.status in [200, 403])
+        return final_url, is_accessible
+    except Exception:
+        return ph_url, False
+
+
+async def _run_browser_pool(queue, workers_count, timeout, on_resolved, early_exit=False, check_liveness=True):
+    """
+    Пул из workers_count браузерных контекстов
+    Каждый воркер держит свой контекст и страницу и берет продукты из общей
+    asyncio.Queue, пока не получит None. После каждого продукта вызывается
+    await on_resolved(product, ph_url, ok), ok=False - ошибка браузера
+    """
+    liveness_session = create_http_session(pool_size=workers_count) if early_exit and check_liveness else None
+    from playwright.async_api import async_playwright
+    
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=True)
+        
+        async def new_context():
+            return await browser.new_context(
+                user_agent=BROWSER_USER_AGENT,
                 viewport={'width': 1920, 'height': 1080},
                 locale='en-US'
             )
-            
-            print("✓ Браузер запущен")
-            
-            # Обрабатываем URL последовательно (браузер уже быстрый)
-            # Многопоточность с браузером сложна и может вызвать проблемы
-            with tqdm(total=len(products), desc="Резолв URL", unit="url") as pbar:
-                for product in products:
+        
+        async def worker():
+            context = await new_context()
+            page = await context.new_page()
+            try:
+                while True:
+                    product = await queue.get()
+                    if product is None:
+                        return
+                    
+                    ph_url = product['website']
+                    ok = True
                     try:
-                        real_url, is_accessible = resolve_redirect_url_with_browser(
-                            product['website'], 
-                            context,
-                            timeout=10000
-                        )
-                        
+                        with metrics.track('browser_navigation') as call:
+                            real_url, is_accessible = await resolve_redirect_url_with_page(
+                                ph_url,
+                                page,
+                                timeout=timeout,
+                                early_exit=early_exit,
+                                liveness_session=liveness_session
+                            )
+                            if not is_accessible:
+                                call.outcome = 'dead'
+
                         product['website'] = real_url
                         product['is_accessible'] = is_accessible
-                        results.append(product)
                         
+                        # После неудачной навигации страница может зависнуть - пересоздаем
+                        if not is_accessible:
+                            await page.close()
+                            page = await context.new_page()
                     except Exception as e:
                         print(f"\n⚠ Ошибка для {product.get('name', 'Unknown')}: {e}")
                         product['is_accessible'] = False
-                        results.append(product)
-                    finally:
-                        pbar.update(1)
-            
-            context.close()
-            browser.close()
+                        ok = False
+                    
+                    await on_resolved(product, ph_url, ok)
+            finally:
+                await context.close()
+        
+        print(f"✓ Браузер запущен ({workers_count} контекстов)")
+        
+        await asyncio.gather(*(worker() for _ in range(workers_count)))
+        await browser.close()
+    
+    if liveness_session is not None:
+        liveness_session.close()
+
+
+async def _resolve_urls_async(products, max_workers, timeout, pbar, on_result=None,
+                              early_exit=False, check_liveness=True):
+    """
+    Резолвит список URL пулом из max_workers браузерных контекстов
+    Каждый результат сразу передается в on_result(ph_url, final_url, is_accessible)
+    """
+    workers_count = max(1, min(max_workers, len(products)))
+    
+    queue = asyncio.Queue()
+    for product in products:
+        queue.put_nowait(product)
+    for _ in range(workers_count):
+        queue.put_nowait(None)
+    
+    async def on_resolved(product, ph_url, ok):
+        if ok and on_result is not None:
+            on_result(ph_url, product['website'], product['is_accessible'])
+        pbar.update(1)
+    
+    await _run_browser_pool(queue, workers_count, timeout, on_resolved, early_exit, check_liveness)
+
+
+class PlaywrightMissingError(Exception):
+    """Playwright или его браузер недоступны, резолв невозможен"""
+
+
+def _apply_known_redirects(products, known):
+    """
+    Применяет уже известные редиректы (из кэша или журнала) к продуктам
+    known: словарь PH URL -> {final_url, is_accessible}
+    Возвращает список продуктов, для которых редирект неизвестен
+    """
+    misses = []
+    for product in products:
+        entry = known.get(product['website'])
+        if entry is None:
+            misses.append(product)
+            continue
+        product['website'] = entry['final_url']
+        product['is_accessible'] = entry['is_accessible']
+    
+    return misses
+
+
+def _resolve_over_http(products, workers, on_result=None, early_exit=False, check_liveness=True):
+    """
+    Первый уровень резолва: пул HTTP-соединений без браузера
+    Резолвленные продукты обновляются на месте
+    Возвращает список продуктов, заблокированных антиботом (нужен браузер)
+    """
+    blocked = []
+    
+    session = create_http_session(pool_size=workers)
+    
+    def resolve(product):
+        ph_url = product['website']
+        return product, ph_url, resolve_redirect_url_http(
+            ph_url, session=session, early_exit=early_exit, check_liveness=check_liveness
+        )
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(resolve, product) for product in products]
+        
+        with tqdm(total=len(products), desc="Резолв URL (HTTP)", unit="url") as pbar:
+            for future in as_completed(futures):
+                product, ph_url, (real_url, is_accessible, is_blocked) = future.result()
+                
+                if is_blocked:
+                    blocked.append(product)
+                else:
+                    product['website'] = real_url
+                    product['is_accessible'] = is_accessible
+                    if on_result is not None:
+                        on_result(ph_url, real_url, is_accessible)
+                
+                pbar.update(1)
+                pbar.set_postfix({'в браузер': len(blocked)})
+    
+    session.close()
+    return blocked
+
+
+def resolve_urls_batch(products, max_workers=20, use_cache=True, http_first=True, http_workers=32,
+                       early_exit=True, check_liveness=True, journal=None):
+    """
+    Резолвит URL из ProductHunt в реальные URL компаний
+    
+    Уровни резолва (каждый следующий - только для того, что не решил предыдущий):
+    1. кэш (cache.sqlite)
+    2. обычный HTTP с пулом соединений (http_first)
+    3. Playwright - для ссылок, где ProductHunt отдал антибот-страницу
+    
+    max_workers: количество параллельных браузерных контекстов
+    http_workers: количество потоков HTTP уровня
+    early_exit: только поймать редирект с PH, не загружая сайт компании
+    check_liveness: при early_exit проверить доступность сайта HEAD запросом
+    journal: CheckpointJournal - каждый результат пишется в журнал, уже записанные пропускаются
+    """
+    print(f"\n🔗 Резолв ProductHunt URL ({len(products)} проектов)...")
+    
+    started_at = time.time()
+    tier_counts = {'cache': 0, 'http': 0, 'browser': 0}
+    browser_elapsed = 0.0
+    
+    cache = open_redirect_cache() if use_cache else None
+    pending = products
+    unresolved = 0
+    
+    def on_result(ph_url, real_url, is_accessible):
+        entry = {'final_url': real_url, 'is_accessible': is_accessible}
+        if cache is not None:
+            cache.set(ph_url, entry, negative=not is_accessible)
+        if journal is not None:
+            journal.record('resolve', ph_url, entry)
+    
+    try:
+        if journal is not None:
+            pending = _apply_known_redirects(pending, journal.completed('resolve'))
+            if len(pending) < len(products):
+                print(f"↻ Из журнала: {len(products) - len(pending)}")
+        
+        if cache is not None:
+            pending_count = len(pending)
+            pending = _apply_known_redirects(pending, cache.get_many(p['website'] for p in pending))
+            tier_counts['cache'] = pending_count - len(pending)
+            print(f"✓ Из кэша: {tier_counts['cache']}, осталось: {len(pending)}")
+        
+        if pending and http_first:
+            pending_count = len(pending)
+            pending = _resolve_over_http(pending, http_workers, on_result, early_exit, check_liveness)
+            tier_counts['http'] = pending_count - len(pending)
+        
+        if pending:
+            print(f"⚙️ Запуск браузера для {len(pending)} ссылок...")
+            browser_started_at = time.time()
+            _resolve_in_browser(pending, max_workers, on_result, early_exit, check_liveness)
+            browser_elapsed = time.time() - browser_started_at
+            tier_counts['browser'] = len(pending)
+    except PlaywrightMissingError as e:
+        # Браузер - только запасной уровень: результаты кэша и HTTP сохраняются
+        print(f"\n{e}")
+        unresolved = sum(1 for p in pending if 'is_accessible' not in p)
+        tier_counts['browser'] = len(pending) - unresolved
+        print(f"⚠ Без браузера не резолвлено ссылок: {unresolved} - они пропущены "
+              f"(в журнал не записаны, при продолжении запуска будут запрошены снова)")
+    finally:
+        if cache is not None:
+            cache.close()
+    
+    elapsed = time.time() - started_at
+    results = products
+    metrics.record_stage('resolve', elapsed, len(results))
+    for tier, count in tier_counts.items():
+        metrics.inc('resolve_tier_total', count, tier=tier)
+    
+    # Фильтруем только доступные проекты
+    accessible_products = [p for p in results if p.get('is_accessible', False)]
+    filtered_count = len(results) - len(accessible_products) - unresolved
+    
+    print(f"\n✓ Резолв завершен:")
+    print(f"  - Доступных проектов: {len(accessible_products)}")
+    print(f"  - Недоступных (отфильтровано): {filtered_count}")
+    print(f"  - Скорость: {len(results) / elapsed if elapsed > 0 else 0:.1f} URL/сек ({elapsed:.1f} сек)")
+    print(f"  - Уровни: кэш {tier_counts['cache']}, HTTP {tier_counts['http']}, браузер {tier_counts['browser']}")
+    
+    if tier_counts['browser'] and browser_elapsed > 0:
+        per_url = browser_elapsed / tier_counts['browser']
+        saved = per_url * (tier_counts['cache'] + tier_counts['http'])
+        print(f"  - Сэкономлено браузерного времени: ~{saved:.0f} сек ({per_url:.2f} сек/URL в браузере)")
+    
+    if len(accessible_products) == 0 and not unresolved:
+        print("\n⚠ ВНИМАНИЕ: Все сайты недоступны!")
+    
+    return accessible_products
+
+
+def _resolve_in_browser(products, max_workers, on_result=None, early_exit=False, check_liveness=True):
+    """
+    Запускает пул браузерных контекстов для products
+    При отсутствии браузера предлагает установить его и повторяет попытку
+    """
+    # Импортируем Playwright здесь, чтобы поймать ошибку отсутствия браузера
+    try:
+        import playwright.async_api  # noqa: F401
+    except ImportError:
+        raise PlaywrightMissingError("❌ Playwright не установлен!\nУстановите: pip install playwright")
+    
+    # Пытаемся запустить Playwright
+    try:
+        with tqdm(total=len(products), desc="Резолв URL", unit="url") as pbar:
+            asyncio.run(_resolve_urls_async(
+                products, max_workers, 10000, pbar, on_result,
+                early_exit=early_exit, check_liveness=check_liveness
+            ))
         
     except Exception as e:
         error_msg = str(e)
@@ -171,31 +670,141 @@ def resolve_urls_batch(products, max_workers=20):
             if install_choice in ['', 'y', 'yes', 'д', 'да']:
                 if install_playwright_browsers():
                     print("\n🔄 Повторный запуск резолва URL...")
-                    # Рекурсивно вызываем функцию после установки
-                    return resolve_urls_batch(products, max_workers)
+                    return _resolve_in_browser(products, max_workers, on_result, early_exit, check_liveness)
                 else:
-                    print("\n❌ Не удалось установить браузер")
-                    print("Установите вручную: playwright install chromium")
-                    return []
+                    raise PlaywrightMissingError(
+                        "❌ Не удалось установить браузер\n"
+                        "Установите вручную: playwright install chromium"
+                    )
             else:
-                print("\n❌ Резолв URL отменен")
-                print("Для работы программы установите браузер: playwright install chromium")
-                return []
+                raise PlaywrightMissingError(
+                    "❌ Резолв URL отменен\n"
+                    "Для работы программы установите браузер: playwright install chromium"
+                )
         else:
             # Другая ошибка
-            print(f"\n❌ Ошибка Playwright: {e}")
-            return []
+            raise PlaywrightMissingError(f"❌ Ошибка Playwright: {e}")
+
+
+def resolve_urls_stream(in_queue, emit, max_workers=20, use_cache=True, http_first=True, http_workers=32,
+                        early_exit=True, check_liveness=True, journal=None):
+    """
+    Потоковый резолв для конвейера
+    Берет продукты из in_queue (queue.Queue) до None и вызывает emit(product)
+    для каждого доступного сразу после резолва. Уровни те же, что в resolve_urls_batch,
+    браузер запускается только при первой ссылке, заблокированной антиботом
+    Возвращает счетчики по уровням
+    """
+    stats = {'cache': 0, 'http': 0, 'browser': 0, 'accessible': 0}
+    cache = open_redirect_cache() if use_cache else None
+    started_at = time.time()
     
-    # Фильтруем только доступные проекты
-    accessible_products = [p for p in results if p.get('is_accessible', False)]
-    filtered_count = len(results) - len(accessible_products)
+    try:
+        asyncio.run(_resolve_stream_async(
+            in_queue, emit, max_workers, http_first, http_workers,
+            early_exit, check_liveness, cache, journal, stats
+        ))
+    finally:
+        if cache is not None:
+            cache.close()
+        metrics.record_stage('resolve', time.time() - started_at, stats['cache'] + stats['http'] + stats['browser'])
+        for tier in ('cache', 'http', 'browser'):
+            metrics.inc('resolve_tier_total', stats[tier], tier=tier)
     
-    print(f"\n✓ Резолв завершен:")
-    print(f"  - Доступных проектов: {len(accessible_products)}")
-    print(f"  - Недоступных (отфильтровано): {filtered_count}")
+    return stats
+
+
+async def _resolve_stream_async(in_queue, emit, max_workers, http_first, http_workers,
+                                early_exit, check_liveness, cache, journal, stats):
+    """Асинхронная часть resolve_urls_stream"""
+    loop = asyncio.get_running_loop()
+    http_executor = ThreadPoolExecutor(max_workers=http_workers)
+    session = create_http_session(pool_size=http_workers)
+    http_slots = asyncio.Semaphore(http_workers)
+    browser_queue = asyncio.Queue()
+    browser_task = None
+    tasks = set()
     
-    if len(accessible_products) == 0:
-        print("\n⚠ ВНИМАНИЕ: Все сайты недоступны!")
+    def lookup(ph_url):
+        entry = journal.get('resolve', ph_url) if journal is not None else None
+        if entry is None and cache is not None:
+            entry = cache.get(ph_url)
+        return entry
     
-    return accessible_products
-
+    def record(ph_url, product):
+        entry = {'final_url': product['website'], 'is_accessible': product['is_accessible']}
+        if cache is not None:
+            cache.set(ph_url, entry, negative=not product['is_accessible'])
+        if journal is not None:
+            journal.record('resolve', ph_url, entry)
+    
+    async def finish(product):
+        if product.get('is_accessible'):
+            stats['accessible'] += 1
+            # emit может блокироваться на заполненной очереди - это и есть backpressure
+            await loop.run_in_executor(None, emit, product)
+    
+    async def on_browser_resolved(product, ph_url, ok):
+        stats['browser'] += 1
+        if ok:
+            record(ph_url, product)
+        await finish(product)
+    
+    async def process(product):
+        nonlocal browser_task
+        try:
+            ph_url = product['website']
+            
+            entry = lookup(ph_url)
+            if entry is not None:
+                product['website'] = entry['final_url']
+                product['is_accessible'] = entry['is_accessible']
+                stats['cache'] += 1
+                await finish(product)
+                return
+            
+            if http_first:
+                real_url, is_accessible, is_blocked = await loop.run_in_executor(
+                    http_executor,
+                    lambda: resolve_redirect_url_http(
+                        ph_url, session=session, early_exit=early_exit, check_liveness=check_liveness
+                    )
+                )
+                if not is_blocked:
+                    product['website'] = real_url
+                    product['is_accessible'] = is_accessible
+                    record(ph_url, product)
+                    stats['http'] += 1
+                    await finish(product)
+                    return
+            
+            if browser_task is None:
+                print(f"\n⚙️ Запуск браузера для заблокированных ссылок...")
+                browser_task = asyncio.create_task(_run_browser_pool(
+                    browser_queue, max_workers, 10000, on_browser_resolved, early_exit, check_liveness
+                ))
+            await browser_queue.put(product)
+        finally:
+            http_slots.release()
+    
+    try:
+        while True:
+            product = await loop.run_in_executor(None, in_queue.get)
+            if product is None:
+                break
+            
+            await http_slots.acquire()
+            task = asyncio.create_task(process(product))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        
+        if tasks:
+            await asyncio.gather(*tasks)
+        
+        if browser_task is not None:
+            for _ in range(max_workers):
+                await browser_queue.put(None)
+            await browser_task
+    finally:
+        http_executor.shutdown(wait=False)
+        session.close()
@@ -0,0 +1,380 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from tqdm import tqdm
+
+from config_manager import get_setting
+from metrics import metrics
+from utils import canonical_domain, is_ph_host
+
+QUEUE_FILE = 'queue.sqlite'
+
+# Этапы в порядке выполнения: результат каждого порождает задачи следующего
+STAGES = ('resolve', 'cb_search', 'funding')
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class WorkQueue:
+    """
+    Надежная очередь задач в SQLite для воркеров в отдельных процессах
+    
+    Задача - (stage, key) с JSON payload и состоянием pending/leased/done/failed.
+    Воркер забирает пачку задач в аренду (claim) на lease_seconds; не
+    завершенная за это время задача снова становится доступной другим воркерам
+    (процесс упал или завис). Ошибка возвращает задачу в очередь с паузой
+    retry_delay, после max_attempts попыток задача помечается failed.
+    Готовые задачи нумеруются (seq), координатор забирает результаты
+    после последнего прочитанного номера
+    """
+    
+    def __init__(self, path=QUEUE_FILE, lease_seconds=300, max_attempts=3, retry_delay=30):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        # isolation_level=None - транзакции открываются явно (BEGIN IMMEDIATE в claim)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                stage TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT,
+                seq INTEGER,
+                updated_at REAL,
+                PRIMARY KEY (stage, key)
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS items_claim ON items (stage, state, available_at)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS items_seq ON items (stage, seq)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+    
+    # --- координатор ---
+    
+    def enqueue_many(self, stage, items):
+        """
+        Добавляет задачи stage: items - пары (key, payload)
+        Уже существующие ключи не меняются (повторный запуск координатора безопасен)
+        Возвращает количество новых задач
+        """
+        now = time.time()
+        rows = [(stage, key, json.dumps(payload, ensure_ascii=False), now) for key, payload in items]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO items (stage, key, payload, updated_at) VALUES (?, ?, ?, ?)', rows
+            )
+            self._conn.execute('COMMIT')
+            return self._conn.total_changes - before
+    
+    def results_since(self, stage, seq=0):
+        """Готовые и окончательно упавшие задачи с номером больше seq: список (seq, key, state, result)"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT seq, key, state, result FROM items WHERE stage = ? AND seq > ? ORDER BY seq',
+                (stage, seq)
+            ).fetchall()
+        return [(row[0], row[1], row[2], json.loads(row[3]) if row[3] else None) for row in rows]
+    
+    def counts(self, stage=None):
+        """Количество задач по состояниям: {state: n} (по всем этапам, если stage не задан)"""
+        query = 'SELECT state, COUNT(*) FROM items'
+        params = ()
+        if stage is not None:
+            query += ' WHERE stage = ?'
+            params = (stage,)
+        with self._lock:
+            rows = self._conn.execute(query + ' GROUP BY state', params).fetchall()
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update(rows)
+        return counts
+    
+    def get_meta(self, name, default=None):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+    
+    def set_meta(self, name, value):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, json.dumps(value))
+            )
+    
+    def is_finished(self):
+        """Координатор собрал все результаты - воркерам пора завершаться"""
+        return bool(self.get_meta('finished', False))
+    
+    def clear(self):
+        """Удаляет все задачи (новый запуск)"""
+        with self._lock:
+            self._conn.execute('DELETE FROM items')
+            self._conn.execute('DELETE FROM meta')
+    
+    # --- воркер ---
+    
+    def claim(self, stage, worker_id, limit=50):
+        """
+        Забирает в аренду до limit задач stage: новые, отложенные после ошибки
+        и те, у которых истекла аренда другого воркера
+        Возвращает список (key, payload)
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Аренда истекла на последней попытке - задача больше не выдается
+                self._conn.execute(
+                    "UPDATE items SET state = 'failed', error = 'аренда истекла', lease_owner = NULL, "
+                    "seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM items WHERE stage = ?), updated_at = ? "
+                    "WHERE stage = ? AND state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (stage, now, stage, now, self.max_attempts)
+                )
+                rows = self._conn.execute(
+                    "SELECT key, payload FROM items WHERE stage = ? AND ("
+                    "(state = 'pending' AND available_at <= ?) OR (state = 'leased' AND lease_expires < ?)"
+                    ") LIMIT ?",
+                    (stage, now, now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE items SET state = 'leased', attempts = attempts + 1, lease_owner = ?, "
+                    "lease_expires = ?, updated_at = ? WHERE stage = ? AND key = ?",
+                    [(worker_id, now + self.lease_seconds, now, stage, key) for key, _ in rows]
+                )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return [(key, json.loads(payload) if payload else None) for key, payload in rows]
+    
+    def complete(self, stage, key, result):
+        """
+        Сохраняет результат задачи. Принимается, даже если аренда уже истекла
+        и задачу забрал другой воркер - результат этапа от этого не меняется
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE items SET state = 'done', result = ?, error = NULL, lease_owner = NULL, "
+                "seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM items WHERE stage = ?), updated_at = ? "
+                "WHERE stage = ? AND key = ? AND state IN ('pending', 'leased')",
+                (json.dumps(result, ensure_ascii=False), stage, now, stage, key)
+            )
+    
+    def fail(self, stage, key, error):
+        """Ошибка обработки: задача вернется в очередь через retry_delay или станет failed"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute(
+                    "UPDATE items SET state = 'pending', error = ?, lease_owner = NULL, available_at = ?, "
+                    "updated_at = ? WHERE stage = ? AND key = ? AND state = 'leased' AND attempts < ?",
+                    (str(error), now + self.retry_delay, now, stage, key, self.max_attempts)
+                )
+                self._conn.execute(
+                    "UPDATE items SET state = 'failed', error = ?, lease_owner = NULL, "
+                    "seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM items WHERE stage = ?), updated_at = ? "
+                    "WHERE stage = ? AND key = ? AND state = 'leased'",
+                    (str(error), stage, now, stage, key)
+                )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+    
+    def release(self, stage, keys):
+        """Возвращает задачи в очередь без траты попытки (воркер не может их обработать)"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE items SET state = 'pending', attempts = MAX(attempts - 1, 0), lease_owner = NULL, "
+                "available_at = ?, updated_at = ? WHERE stage = ? AND key = ? AND state = 'leased'",
+                [(now, now, stage, key) for key in keys]
+            )
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_work_queue():
+    """
+    Очередь по секции "work_queue" в config.json:
+    path, lease_seconds (300), max_attempts (3), retry_delay_seconds (30)
+    """
+    settings = get_setting('work_queue', {})
+    return WorkQueue(
+        settings.get('path', QUEUE_FILE),
+        lease_seconds=settings.get('lease_seconds', 300),
+        max_attempts=settings.get('max_attempts', 3),
+        retry_delay=settings.get('retry_delay_seconds', 30)
+    )
+
+
+def coordinate(store, queue, crunchbase=True, poll_seconds=2, workers=()):
+    """
+    Координатор очереди: ставит задачи по продуктам из хранилища и сливает
+    результаты воркеров обратно в хранилище
+    
+    resolve - PH ссылки продуктов, которые еще не резолвлены (ключ - ссылка),
+    cb_search - канонические домены доступных продуктов без crunchbase_url,
+    funding - crunchbase_url без funding_amount. Задачи следующего этапа ставятся
+    по мере готовности предыдущего, поэтому этапы идут одновременно.
+    Повторный запуск продолжает с места остановки: состояние хранится в очереди
+    и в хранилище. Недоступный продукт удаляется из хранилища сразу после
+    резолва - is_accessible не хранится, резолвленный продукт считается доступным
+    
+    workers - локальные процессы воркеров (subprocess.Popen), только для предупреждения,
+    если все они завершились, а задачи остались
+    Возвращает итоговый список продуктов
+    """
+    started_at = time.time()
+    products = {p['producthunt_url']: p for p in store.iter_products()}
+    
+    waiting = {stage: {} for stage in STAGES}   # этап -> ключ задачи -> продукты, ждущие результата
+    finished = {stage: {} for stage in STAGES}  # этап -> ключ задачи -> (state, result)
+    enqueued = {stage: set() for stage in STAGES}
+    owners = {}                                  # crunchbase_url -> первый домен с этой ссылкой
+    changed = []
+    inaccessible = set()
+    
+    def add(stage, key, product):
+        if key in finished[stage]:
+            # Результат уже есть (другой продукт с тем же ключом или прошлый запуск)
+            apply(stage, key, product, *finished[stage][key])
+        else:
+            waiting[stage].setdefault(key, []).append(product)
+    
+    def add_search(product):
+        domain = canonical_domain(product.get('website', ''))
+        if domain:
+            add('cb_search', domain, product)
+        else:
+            product['crunchbase_url'] = ''
+            product['funding_amount'] = ''
+            changed.append(product)
+    
+    def apply(stage, key, product, state, result):
+        changed.append(product)
+        if stage == 'resolve':
+            if state == DONE:
+                product['website'] = result['final_url']
+                product['is_accessible'] = result['is_accessible']
+            else:
+                product['is_accessible'] = False
+            if crunchbase and product['is_accessible']:
+                add_search(product)
+        elif stage == 'cb_search':
+            cb_url = result['crunchbase_url'] if state == DONE else ''
+            # Один crunchbase_url у разных доменов - скорее ложное совпадение поиска
+            if cb_url and owners.setdefault(cb_url, key) != key:
+                cb_url = ''
+            product['crunchbase_url'] = cb_url
+            if cb_url:
+                add('funding', cb_url, product)
+            else:
+                product['funding_amount'] = ''
+        else:
+            product['funding_amount'] = result['funding_amount'] if state == DONE else ''
+    
+    def enqueue():
+        for stage in STAGES:
+            new_keys = [key for key in waiting[stage] if key not in enqueued[stage]]
+            if new_keys:
+                queue.enqueue_many(stage, ((key, None) for key in new_keys))
+                enqueued[stage].update(new_keys)
+    
+    # Задачи по текущему состоянию хранилища
+    # (is_accessible в хранилище не пишется: недоступные удаляются сразу после резолва,
+    # поэтому продукт с website не на producthunt.com - резолвленный и доступный)
+    for product in products.values():
+        if is_ph_host(product.get('website', '')):
+            add('resolve', product['website'], product)
+            continue
+        product['is_accessible'] = True
+        
+        if not crunchbase:
+            continue
+        if 'crunchbase_url' not in product:
+            add_search(product)
+        elif product['crunchbase_url'] and 'funding_amount' not in product:
+            owners.setdefault(product['crunchbase_url'], canonical_domain(product['website']))
+            add('funding', product['crunchbase_url'], product)
+    
+    enqueue()
+    queue.set_meta('finished', False)
+    
+    print(f"\n📬 Очередь {queue.path}: резолв {len(waiting['resolve'])}, "
+          f"поиск CB {len(waiting['cb_search'])}, funding {len(waiting['funding'])}")
+    print("   Воркеры: python worker.py (сколько угодно процессов, в том числе на других машинах с общим диском)")
+    
+    last_seq = dict.fromkeys(STAGES, 0)
+    warned = False
+    
+    with tqdm(desc="Очередь", unit="задач") as pbar:
+        while True:
+            for stage in STAGES:
+                for seq, key, state, result in queue.results_since(stage, last_seq[stage]):
+                    last_seq[stage] = seq
+                    finished[stage][key] = (state, result)
+                    for product in waiting[stage].pop(key, ()):
+                        apply(stage, key, product, state, result)
+            
+            enqueue()
+            if changed:
+                # Недоступные удаляются тем же проходом, что и резолв - иначе после
+                # прерывания их резолвленный website выглядел бы как доступный
+                dead = [p['producthunt_url'] for p in changed if not p.get('is_accessible')]
+                if dead:
+                    store.delete_many(dead)
+                    inaccessible.update(dead)
+                store.upsert_many(p for p in changed if p.get('is_accessible'))
+                changed.clear()
+            
+            counts = queue.counts()
+            pbar.total = sum(counts.values())
+            pbar.n = counts[DONE] + counts[FAILED]
+            pbar.set_postfix({'в работе': counts[LEASED], 'ошибок': counts[FAILED]})
+            
+            if not any(waiting.values()):
+                break
+            
+            if workers and not warned and all(w.poll() is not None for w in workers):
+                warned = True
+                print("\n⚠ Локальные воркеры завершились - ждем внешних (python worker.py), Ctrl+C - прервать")
+            
+            time.sleep(poll_seconds)
+    
+    queue.set_meta('finished', True)
+    
+    result = [p for p in products.values() if p.get('is_accessible')]
+    failed = {stage: queue.counts(stage)[FAILED] for stage in STAGES}
+    metrics.record_stage('work_queue', time.time() - started_at, len(products))
+    
+    print(f"\n✓ Очередь обработана: доступных проектов {len(result)}, недоступных {len(inaccessible)}")
+    if any(failed.values()):
+        print(f"⚠ Задач с ошибкой после всех попыток: резолв {failed['resolve']}, "
+              f"поиск CB {failed['cb_search']}, funding {failed['funding']}")
+    return result
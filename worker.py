@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Воркер очереди задач (work_queue.py)
+
+Забирает пачки задач резолва URL, поиска на Crunchbase и funding из
+queue.sqlite, обрабатывает их и отдает результат координатору (main.py).
+Воркеров можно запустить сколько угодно - каждый берет свои задачи в аренду,
+задачи упавшего воркера после истечения аренды достаются остальным.
+Воркер завершается, когда координатор собрал все результаты
+
+Запуск из корня репозитория:
+    python worker.py
+    python worker.py --stages resolve --batch 100
+    python worker.py --stages cb_search,funding --worker-id cb-1
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+from metrics import metrics
+from product import Product
+from utils import resolve_urls_batch
+from work_queue import LEASED, PENDING, STAGES, open_work_queue
+
+WORKERS_DIR = 'workers'
+PROFILE_DIR = 'user-data-dir'
+
+
+def _cookies_mtime(profile):
+    """Время последнего изменения кук профиля Firefox (0 - кук нет)"""
+    return max((os.path.getmtime(path) for path in glob.glob(os.path.join(profile, 'cookies.sqlite*'))), default=0)
+
+
+def sync_profile(profile):
+    """
+    Копирует профиль основного запуска в profile, если копии нет или куки
+    основного профиля изменились с прошлого копирования (например, после повторного входа)
+    """
+    if not os.path.exists(PROFILE_DIR):
+        return
+    
+    marker = os.path.join(os.path.dirname(profile), 'profile.json')
+    source_mtime = _cookies_mtime(PROFILE_DIR)
+    try:
+        with open(marker, encoding='utf-8') as f:
+            copied_mtime = json.load(f).get('cookies_mtime')
+    except (OSError, ValueError):
+        copied_mtime = None
+    
+    if os.path.exists(profile) and copied_mtime == source_mtime:
+        return
+    
+    shutil.rmtree(profile, ignore_errors=True)
+    shutil.copytree(PROFILE_DIR, profile, ignore=shutil.ignore_patterns('lock', '.parentlock', 'parent.lock'))
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump({'cookies_mtime': source_mtime}, f)
+
+
+def resolve_batch(keys, args):
+    """PH ссылки -> результаты резолва (кэш, HTTP, браузер - как в обычном режиме)"""
+    products = [Product(website=ph_url) for ph_url in keys]
+    try:
+        resolve_urls_batch(products, max_workers=args.browser_workers, http_workers=args.http_workers)
+    except Exception as e:
+        # Упал браузерный уровень - результаты кэша и HTTP уровня не теряем
+        print(f"\n⚠ Ошибка резолва: {e}")
+    
+    results = []
+    for ph_url, product in zip(keys, products):
+        if 'is_accessible' in product:
+            results.append((ph_url, {'final_url': product['website'], 'is_accessible': product['is_accessible']}, None))
+        else:
+            # Ссылка ушла в браузер, а он недоступен
+            results.append((ph_url, None, 'не удалось резолвить'))
+    return results
+
+
+def search_batch(keys, crunchbase):
+    """Домены -> crunchbase_url ('' - не найдено)"""
+    results = []
+    for domain, (crunchbase_url, success, error) in zip(keys, crunchbase.search_organizations(keys)):
+        if error is not None:
+            results.append((domain, None, error))
+        else:
+            results.append((domain, {'crunchbase_url': crunchbase_url if success and crunchbase_url else ''}, None))
+    return results
+
+
+def funding_batch(keys, crunchbase):
+    """crunchbase_url -> funding ('' - нет данных о финансировании)"""
+    fundings, failed = crunchbase.fetch_fundings(keys)
+    return [
+        (url, None, 'страница не загрузилась') if url in failed else (url, {'funding_amount': fundings.get(url) or ''}, None)
+        for url in keys
+    ]
+
+
+def spawn_workers(count, stages=STAGES):
+    """
+    Запускает count локальных процессов worker.py (для main.py)
+    Вывод каждого воркера - в workers/<id>.log
+    """
+    os.makedirs(WORKERS_DIR, exist_ok=True)
+    script = os.path.abspath(__file__)
+    env = dict(os.environ, PYTHONIOENCODING='utf-8')
+    workers = []
+    for i in range(count):
+        worker_id = f'local-{i + 1}'
+        with open(os.path.join(WORKERS_DIR, f'{worker_id}.log'), 'w', encoding='utf-8') as log:
+            workers.append(subprocess.Popen(
+                [sys.executable, script, '--worker-id', worker_id, '--stages', ','.join(stages)],
+                stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, env=env
+            ))
+    return workers
+
+
+class WorkerStop(Exception):
+    """Воркер не может продолжать (например, сессия Crunchbase не авторизована)"""
+
+
+class Worker:
+    def __init__(self, args):
+        self.args = args
+        self.queue = open_work_queue()
+        self._crunchbase = None
+    
+    def crunchbase(self):
+        """
+        Парсер Crunchbase запускается при первой задаче Crunchbase
+        У каждого воркера своя копия профиля браузера (один профиль нельзя открыть
+        в двух процессах), куки берутся из user-data-dir основного запуска.
+        Вход не интерактивный: у воркера нет консоли
+        """
+        if self._crunchbase is None:
+            from crunchbase_parser import CrunchbaseParser
+            
+            profile = os.path.join(WORKERS_DIR, self.args.worker_id, PROFILE_DIR)
+            sync_profile(profile)
+            self._crunchbase = CrunchbaseParser(user_data_dir=profile, interactive=False)
+        return self._crunchbase
+    
+    def close_crunchbase(self):
+        """Следующая задача Crunchbase запустит браузер заново (и обновит копию профиля)"""
+        if self._crunchbase is not None:
+            self._crunchbase.close()
+            self._crunchbase = None
+    
+    def process(self, stage, keys):
+        if stage == 'resolve':
+            return resolve_batch(keys, self.args)
+        if stage == 'cb_search':
+            return search_batch(keys, self.crunchbase())
+        return funding_batch(keys, self.crunchbase())
+    
+    def run_batch(self, stage):
+        """Одна пачка задач stage. Возвращает количество обработанных задач"""
+        claimed = self.queue.claim(stage, self.args.worker_id, self.args.batch)
+        if not claimed:
+            return 0
+        keys = [key for key, _ in claimed]
+        
+        try:
+            results = self.process(stage, keys)
+        except Exception as e:
+            if stage != 'resolve':
+                from crunchbase_parser import CrunchbaseAuthError
+                
+                if isinstance(e, CrunchbaseAuthError):
+                    # Задачи не виноваты - отдаем их другим воркерам без траты попыток
+                    self.queue.release(stage, keys)
+                    raise WorkerStop(str(e)) from e
+            
+            print(f"\n⚠ Ошибка пачки {stage}: {e}")
+            for key in keys:
+                self.queue.fail(stage, key, e)
+            # Сессия браузера могла сломаться - при следующей задаче запустится заново
+            if stage != 'resolve':
+                self.close_crunchbase()
+            return len(keys)
+        
+        for key, result, error in results:
+            if error is None:
+                self.queue.complete(stage, key, result)
+            else:
+                self.queue.fail(stage, key, error)
+        return len(keys)
+    
+    def has_work(self):
+        """Есть задачи этапов воркера, ожидающие повтора или в аренде у других"""
+        for stage in self.args.stages:
+            counts = self.queue.counts(stage)
+            if counts[PENDING] or counts[LEASED]:
+                return True
+        return False
+    
+    def run(self):
+        print(f"👷 Воркер {self.args.worker_id}: этапы {', '.join(self.args.stages)}, очередь {self.queue.path}")
+        processed = 0
+        try:
+            while True:
+                # Каждый этап получает свою пачку за проход, чтобы задачи не копились в середине
+                done = sum(self.run_batch(stage) for stage in self.args.stages)
+                processed += done
+                if done:
+                    continue
+                if self.queue.is_finished() or (self.args.exit_when_idle and not self.has_work()):
+                    break
+                time.sleep(self.args.poll)
+        finally:
+            self.close_crunchbase()
+            self.queue.close()
+        print(f"\n✓ Воркер {self.args.worker_id} завершен, задач: {processed}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--stages', default=','.join(STAGES), help='этапы через запятую: resolve, cb_search, funding')
+    arg_parser.add_argument('--batch', type=int, default=50, help='задач в одной пачке')
+    arg_parser.add_argument('--worker-id', default=f'{socket.gethostname()}-{os.getpid()}')
+    arg_parser.add_argument('--poll', type=float, default=2, help='пауза, когда задач нет, сек')
+    arg_parser.add_argument('--exit-when-idle', action='store_true', help='завершиться, как только задачи кончатся')
+    arg_parser.add_argument('--http-workers', type=int, default=32)
+    arg_parser.add_argument('--browser-workers', type=int, default=20)
+    args = arg_parser.parse_args()
+    
+    args.stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        arg_parser.error(f"неизвестные этапы: {', '.join(sorted(unknown))}")
+    
+    metrics.start_reporting(args.worker_id)
+    try:
+        Worker(args).run()
+    except KeyboardInterrupt:
+        print("\n\n⚠ Воркер остановлен - его задачи вернутся в очередь после истечения аренды")
+        sys.exit(0)
+    except WorkerStop as e:
+        print(f"\n❌ Воркер остановлен: {e}")
+        sys.exit(1)
+    finally:
+        metrics.stop_reporting()
+
+
+if __name__ == '__main__':
+    main()